@@ -0,0 +1,140 @@
+"""
+Throughput of the public read views under uvicorn: sync views vs the async
+views in blogs.async_views (BLOG_ASYNC_VIEWS).
+
+Each mode gets its own uvicorn process on the same seeded database, with
+the page cache off so every request reaches the view. Needs uvicorn
+(pip install uvicorn).
+
+    python -m benchmarks.async_throughput --blogs 2000 --concurrency 32 --duration 10
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import seed_blogs, setup_django
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'uvicorn did not start on port {port}')
+
+
+def start_server(db_path, port, async_views):
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='benchmarks.server_settings',
+        BENCH_DB_PATH=db_path,
+        DEBUG='False',
+        BLOG_PAGE_CACHE_ENABLED='False',
+        BLOG_ASYNC_VIEWS='True' if async_views else 'False',
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'blog_project.asgi:application',
+         '--port', str(port), '--log-level', 'warning', '--no-access-log'],
+        env=env,
+    )
+    wait_for_server(port)
+    return server
+
+
+def load(port, paths, concurrency, duration):
+    """Hit `paths` from `concurrency` keep-alive clients for `duration` seconds"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local, failed = [], 0
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', rng.choice(paths))
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'req_per_s': round(len(latencies) / duration, 1),
+        'p50_ms': round(latencies[len(latencies) // 2], 2) if latencies else None,
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--blogs', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    authors, categories = seed_blogs(args.blogs)
+    from blogs.models import Blog
+
+    slugs = list(Blog.objects.order_by('?').values_list('slug', flat=True)[:200])
+    paths = (
+        ['/', '/?page=2', '/?sort_by=views']
+        + [f'/blog/{slug}/' for slug in slugs]
+        + [f'/category/{category.slug}/' for category in categories]
+        + [f'/author/{author.username}/' for author in authors]
+    )
+
+    results = []
+    for async_views in (False, True):
+        port = free_port()
+        server = start_server(db_path, port, async_views)
+        try:
+            load(port, paths, args.concurrency, 1)  # warm up
+            stats = load(port, paths, args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        results.append({'views': 'async' if async_views else 'sync', 'concurrency': args.concurrency, **stats})
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Bulk import/export check and throughput benchmark.
+
+Seeds --posts blogs, exports them with `manage.py export_blogs`, deletes the
+authors and categories (and so every blog) and checks that:
+
+- importing the JSONL export with --create-authors --create-categories
+  recreates every blog, author and category, and a second export is
+  byte-identical to the first
+- imported blogs are in the search index
+- importing the CSV export again skips every record, and with
+  --on-conflict rename adds them all under fresh slugs
+- an import interrupted after a few batches resumes from its checkpoint
+  without re-reading committed records, ending with every blog exactly once
+
+then prints export and import throughput. Exits non-zero on any failure.
+
+    python -m benchmarks.blog_transfer --posts 100000
+"""
+import argparse
+import filecmp
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.common import seed_blogs, setup_django
+
+
+class Interrupted(Exception):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from blogs.models import Blog, Category
+    from blogs.search import search_blogs
+    from blogs.transfer import BlogImporter, Checkpoint
+    from users.models import CustomUser
+
+    failures = []
+    report = {'posts': args.posts, 'batch_size': args.batch_size}
+
+    def check(label, condition, detail=''):
+        print(f'{"ok" if condition else "FAIL":4} {label} {detail}')
+        if not condition:
+            failures.append(label)
+
+    def timed(fn):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        return {'seconds': round(elapsed, 2), 'posts_per_second': round(args.posts / elapsed)}
+
+    def import_file(path, *options):
+        call_command('import_blogs', path, '--batch-size', str(args.batch_size), *options, stdout=io.StringIO())
+
+    def reset():
+        """Drop every blog along with its authors and categories"""
+        CustomUser.objects.filter(blogs__isnull=False).delete()
+        Category.objects.all().delete()
+
+    seed_blogs(args.posts, body_words=60)
+    # Exercise the CSV quoting and the byte-for-byte bodies
+    Blog.objects.filter(pk=Blog.objects.order_by('pk').values('pk')[:1]).update(
+        title='Quotes "and", commas', body='  Line one\nline two, "quoted"\n',
+    )
+    Blog.objects.filter(pk=Blog.objects.order_by('-pk').values('pk')[:1]).update(category=None)
+    directory = tempfile.mkdtemp(prefix='blog-transfer-')
+    jsonl, csv_gz, again = (os.path.join(directory, name) for name in ('blogs.jsonl', 'blogs.csv.gz', 'again.jsonl'))
+    authors = set(CustomUser.objects.filter(blogs__isnull=False).values_list('username', 'email').distinct())
+    categories = set(Category.objects.values_list('slug', 'name'))
+
+    report['export_jsonl'] = timed(lambda: call_command('export_blogs', jsonl, '--chunk-size', '5000', stderr=io.StringIO()))
+    report['export_csv_gz'] = timed(lambda: call_command('export_blogs', csv_gz, stderr=io.StringIO()))
+    with open(jsonl) as fh:
+        check('export writes one line per blog', sum(1 for _ in fh) == args.posts)
+
+    # Into an empty site
+    reset()
+    report['import_jsonl'] = timed(lambda: import_file(jsonl, '--create-authors', '--create-categories'))
+    check('import recreates every blog', Blog.objects.count() == args.posts, str(Blog.objects.count()))
+    check('authors recreated with their emails',
+          set(CustomUser.objects.filter(blogs__isnull=False).values_list('username', 'email').distinct()) == authors)
+    check('categories recreated with their names', set(Category.objects.values_list('slug', 'name')) == categories)
+    check('imported authors cannot log in', not any(user.has_usable_password() for user in CustomUser.objects.all()))
+    call_command('export_blogs', again, stderr=io.StringIO())
+    check('second export is identical', filecmp.cmp(jsonl, again, shallow=False))
+    blog = Blog.objects.order_by('-pk').first()
+    found = search_blogs(Blog.objects.all(), blog.title).filter(pk=blog.pk).exists()
+    check('imported blogs are searchable', found)
+
+    # Conflicts
+    import_file(csv_gz)
+    check('reimport skips taken slugs', Blog.objects.count() == args.posts)
+    import_file(csv_gz, '--on-conflict', 'rename')
+    check('rename imports them under new slugs', Blog.objects.count() == 2 * args.posts
+          and Blog.objects.values('slug').distinct().count() == 2 * args.posts)
+
+    # Interrupted and resumed
+    reset()
+    checkpoint = Checkpoint(os.path.join(directory, 'blogs.checkpoint'), jsonl)
+    importer = BlogImporter(batch_size=args.batch_size, create_authors=True, create_categories=True)
+    import_batch, batches = importer.import_batch, []
+
+    def interrupting(batch, fmt):
+        if len(batches) == 3:
+            raise Interrupted
+        batches.append(batch[0][0])
+        import_batch(batch, fmt)
+
+    importer.import_batch = interrupting
+    try:
+        importer.run(jsonl, 'jsonl', checkpoint)
+    except Interrupted:
+        pass
+    saved = checkpoint.load()
+    committed = min(3 * args.batch_size, args.posts)
+    check('checkpoint holds the committed batches', saved and saved['consumed'] == committed == Blog.objects.count(),
+          json.dumps(saved))
+    resumed = BlogImporter(batch_size=args.batch_size, create_authors=True, create_categories=True)
+    first, import_batch = [], resumed.import_batch
+
+    def recording(batch, fmt):
+        first.append(batch[0][0])
+        import_batch(batch, fmt)
+
+    resumed.import_batch = recording
+    resumed.run(jsonl, 'jsonl', checkpoint)
+    check('resume starts after the checkpoint', first[:1] == [committed + 1], str(first[:1]))
+    check('resumed import has every blog once', Blog.objects.count() == args.posts
+          and resumed.stats == {'consumed': args.posts, 'imported': args.posts, 'skipped': 0, 'failed': 0},
+          json.dumps(resumed.stats))
+    check('checkpoint removed when done', not os.path.exists(checkpoint.path))
+
+    report['file_mb'] = {
+        name: round(os.path.getsize(path) / 2 ** 20, 1) for name, path in (('jsonl', jsonl), ('csv_gz', csv_gz))
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
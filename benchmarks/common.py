@@ -0,0 +1,94 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database so they never touch
+db.sqlite3. Run them from the project root, e.g.
+python -m benchmarks.search_latency
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import django
+
+WORDS = (
+    'django python web framework travel food recipe health business startup '
+    'learning education guide tips review city mountain ocean coffee market '
+    'design code database query index cache server network music history art'
+).split()
+
+
+def setup_django(db_path=None):
+    """Configure Django against a fresh SQLite file and run migrations
+
+    With DATABASE_ENGINE=postgres the POSTGRES_* database is used as is.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog_project.settings')
+    from django.conf import settings
+
+    if getattr(settings, 'DATABASE_ENGINE', 'sqlite') == 'sqlite':
+        if db_path is None:
+            db_path = os.path.join(tempfile.mkdtemp(prefix='blog-bench-'), 'bench.sqlite3')
+        settings.DATABASES['default']['NAME'] = db_path
+    else:
+        db_path = settings.DATABASES['default']['NAME']
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def random_text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed_blogs(count, body_words=200, batch_size=5000, seed=42):
+    """Bulk insert `count` blogs spread over a few authors and categories"""
+    from blogs.models import Blog, Category
+    from users.models import CustomUser
+
+    rng = random.Random(seed)
+    authors = [
+        CustomUser.objects.get_or_create(
+            username=f'bench_author_{i}', defaults={'email': f'bench{i}@example.com', 'role': 'author'}
+        )[0]
+        for i in range(10)
+    ]
+    categories = [
+        Category.objects.get_or_create(name=f'Bench {i}', defaults={'slug': f'bench-{i}'})[0]
+        for i in range(6)
+    ]
+    start = Blog.objects.count()
+    for offset in range(0, count, batch_size):
+        batch = []
+        for n in range(offset, min(offset + batch_size, count)):
+            body = random_text(rng, body_words)
+            batch.append(Blog(
+                title=random_text(rng, 6),
+                slug=f'bench-{start + n}',
+                body=body,
+                excerpt=Blog.make_excerpt(body),
+                author=rng.choice(authors),
+                category=rng.choice(categories),
+                views=rng.randint(0, 10000),
+            ))
+        Blog.objects.bulk_create(batch)
+    return authors, categories
+
+
+def measure(fn, repeat=50):
+    """Call fn repeatedly and return latency percentiles in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
@@ -0,0 +1,142 @@
+"""
+Concurrent-request throughput for each database profile.
+
+Every profile is a set of the environment variables blog_project.settings
+reads, and runs in its own process against the same seeded data.
+Scenarios from benchmarks.load_test run with --concurrency client threads.
+Each thread keeps its connection between requests, as a threaded WSGI worker
+does, so DATABASE_CONN_MAX_AGE shows up in the numbers. The page cache is
+off so every request reaches the database.
+
+    python -m benchmarks.db_profiles --scale small --concurrency 8
+    python -m benchmarks.db_profiles --postgres       # also the POSTGRES_* database
+
+Postgres profiles need psycopg and an empty database the POSTGRES_* variables
+point at; it is seeded on first use. With --pgbouncer-port a profile that
+goes through PgBouncer (transaction pooling) is added.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import synthetic
+from benchmarks.common import setup_django
+from benchmarks.load_test import RESULTS_DIR, git_revision
+
+SCENARIOS = ('blog-home:page', 'blog-detail', 'blog-detail:reader', 'my-favorites', 'rate-blog:post', 'add-favorite')
+
+# Settings before this change: rollback journal, full fsync, DEFERRED
+# transactions and a new connection per request
+SQLITE_BASELINE = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_MMAP_SIZE': '0',
+    'SQLITE_TRANSACTION_MODE': 'DEFERRED',
+    'DATABASE_CONN_MAX_AGE': '0',
+}
+SQLITE_PROFILES = {
+    'sqlite-baseline': SQLITE_BASELINE,
+    'sqlite-tuned-per-request': {'DATABASE_CONN_MAX_AGE': '0'},
+    'sqlite-tuned-persistent': {'DATABASE_CONN_MAX_AGE': '60'},
+}
+POSTGRES_PROFILES = {
+    'postgres-per-request': {'DATABASE_ENGINE': 'postgres', 'DATABASE_CONN_MAX_AGE': '0'},
+    'postgres-persistent': {'DATABASE_ENGINE': 'postgres', 'DATABASE_CONN_MAX_AGE': '60'},
+}
+# Settings the tuned profiles take from their defaults
+PROFILE_VARIABLES = sorted({name for profile in (*SQLITE_PROFILES.values(), *POSTGRES_PROFILES.values()) for name in profile})
+
+
+def profiles(args):
+    selected = dict(SQLITE_PROFILES)
+    if args.postgres:
+        selected.update(POSTGRES_PROFILES)
+        if args.pgbouncer_port:
+            selected['postgres-pgbouncer'] = {
+                'DATABASE_ENGINE': 'postgres',
+                'DATABASE_CONN_MAX_AGE': '0',
+                'POSTGRES_PORT': str(args.pgbouncer_port),
+                'POSTGRES_PGBOUNCER': 'True',
+            }
+    return selected
+
+
+def child(args):
+    """Run the scenarios for the profile in this process's environment and print JSON"""
+    from benchmarks import load_test
+
+    setup_django(args.db)
+    from django.conf import settings
+    load_test.configure_production()
+    settings.BLOG_PAGE_CACHE_ENABLED = False
+    if not synthetic.is_seeded():
+        synthetic.seed(args.scale, args.seed, args.batch_size, verbose=False)
+
+    scenario_list = [scenario for scenario in load_test.scenarios() if scenario.label in args.scenarios]
+    fixtures = load_test.Fixtures(random.Random(args.seed))
+    results = {
+        scenario.label: load_test.run_scenario(scenario, fixtures, args.requests, args.concurrency, args.warmup, args.seed)
+        for scenario in scenario_list
+    }
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    synthetic.add_arguments(parser)
+    parser.add_argument('--requests', type=int, default=400, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenarios', nargs='+', default=SCENARIOS)
+    parser.add_argument('--postgres', action='store_true', help='also run the Postgres profiles')
+    parser.add_argument('--pgbouncer-port', type=int)
+    parser.add_argument('--output', help='JSON report path (default: benchmarks/results/db-profiles-<commit>.json)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    if args.db is None:
+        args.db = os.path.join(tempfile.mkdtemp(prefix='blog-bench-'), 'bench.sqlite3')
+    forwarded = [
+        '--scale', args.scale, '--seed', str(args.seed), '--batch-size', str(args.batch_size), '--db', args.db,
+        '--requests', str(args.requests), '--warmup', str(args.warmup), '--concurrency', str(args.concurrency),
+        '--scenarios', *args.scenarios,
+    ]
+    base_env = {name: value for name, value in os.environ.items() if name not in PROFILE_VARIABLES}
+    report = {}
+    for name, variables in profiles(args).items():
+        print(f'== {name}', flush=True)
+        completed = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.db_profiles', '--child', name, *forwarded],
+            env={**base_env, **variables}, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            print(completed.stderr[-2000:])
+            report[name] = {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+            continue
+        report[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+        for label, result in report[name].items():
+            print(f'   {label:20} {result["req_per_s"]:>8} req/s  p50 {result["p50_ms"]:>8} ms  '
+                  f'p95 {result["p95_ms"]:>8} ms  errors {result["errors"]}', flush=True)
+
+    commit, dirty = git_revision()
+    output = args.output or os.path.join(RESULTS_DIR, f'db-profiles-{commit or "unknown"}{"-dirty" if dirty else ""}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as fh:
+        json.dump({
+            'meta': {'commit': commit, 'dirty': dirty, 'concurrency': args.concurrency, 'requests': args.requests,
+                     'scale': args.scale, 'profiles': profiles(args)},
+            'profiles': report,
+        }, fh, indent=2, sort_keys=True)
+    print(f'Wrote {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Image bytes downloaded per page: originals vs the responsive variants.
+
+Uploads camera-sized JPEGs for a page of blogs and their author through the
+models (so the upload signals generate variants). It then renders the home
+and detail pages and adds up the file each <img>/<picture> would make a
+browser download at the given viewport width and device pixel ratio.
+
+    python -m benchmarks.image_bytes --viewport 1280 --dpr 1 2
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+from io import BytesIO
+
+from benchmarks.common import seed_blogs, setup_django
+
+TAG = re.compile(r'<picture>.*?</picture>|<img\b[^>]*>', re.S)
+ATTR = re.compile(r'([\w-]+)="([^"]*)"')
+
+
+def photo(width, height, seed):
+    """A noisy gradient that compresses roughly like a photograph"""
+    from PIL import Image, ImageFilter
+
+    channels = [
+        Image.effect_noise((width, height), 60 + 10 * i).filter(ImageFilter.GaussianBlur(1 + i))
+        for i in range(3)
+    ]
+    gradient = Image.linear_gradient('L').resize((width, height)).rotate(seed * 37 % 360)
+    image = Image.merge('RGB', channels)
+    image = Image.blend(image, Image.merge('RGB', [gradient] * 3), 0.5)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def slot_width(sizes, viewport):
+    """CSS pixel width of the image slot for a `sizes` attribute"""
+    for entry in sizes.split(','):
+        entry = entry.strip()
+        match = re.match(r'\(min-width:\s*(\d+)px\)\s+(.+)', entry)
+        if match:
+            if viewport < int(match.group(1)):
+                continue
+            entry = match.group(2)
+        if entry.endswith('vw'):
+            return viewport * float(entry[:-2]) / 100
+        return float(entry.rstrip('px'))
+    return viewport
+
+
+def pick(srcset, needed):
+    """The candidate a browser picks: the narrowest at least `needed` wide, else the widest"""
+    candidates = sorted((int(width[:-1]), url) for url, width in (item.split() for item in srcset.split(', ')))
+    for width, url in candidates:
+        if width >= needed:
+            return url
+    return candidates[-1][1]
+
+
+def page_bytes(html, media_root, viewport, dpr):
+    """(original bytes, responsive bytes) for every image on the page"""
+    from django.conf import settings
+
+    def size(url):
+        return os.path.getsize(os.path.join(media_root, url[len(settings.MEDIA_URL):]))
+
+    original = responsive = 0
+    for tag in TAG.findall(html):
+        img = dict(ATTR.findall(re.search(r'<img\b[^>]*>', tag).group(0)))
+        original += size(img['src'])
+        source = re.search(r'<source\b[^>]*>', tag)
+        attrs = dict(ATTR.findall(source.group(0))) if source else img
+        if 'srcset' in attrs:
+            responsive += size(pick(attrs['srcset'], slot_width(attrs['sizes'], viewport) * dpr))
+        else:
+            responsive += size(img['src'])
+    return original, responsive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--viewport', type=int, default=1280)
+    parser.add_argument('--dpr', type=float, nargs='+', default=[1, 2])
+    parser.add_argument('--image-width', type=int, default=3000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    media_root = tempfile.mkdtemp(prefix='blog-bench-media-')
+    settings.MEDIA_ROOT = media_root
+    settings.BLOG_PAGE_CACHE_ENABLED = False
+
+    from django.core.files.base import ContentFile
+    from django.test import Client
+    from blogs.models import Blog
+
+    authors, _ = seed_blogs(9, body_words=50)
+    author = authors[0]
+    Blog.objects.update(author=author)
+    author.profile.profile_picture.save('avatar.jpg', ContentFile(photo(1200, 1200, 0)))
+    height = args.image_width * 2 // 3
+    for i, blog in enumerate(Blog.objects.all()):
+        blog.image.save(f'cover-{i}.jpg', ContentFile(photo(args.image_width, height, i + 1)))
+
+    client = Client()
+    pages = {
+        'home': client.get('/').content.decode(),
+        'detail': client.get(f'/blog/{Blog.objects.first().slug}/').content.decode(),
+    }
+    results = []
+    for name, html in pages.items():
+        for dpr in args.dpr:
+            original, responsive = page_bytes(html, media_root, args.viewport, dpr)
+            results.append({
+                'page': name,
+                'viewport': args.viewport,
+                'dpr': dpr,
+                'original_kb': round(original / 1024, 1),
+                'responsive_kb': round(responsive / 1024, 1),
+                'saved_pct': round(100 * (1 - responsive / original), 1) if original else 0.0,
+            })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Memory and latency of rendering a listing page of long posts: full bodies
+with truncatewords (the old path) vs deferred bodies with stored excerpts.
+
+    python -m benchmarks.listing_excerpts --posts 2000 --words 5000
+"""
+import argparse
+import json
+import tracemalloc
+
+from benchmarks.common import measure, seed_blogs, setup_django
+
+OLD_CARD = '{% for blog in blogs %}<p>{{ blog.title }}</p><p>{{ blog.body|truncatewords:20 }}</p>{% endfor %}'
+NEW_CARD = '{% for blog in blogs %}<p>{{ blog.title }}</p><p>{{ blog.excerpt }}</p>{% endfor %}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=5000, help='words per post body')
+    parser.add_argument('--page-size', type=int, default=9)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    seed_blogs(args.posts, body_words=args.words, batch_size=500)
+
+    from django.template import Context, Template
+    from blogs.models import Blog
+
+    def page(template, queryset):
+        def render():
+            blogs = list(queryset.order_by('-created_at', '-id')[:args.page_size])
+            return template.render(Context({'blogs': blogs}))
+        return render
+
+    base = Blog.objects.select_related('author', 'category')
+    variants = {
+        'full_body_truncatewords': page(Template(OLD_CARD), base),
+        'deferred_body_excerpt': page(Template(NEW_CARD), base.defer('body')),
+    }
+    results = {'posts': args.posts, 'words_per_post': args.words}
+    for name, render in variants.items():
+        tracemalloc.start()
+        render()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {'peak_kib': round(peak / 1024, 1), **measure(render, args.repeat)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
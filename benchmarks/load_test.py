@@ -0,0 +1,363 @@
+"""
+Load test for every URL in blogs/urls.py and users/urls.py.
+
+Seeds a synthetic dataset (see benchmarks.synthetic) unless --db points at a
+database that is already seeded, then drives each scenario through Django's
+test client, the full WSGI request/middleware stack without a network
+socket. Blogs are picked with the same skew as the data (hot posts most of
+the time, a random tail otherwise), and logged-in scenarios rotate over a
+pool of seeded users. Every scenario reports throughput, latency percentiles,
+status codes and, from the PerformanceMiddleware registry, queries per
+request.
+
+Results are written as JSON, by default to benchmarks/results/<commit>.json,
+so two commits can be compared:
+
+    python -m benchmarks.synthetic --scale medium --db /tmp/blog-medium.sqlite3
+    python -m benchmarks.load_test --db /tmp/blog-medium.sqlite3 --requests 300
+    python -m benchmarks.load_test --diff benchmarks/results/abc1234.json benchmarks/results/def5678.json
+
+--diff exits non-zero when any scenario's p95 got slower by more than
+--threshold percent.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, Optional
+
+from benchmarks import synthetic
+from benchmarks.common import WORDS, setup_django
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+PERCENTILES = (50, 90, 95, 99)
+HOT_BLOGS = 500
+TAIL_BLOGS = 2000
+HOT_SHARE = 0.8
+USER_POOL = 50
+
+
+@dataclass
+class Scenario:
+    """One request shape: `make(rng, fixtures)` returns (path, POST data or None)"""
+
+    label: str
+    url_name: str
+    make: Callable
+    method: str = 'GET'
+    login: Optional[str] = None  # None, 'reader' or 'author'
+    fresh_login: bool = False  # log in a new client for every request (logout)
+
+
+class Fixtures:
+    """Slugs, users and categories the scenarios pick from"""
+
+    def __init__(self, rng):
+        from blogs.models import Blog, Category
+        from users.models import CustomUser
+
+        self.rng = rng
+        self.hot = list(Blog.objects.order_by('-views', '-id').values_list('slug', flat=True)[:HOT_BLOGS])
+        ids = list(Blog.objects.order_by('pk').values_list('pk', flat=True))
+        sample = rng.sample(ids, min(TAIL_BLOGS, len(ids)))
+        self.tail = list(Blog.objects.filter(pk__in=sample).values_list('slug', flat=True))
+        self.categories = list(Category.objects.exclude(blogs=None).values_list('pk', 'slug'))
+        # Authors of hot posts, each with one post of their own to edit
+        owned = {}
+        for author_id, username, slug in Blog.objects.filter(slug__in=self.hot).values_list('author_id', 'author__username', 'slug'):
+            owned.setdefault(author_id, (username, slug))
+        self.authors = list(CustomUser.objects.filter(pk__in=list(owned)[:USER_POOL]))
+        self.owned = {author.pk: owned[author.pk] for author in self.authors}
+        readers = CustomUser.objects.filter(username__startswith=synthetic.USER_PREFIX, role='reader').values_list('pk', flat=True)
+        self.readers = list(CustomUser.objects.filter(pk__in=rng.sample(list(readers), min(USER_POOL, readers.count()))))
+
+    def blog(self, rng):
+        return rng.choice(self.hot if rng.random() < HOT_SHARE else self.tail)
+
+
+def scenarios():
+    """Every named URL, and a few variants of the busiest ones"""
+    from django.urls import reverse
+
+    def get(name, *args, query=''):
+        return lambda rng, fx, user: (reverse(name, args=[arg(rng, fx, user) for arg in args]) + query, None)
+
+    blog = lambda rng, fx, user: fx.blog(rng)  # noqa: E731
+    own_blog = lambda rng, fx, user: fx.owned[user.pk][1]  # noqa: E731
+    return [
+        Scenario('blog-home', 'blog-home', get('blog-home')),
+        Scenario('blog-home:page', 'blog-home', lambda rng, fx, user: (reverse('blog-home') + f'?page={rng.randint(2, 50)}', None)),
+        Scenario('blog-home:rating', 'blog-home', get('blog-home', query='?sort_by=rating')),
+        Scenario('blog-home:views', 'blog-home', get('blog-home', query='?sort_by=views')),
+        Scenario('blog-home:trending', 'blog-home', get('blog-home', query='?sort_by=trending')),
+        Scenario('blog-home:favorited', 'blog-home', lambda rng, fx, user: (
+            reverse('blog-home') + f'?sort_by=favorited&category={rng.choice(fx.categories)[0]}', None)),
+        Scenario('blog-home:search', 'blog-home', lambda rng, fx, user: (reverse('blog-home') + f'?search={rng.choice(WORDS)}', None)),
+        Scenario('blog-home:category', 'blog-home', lambda rng, fx, user: (reverse('blog-home') + f'?category={rng.choice(fx.categories)[0]}', None)),
+        Scenario('blog-detail', 'blog-detail', get('blog-detail', blog)),
+        Scenario('blog-detail:reader', 'blog-detail', get('blog-detail', blog), login='reader'),
+        Scenario('blog-ratings', 'blog-ratings', get('blog-ratings', blog, query='?format=json')),
+        Scenario('blog-create', 'blog-create', get('blog-create'), login='author'),
+        Scenario('blog-update', 'blog-update', get('blog-update', own_blog), login='author'),
+        Scenario('blog-delete', 'blog-delete', get('blog-delete', own_blog), login='author'),
+        Scenario('rate-blog', 'rate-blog', get('rate-blog', blog), login='reader'),
+        Scenario('rate-blog:post', 'rate-blog', lambda rng, fx, user: (
+            reverse('rate-blog', args=[fx.blog(rng)]), {'rating': rng.randint(0, 6), 'review': ''},
+        ), method='POST', login='reader'),
+        Scenario('add-favorite', 'add-favorite', get('add-favorite', blog), login='reader'),
+        Scenario('remove-favorite', 'remove-favorite', get('remove-favorite', blog), login='reader'),
+        Scenario('my-favorites', 'my-favorites', get('my-favorites'), login='reader'),
+        Scenario('blog-category', 'blog-category', lambda rng, fx, user: (reverse('blog-category', args=[rng.choice(fx.categories)[1]]), None)),
+        Scenario('author-blogs', 'author-blogs', get('author-blogs', lambda rng, fx, user: fx.owned[rng.choice(fx.authors).pk][0])),
+        Scenario('register', 'register', get('register')),
+        Scenario('login', 'login', get('login')),
+        Scenario('logout', 'logout', get('logout'), login='reader', fresh_login=True),
+        Scenario('verify-email', 'verify-email', get('verify-email', lambda rng, fx, user: f'invalid-{rng.randrange(10 ** 9)}')),
+        Scenario('profile', 'profile', get('profile'), login='reader'),
+        Scenario('user-profile', 'user-profile', get('user-profile', lambda rng, fx, user: fx.owned[rng.choice(fx.authors).pk][0]), login='reader'),
+        Scenario('edit-profile', 'edit-profile', get('edit-profile'), login='reader'),
+    ]
+
+
+def check_coverage(scenario_list):
+    """Fail loudly when a URL is added without a scenario"""
+    from blogs.urls import urlpatterns as blog_urls
+    from users.urls import urlpatterns as user_urls
+
+    missing = {pattern.name for pattern in blog_urls + user_urls} - {scenario.url_name for scenario in scenario_list}
+    if missing:
+        raise SystemExit(f'No load test scenario for: {", ".join(sorted(missing))}')
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 3)
+
+
+def run_scenario(scenario, fixtures, requests, concurrency, warmup, seed):
+    """Run `requests` requests split over `concurrency` threads, after a warm-up"""
+    from django.db import connections
+    from django.test import Client
+    from blog_project.metrics import registry
+
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    users = fixtures.authors if scenario.login == 'author' else fixtures.readers
+
+    def logged_in(user):
+        # Server errors are counted as 500s instead of stopping the worker
+        client = Client(raise_request_exception=False)
+        if user is not None:
+            client.force_login(user)
+        return client
+
+    def worker(index, count, barrier=None):
+        rng = random.Random(f'{seed}-{scenario.label}-{index}-{barrier is None}')
+        picks = [rng.choice(users) if scenario.login else None for _ in range(count)]
+        # Sessions are created up front so logins stay out of the timings
+        if scenario.fresh_login:
+            clients = [logged_in(user) for user in picks]
+        else:
+            pool = {user: logged_in(user) for user in set(picks)}
+            clients = [pool[user] for user in picks]
+        local, codes = [], Counter()
+        try:
+            if barrier is not None:
+                barrier.wait()
+            for user, client in zip(picks, clients):
+                path, data = scenario.make(rng, fixtures, user)
+                start = time.perf_counter()
+                response = client.post(path, data) if scenario.method == 'POST' else client.get(path)
+                local.append((time.perf_counter() - start) * 1000)
+                codes[response.status_code] += 1
+        finally:
+            connections.close_all()
+        if barrier is not None:
+            with lock:
+                latencies.extend(local)
+                statuses.update(codes)
+                finished.append(time.perf_counter())
+
+    worker(0, warmup)
+    registry.reset()
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+    finished = []
+    threads = [threading.Thread(target=worker, args=(i, share, barrier)) for i, share in enumerate(shares)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = max(finished, default=started) - started
+
+    latencies.sort()
+    result = {
+        'url_name': scenario.url_name,
+        'method': scenario.method,
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status >= 500),
+        'status': {str(status): count for status, count in sorted(statuses.items())},
+        'req_per_s': round(len(latencies) / wall, 1) if wall else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        **{f'p{pct}_ms': percentile(latencies, pct) for pct in PERCENTILES},
+        'max_ms': round(latencies[-1], 3) if latencies else None,
+    }
+    view = registry.summary().get(scenario.url_name)
+    if view:
+        result['db_queries_p50'] = view['db_queries']['p50']
+        result['db_ms_p50'] = round(view['db_time']['p50'] * 1000, 3)
+    return result
+
+
+def git_revision():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ''
+
+    commit = git('rev-parse', '--short', 'HEAD')
+    dirty = bool(git('status', '--porcelain', '--untracked-files=no'))
+    return commit, dirty
+
+
+def dataset_counts():
+    from blogs.models import Blog, Favorite, Rating
+    from users.models import CustomUser
+
+    return {
+        'users': CustomUser.objects.count(),
+        'blogs': Blog.objects.count(),
+        'ratings': Rating.objects.count(),
+        'favorites': Favorite.objects.count(),
+    }
+
+
+def configure_production():
+    """Production-like settings: no query logging, fingerprinted static URLs"""
+    from django.conf import settings
+    from django.core.management import call_command
+
+    settings.DEBUG = False
+    settings.STATIC_ROOT = tempfile.mkdtemp(prefix='blog-bench-static-')
+    call_command('collectstatic', interactive=False, verbosity=0)
+    # 500s are counted per scenario; their tracebacks would drown the table
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+
+def run(args):
+    db_path = setup_django(args.db)
+    from django import get_version
+    from django.conf import settings
+    from django.db import connection
+
+    configure_production()
+    if args.page_cache != 'default':
+        settings.BLOG_PAGE_CACHE_ENABLED = args.page_cache == 'on'
+    if not synthetic.is_seeded():
+        synthetic.seed(args.scale, args.seed, args.batch_size, users=args.users, blogs=args.blogs,
+                       ratings=args.ratings, favorites=args.favorites)
+
+    scenario_list = scenarios()
+    check_coverage(scenario_list)
+    if args.only:
+        scenario_list = [scenario for scenario in scenario_list if scenario.label in args.only or scenario.url_name in args.only]
+    fixtures = Fixtures(random.Random(args.seed))
+
+    results = {}
+    for scenario in scenario_list:
+        result = run_scenario(scenario, fixtures, args.requests, args.concurrency, args.warmup, args.seed)
+        results[scenario.label] = result
+        print(f'{scenario.label:22} {result["req_per_s"]:>9} req/s  p50 {result["p50_ms"]:>8} ms  '
+              f'p95 {result["p95_ms"]:>8} ms  p99 {result["p99_ms"]:>8} ms  '
+              f'{result.get("db_queries_p50", "-"):>3} queries  {result["status"]}', flush=True)
+
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'created_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': get_version(),
+            'database': connection.vendor,
+            'db_path': db_path,
+            'dataset': dataset_counts(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'warmup': args.warmup,
+            'settings': {
+                name: getattr(settings, name, None)
+                for name in ('BLOG_PAGE_CACHE_ENABLED', 'BLOG_ASYNC_VIEWS', 'BLOG_PAGINATION_MODE',
+                             'BLOG_VIEW_COUNTER_MODE', 'BLOG_SEARCH_BACKEND')
+            },
+        },
+        'scenarios': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit or "unknown"}{"-dirty" if dirty else ""}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+    print(f'Wrote {output}')
+
+
+def diff(base_path, current_path, threshold):
+    """Print per-scenario changes; True when any p95 regressed past `threshold` percent"""
+    with open(base_path) as fh:
+        base = json.load(fh)
+    with open(current_path) as fh:
+        current = json.load(fh)
+    if base['meta'].get('dataset') != current['meta'].get('dataset'):
+        print(f'warning: datasets differ: {base["meta"].get("dataset")} vs {current["meta"].get("dataset")}')
+
+    regressed = []
+    print(f'{"scenario":22} {"p95 base":>10} {"p95 now":>10} {"change":>8} {"req/s base":>11} {"req/s now":>10} {"queries":>8}')
+    for label in sorted(set(base['scenarios']) | set(current['scenarios'])):
+        old, new = base['scenarios'].get(label), current['scenarios'].get(label)
+        if old is None or new is None:
+            print(f'{label:22} {"only in " + (base_path if new is None else current_path)}')
+            continue
+        change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        queries = f'{old.get("db_queries_p50", "-")}->{new.get("db_queries_p50", "-")}'
+        flag = ' REGRESSED' if change > threshold else ''
+        print(f'{label:22} {old["p95_ms"]:>10} {new["p95_ms"]:>10} {change:>+7.1f}% '
+              f'{old["req_per_s"]:>11} {new["req_per_s"]:>10} {queries:>8}{flag}')
+        if flag:
+            regressed.append(label)
+    return bool(regressed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    synthetic.add_arguments(parser)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per scenario')
+    parser.add_argument('--page-cache', choices=('default', 'on', 'off'), default='default')
+    parser.add_argument('--only', nargs='+', help='scenario labels or URL names to run')
+    parser.add_argument('--output', help='JSON report path (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--diff', nargs=2, metavar=('BASE', 'CURRENT'), help='compare two reports instead of running')
+    parser.add_argument('--threshold', type=float, default=20.0, help='p95 slowdown in percent that counts as a regression')
+    args = parser.parse_args()
+
+    if args.diff:
+        sys.exit(1 if diff(*args.diff, args.threshold) else 0)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Query-plan report and latency benchmark for the listing and detail pages.
+
+Seeds a dataset, requests each listing/detail page with the test client and
+captures the SELECTs the views actually run, with their select_related,
+deferred fields, search and filters. Each statement is EXPLAINed, and any
+full table scan or temp b-tree sort is listed under "full_scans". Each
+page's statements are then replayed to time them. With --compare, the
+Meta.indexes are dropped and latency measured again.
+
+blogs.tests.QueryPlanTests asserts the same plans on every test run; this
+script shows them and their latency at production sizes.
+
+    python -m benchmarks.query_plans --posts 100000 --compare
+"""
+import argparse
+import json
+import random
+import re
+
+from benchmarks.common import measure, seed_blogs, setup_django
+
+SCAN = re.compile(r'^SCAN (\S+)(.*)$')
+COROUTINE = re.compile(r'CO-ROUTINE (\S+)')
+
+
+def view_requests():
+    """(name, path, logged-in user or None) for each listing/detail page"""
+    from django.urls import reverse
+    from blogs.models import Blog, Category, Rating
+    from users.models import CustomUser
+
+    category = Category.objects.first()
+    author = CustomUser.objects.filter(role='author').first()
+    blog = Blog.objects.order_by('-rating_count').first()
+    reader = CustomUser.objects.get(pk=Rating.objects.filter(blog=blog).values_list('user', flat=True).first())
+    home = reverse('blog-home')
+    return [
+        ('blog_home date', home, None),
+        ('blog_home oldest', f'{home}?sort_by=-date', None),
+        ('blog_home views', f'{home}?sort_by=views', None),
+        ('blog_home lowest rating', f'{home}?sort_by=-rating', None),
+        ('blog_home ranked top_rated', f'{home}?sort_by=rating', None),
+        ('blog_home ranked trending', f'{home}?sort_by=trending', None),
+        ('blog_home ranked top_rated past the ranking', f'{home}?sort_by=rating&page=50', None),
+        ('blog_home ranked most_favorited by category', f'{home}?sort_by=favorited&category={category.pk}', None),
+        ('blog_home category', f'{home}?category={category.pk}', None),
+        ('blog_home search', f'{home}?search=python+travel', None),
+        ('blog_home author filter', f'{home}?author={author.username}', None),
+        ('blogs_by_category', reverse('blog-category', args=[category.slug]), None),
+        ('author_blogs', reverse('author-blogs', args=[author.username]), None),
+        ('blog_detail', reverse('blog-detail', args=[blog.slug]), None),
+        ('blog_detail logged in', reverse('blog-detail', args=[blog.slug]), reader),
+        ('blog_ratings', reverse('blog-ratings', args=[blog.slug]), None),
+        ('my_favorites', reverse('my-favorites'), reader),
+    ]
+
+
+def captured_selects(path, user):
+    """SQL of every SELECT the view runs for `path`"""
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(path)
+    if response.status_code != 200:
+        raise RuntimeError(f'{path} answered {response.status_code}')
+    return [
+        query['sql'] for query in queries.captured_queries
+        if query['sql'].lstrip().upper().startswith('SELECT')
+        # Session lookups by key, and the search backend's one-off table introspection
+        and 'django_session' not in query['sql'] and 'sqlite_master' not in query['sql']
+    ]
+
+
+def full_scans(plan):
+    """Lines of an SQLite query plan that read a whole table or sort in a temp b-tree
+
+    Scans through an index or an FTS5 MATCH, and scans of co-routines (the
+    bounded rows of a subquery, e.g. Django's window-function prefetch of
+    one page of ratings) do not count. Neither does the final sort of such a
+    co-routine's rows.
+    """
+    coroutines = set(COROUTINE.findall(plan))
+    found = []
+    for line in (line.strip() for line in plan.splitlines()):
+        match = SCAN.match(line)
+        if match:
+            table, rest = match.groups()
+            if table not in coroutines and not table.startswith('(') \
+                    and not rest.startswith((' USING', ' VIRTUAL TABLE INDEX')):
+                found.append(line)
+        elif line == 'USE TEMP B-TREE FOR ORDER BY' and not coroutines:
+            found.append(line)
+    return found
+
+
+def explain(sql):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+
+def seed_interactions(users=2000, per_user=20, seed=7):
+    from blogs.models import Blog, Favorite, Rating
+    from blogs.rankings import rebuild_favorite_counts, rebuild_rankings
+    from users.models import CustomUser
+
+    rng = random.Random(seed)
+    CustomUser.objects.bulk_create(
+        CustomUser(username=f'bench_reader_{i}', email=f'reader{i}@example.com') for i in range(users)
+    )
+    user_ids = list(CustomUser.objects.filter(role='reader').values_list('id', flat=True))
+    blog_ids = list(Blog.objects.values_list('id', flat=True))
+    ratings, favorites = [], []
+    for user_id in user_ids:
+        for blog_id in rng.sample(blog_ids, min(per_user, len(blog_ids))):
+            ratings.append(Rating(blog_id=blog_id, user_id=user_id, rating=rng.randint(0, 6)))
+            favorites.append(Favorite(blog_id=blog_id, user_id=user_id))
+    Rating.objects.bulk_create(ratings, batch_size=5000)
+    Favorite.objects.bulk_create(favorites, batch_size=5000)
+    Blog.rebuild_rating_aggregates()
+    Blog.refresh_rating_scores(force=True)
+    rebuild_favorite_counts()
+    rebuild_rankings()
+
+
+def run(statements, repeat):
+    from django.db import connection
+
+    def replay(sqls):
+        with connection.cursor() as cursor:
+            for sql in sqls:
+                cursor.execute(sql)
+                cursor.fetchall()
+
+    report, scanning = [], []
+    for name, sqls in statements.items():
+        plans = [explain(sql) for sql in sqls]
+        scans = [(sql, full_scans(plan)) for sql, plan in zip(sqls, plans)]
+        scans = [{'sql': sql[:200], 'plan': found} for sql, found in scans if found]
+        if scans:
+            scanning.append({'page': name, 'statements': scans})
+        report.append({
+            'page': name,
+            'plans': [plan.splitlines() for plan in plans],
+            **measure(lambda: replay(sqls), repeat),
+        })
+    return report, scanning
+
+
+def drop_indexes():
+    from django.db import connection
+    from blogs.models import Blog, Favorite, Rating, RankingEntry
+
+    with connection.schema_editor() as editor:
+        for model in (Blog, Rating, Favorite, RankingEntry):
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--compare', action='store_true', help='also measure without the Meta.indexes')
+    args = parser.parse_args()
+
+    setup_django()
+    seed_blogs(args.posts)
+    seed_interactions()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    setup_test_environment()
+    settings.BLOG_PAGE_CACHE_ENABLED = False
+    statements = {name: captured_selects(path, user) for name, path, user in view_requests()}
+
+    indexed, scanning = run(statements, args.repeat)
+    result = {'posts': args.posts, 'indexed': indexed, 'full_scans': scanning}
+    if args.compare:
+        drop_indexes()
+        result['unindexed'] = run(statements, args.repeat)[0]
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Precomputed rankings check.
+
+Seeds blogs, then drives ratings, favorites and views through the ORM and
+the views (immediate and buffered view counting) and checks that:
+
+- the trending score SQL matches the Python log-space sum, and older
+  activity counts for less by the configured half-life
+- incrementally maintained lists hold the top scores for the kinds whose
+  scores only grow (trending, and most favorited before any unfavorites)
+- every listed score equals the blog's stored score, also after deletes
+- the lists never grow past BLOG_RANKING_SIZE
+- the home page's ranked sorts read the lists, globally and per category,
+  then page through every other blog in the column sort, and fall back to
+  the column sort under an author filter
+
+Exits non-zero on any failure.
+
+    python -m benchmarks.rankings
+"""
+import math
+import random
+import sys
+from datetime import timedelta
+
+from benchmarks.common import seed_blogs, setup_django
+
+
+def main():
+    setup_django()
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, setup_test_environment
+    from django.urls import reverse
+    from django.utils import timezone
+    from blogs import rankings
+    from blogs.counters import flush_views
+    from blogs.models import Blog, Category, Favorite, RankingEntry, Rating
+    from users.models import CustomUser
+
+    setup_test_environment()
+    settings.BLOG_PAGE_CACHE_ENABLED = False
+    settings.BLOG_RANKING_SIZE = 5
+    settings.BLOG_RANKING_MIN_RATINGS = 2
+    rng = random.Random(3)
+    failures = []
+
+    def check(label, condition, detail=''):
+        print(f'{"ok" if condition else "FAIL":4} {label} {detail}')
+        if not condition:
+            failures.append(label)
+
+    def lists():
+        """{(kind, category_id): [blog ids best first]}"""
+        result = {}
+        for entry in RankingEntry.objects.order_by('-score', '-blog_id'):
+            result.setdefault((entry.kind, entry.category_id), []).append(entry.blog_id)
+        return result
+
+    seed_blogs(40, body_words=20)
+    blogs = list(Blog.objects.all())
+    readers = [CustomUser.objects.create_user(f'rank_reader_{i}', f'rank{i}@example.com', 'password123') for i in range(8)]
+
+    # Trending arithmetic
+    now = timezone.now()
+    first, second = blogs[0].pk, blogs[1].pk
+    Blog.objects.filter(pk=first).update(trending_score=rankings.trending_increment(3, now))
+    Blog.objects.filter(pk=first).update(trending_score=rankings.trending_increment(5, now))
+    stored = Blog.objects.get(pk=first).trending_score
+    expected = rankings.add_scores(rankings.activity(3, now), rankings.activity(5, now))
+    check('SQL sum matches Python', math.isclose(stored, expected, rel_tol=1e-12))
+    check('log2 of the summed weights', math.isclose(stored - rankings.activity(1, now), math.log2(8), abs_tol=1e-6))
+    half_life = timedelta(hours=settings.BLOG_TRENDING_HALF_LIFE_HOURS)
+    Blog.objects.filter(pk=second).update(trending_score=rankings.trending_increment(16, now - 2 * half_life))
+    older = Blog.objects.get(pk=second).trending_score
+    check('activity two half-lives old counts a quarter', math.isclose(older - rankings.activity(1, now), 2, abs_tol=1e-6))
+    Blog.objects.filter(pk__in=[first, second]).update(trending_score=0)
+
+    # Events through the ORM
+    cache.clear()
+    for reader in readers:
+        for blog in rng.sample(blogs, 12):
+            Rating.objects.create(blog=blog, user=reader, rating=rng.randint(0, 6))
+        for blog in rng.sample(blogs, 6):
+            Favorite.objects.create(blog=blog, user=reader)
+
+    # Views through the detail page, immediate then buffered
+    client = Client()
+    for blog in rng.choices(blogs, k=60):
+        client.get(reverse('blog-detail', args=[blog.slug]))
+    settings.BLOG_VIEW_COUNTER_MODE = 'buffered'
+    for blog in rng.choices(blogs[:10], k=60):
+        client.get(reverse('blog-detail', args=[blog.slug]))
+    flush_views()
+    settings.BLOG_VIEW_COUNTER_MODE = 'immediate'
+
+    def check_scores(stage):
+        stored = {blog['id']: blog for blog in Blog.objects.values('id', 'category_id', *rankings.RANKED_FIELDS)}
+        mismatched = [
+            entry for entry in RankingEntry.objects.all()
+            if not math.isclose(entry.score, rankings.blog_score(entry.kind, stored[entry.blog_id]), rel_tol=1e-9)
+        ]
+        check(f'listed scores match the blogs {stage}', not mismatched, str(mismatched[:3]))
+        check(f'lists stay within the ranking size {stage}',
+              all(len(ids) <= settings.BLOG_RANKING_SIZE for ids in lists().values()))
+        return stored
+
+    # Scores that only grow: each list holds the top scores (blog ids may differ on ties)
+    stored = check_scores('after events')
+    for kind in (RankingEntry.Kind.TRENDING, RankingEntry.Kind.MOST_FAVORITED):
+        scopes = [None, *{blog['category_id'] for blog in stored.values()}]
+        same = True
+        for scope in scopes:
+            scores = [rankings.blog_score(kind, blog) for blog in stored.values() if scope in (None, blog['category_id'])]
+            expected = sorted((score for score in scores if score is not None), reverse=True)[:settings.BLOG_RANKING_SIZE]
+            listed = sorted(RankingEntry.objects.filter(kind=kind, category_id=scope).values_list('score', flat=True), reverse=True)
+            same = same and len(listed) == len(expected) and all(
+                math.isclose(score, top, rel_tol=1e-9) for score, top in zip(listed, expected)
+            )
+        check(f'incremental {kind} lists hold the top scores', same, f'{len(scopes)} lists')
+
+    for favorite in Favorite.objects.order_by('?')[:10]:
+        favorite.delete()
+    for rating in Rating.objects.order_by('?')[:10]:
+        rating.delete()
+    check_scores('after deletes')
+    counts_ok = all(blog.favorite_count == blog.favorited_by.count() for blog in Blog.objects.all())
+    check('incremental favorite counts match a recount', counts_ok)
+
+    rankings.rebuild_rankings()
+    rebuilt = lists()
+    check('rebuild fills every list', len(rebuilt) == 3 * (1 + Category.objects.count()), str(len(rebuilt)))
+
+    # Home page sorts
+    def every_page(query):
+        """Blog ids over all the listing's pages, and the query count of the first"""
+        shown, number = [], 1
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page = client.get(reverse('blog-home') + f'?{query}&page={number}').context['blogs']
+            if number == 1:
+                first_queries = len(queries)
+            shown += [blog.pk for blog in page]
+            if not page.has_next():
+                return shown, first_queries
+            number += 1
+
+    orderings = {'rating': ('-rating_score', '-id'), 'trending': ('-trending_score', '-id'),
+                 'favorited': ('-favorite_count', '-id')}
+    for sort_by, kind in (('rating', 'top_rated'), ('trending', 'trending'), ('favorited', 'most_favorited')):
+        shown, queries = every_page(f'sort_by={sort_by}')
+        ranking = rebuilt[(kind, None)]
+        rest = Blog.objects.exclude(pk__in=ranking).order_by(*orderings[sort_by]).values_list('pk', flat=True)
+        check(f'home ?sort_by={sort_by} lists the {kind} ranking first', shown[:len(ranking)] == ranking,
+              f'{queries} queries')
+        check(f'home ?sort_by={sort_by} then pages through every other blog', shown[len(ranking):] == list(rest),
+              f'{len(shown)} of {len(blogs)}')
+    category = Category.objects.get(pk=blogs[0].category_id)
+    shown, _ = every_page(f'sort_by=trending&category={category.pk}')
+    ranking = rebuilt[('trending', category.pk)]
+    check('per-category ranking', shown[:len(ranking)] == ranking
+          and sorted(shown) == sorted(Blog.objects.filter(category=category).values_list('pk', flat=True)))
+    response = client.get(reverse('blog-home') + '?sort_by=favorited&author=bench_author')
+    check('author filter falls back to the column sort', len(response.context['blogs']) == 9)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Bayesian rating score check and sort benchmark.
+
+Seeds --posts blogs with ratings and checks that:
+
+- a blog with a single 6/6 rating ranks below one with 50 ratings
+  averaging 5.8, both on Blog.rating_score and on the home page
+- the stored score follows rating creates, edits and deletes exactly
+- refresh_rating_scores leaves the scores alone while the global mean is
+  within tolerance, and re-weights every blog once it drifts
+- the SQL the home page runs for the rating sorts reads
+  blog_rating_score_idx instead of scanning and sorting the table
+
+then times that query with and without the index. Exits non-zero on any
+failure.
+
+    python -m benchmarks.rating_score --posts 100000
+"""
+import argparse
+import json
+import math
+import random
+import sys
+
+from benchmarks.common import measure, seed_blogs, setup_django
+
+INDEX = 'blog_rating_score_idx'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, setup_test_environment
+    from django.urls import reverse
+    from blogs.models import Blog, RankingEntry, Rating, RatingPrior
+    from users.models import CustomUser
+
+    setup_test_environment()
+    settings.BLOG_PAGE_CACHE_ENABLED = False
+    failures = []
+
+    def check(label, condition, detail=''):
+        print(f'{"ok" if condition else "FAIL":4} {label} {detail}')
+        if not condition:
+            failures.append(label)
+
+    def expected_score(blog):
+        mean, weight = RatingPrior.current()
+        return (mean * weight + blog.rating_sum) / (weight + blog.rating_count) if blog.rating_count else 0.0
+
+    seed_blogs(args.posts, body_words=20)
+    rng = random.Random(5)
+    readers = CustomUser.objects.bulk_create(
+        CustomUser(username=f'score_reader_{i}', email=f'score{i}@example.com') for i in range(60)
+    )
+    blog_ids = list(Blog.objects.values_list('id', flat=True))
+    Rating.objects.bulk_create(
+        (Rating(blog_id=blog_id, user=reader, rating=rng.randint(0, 6))
+         for reader in readers for blog_id in rng.sample(blog_ids, min(len(blog_ids), 200))),
+        batch_size=5000,
+    )
+    Blog.rebuild_rating_aggregates()
+    Blog.refresh_rating_scores(force=True)
+    mean, weight = RatingPrior.current()
+    print(f'     global mean {mean:.3f}, prior weight {weight:g}')
+    check('refresh skipped within tolerance', Blog.refresh_rating_scores() is None)
+
+    def column_sort():
+        """Empty the precomputed rankings so the home page sorts by the column"""
+        RankingEntry.objects.all().delete()
+        cache.clear()
+
+    # One perfect rating against many nearly perfect ones
+    lucky, solid = Blog.objects.filter(rating_count=0)[:2]
+    Rating.objects.create(blog=lucky, user=readers[0], rating=6)
+    for i, reader in enumerate(readers[:50]):
+        Rating.objects.create(blog=solid, user=reader, rating=6 if i < 40 else 5)
+    lucky.refresh_from_db()
+    solid.refresh_from_db()
+    check('raw averages favour the single rating', lucky.rating_avg == 6 and math.isclose(solid.rating_avg, 5.8))
+    check('weighted score favours the many ratings', solid.rating_score > lucky.rating_score,
+          f'{solid.rating_score:.3f} > {lucky.rating_score:.3f}')
+    column_sort()
+    client = Client()
+    shown = [blog.pk for blog in client.get(reverse('blog-home') + '?sort_by=rating').context['blogs']]
+    check('home rating sort puts it first', shown[:1] == [solid.pk], str(shown[:3]))
+
+    # Incremental updates
+    rating = Rating.objects.get(blog=solid, user=readers[45])
+    rating.rating = 0
+    rating.save()
+    Rating.objects.filter(blog=solid, user=readers[0]).get().delete()
+    Rating.objects.create(blog=solid, user=readers[55], rating=3)
+    solid.refresh_from_db()
+    check('score follows create, edit and delete', math.isclose(solid.rating_score, expected_score(solid), rel_tol=1e-12))
+
+    # Drift of the global mean
+    low = [blog_id for blog_id in blog_ids if blog_id not in (lucky.pk, solid.pk)][:2000]
+    critic = CustomUser.objects.create(username='score_critic', email='critic@example.com')
+    Rating.objects.bulk_create(Rating(blog_id=blog_id, user=critic, rating=0) for blog_id in low)
+    Blog.rebuild_rating_aggregates(Blog.objects.filter(pk__in=low))
+    refreshed = Blog.refresh_rating_scores(batch_size=997)
+    check('refresh runs after drift', refreshed is not None and refreshed[0] < mean, str(refreshed))
+    sample = Blog.objects.order_by('?')[:200]
+    check('refreshed scores use the new mean',
+          all(math.isclose(blog.rating_score, expected_score(blog), rel_tol=1e-12) for blog in sample))
+
+    # The home page's sort query and its plan
+    column_sort()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    report, statements = {'posts': args.posts}, {}
+
+    def timed(sql):
+        def run():
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                cursor.fetchall()
+        return measure(run, args.repeat)
+
+    for sort_by in ('rating', '-rating'):
+        with CaptureQueriesContext(connection) as queries:
+            client.get(reverse('blog-home') + f'?sort_by={sort_by}')
+        sql = next(q['sql'] for q in queries.captured_queries if 'ORDER BY "blogs_blog"."rating_score"' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' / '.join(row[-1] for row in cursor.fetchall())
+        check(f'?sort_by={sort_by} reads {INDEX}', INDEX in plan and 'TEMP B-TREE' not in plan, plan)
+        statements[sort_by] = sql
+        report[sort_by] = {'plan': plan, 'indexed': timed(sql)}
+
+    with connection.schema_editor() as editor:
+        editor.remove_index(Blog, next(index for index in Blog._meta.indexes if index.name == INDEX))
+    for sort_by, sql in statements.items():
+        report[sort_by]['unindexed'] = timed(sql)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Compare blog_home search latency: icontains scan vs the full-text backend.
+
+    python -m benchmarks.search_latency --sizes 10000 100000
+"""
+import argparse
+import json
+
+from benchmarks.common import measure, seed_blogs, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--query', default='datab')
+    args = parser.parse_args()
+
+    setup_django()
+    from blogs.models import Blog
+    from blogs.search import BasicSearchBackend, get_search_backend
+
+    basic, fulltext = BasicSearchBackend(), get_search_backend()
+    results = []
+    seeded = 0
+    for size in sorted(args.sizes):
+        seed_blogs(size - seeded)
+        seeded = size
+        fulltext.rebuild()
+
+        def run(backend):
+            qs = backend.search(Blog.objects.all(), args.query)
+            if backend.ranked:
+                qs = qs.order_by('-search_rank')
+            return list(qs[:9]), qs.count()
+
+        results.append({
+            'posts': size,
+            'query': args.query,
+            'icontains': measure(lambda: run(basic), args.repeat),
+            type(fulltext).__name__: measure(lambda: run(fulltext), args.repeat),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+"""
+Settings for servers started by the benchmarks: the project settings
+pointed at the benchmark's SQLite file (BENCH_DB_PATH).
+"""
+import os
+
+from blog_project.settings import *  # noqa: F401,F403
+from blog_project.settings import DATABASES
+
+DATABASES = {'default': {**DATABASES['default'], 'NAME': os.environ['BENCH_DB_PATH']}}
+# Servers run with DEBUG off and without collectstatic, so skip the manifest
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
@@ -0,0 +1,316 @@
+"""
+Synthetic data generator for load tests.
+
+Seeds users, blogs, ratings and favorites with bulk_create in batches, so a
+production-sized database (1M blogs, 100k users, 10M ratings and favorites)
+can be built in minutes rather than the hours that one Model.save() per row
+would take. Popularity is skewed the way real traffic is:
+
+- authors are a small share of users, and a few of them write most posts
+- blog popularity follows a Zipf distribution; views, ratings and favorites
+  all concentrate on the same head of popular posts
+- reader activity follows a Pareto distribution, so most users rate a
+  handful of posts and a few rate thousands
+- categories are uneven, and posts are spread over the last two years
+
+bulk_create skips signals, so the generator creates profiles itself and
+afterwards rebuilds the rating aggregates and the search index with the same
+helpers the management commands use. Rating and favorite created_at columns
+are auto_now_add and get the seeding time.
+
+    python -m benchmarks.synthetic --scale full --db /tmp/blog-full.sqlite3
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import timedelta
+
+from benchmarks.common import WORDS, setup_django
+
+# users, blogs, ratings, favorites
+SCALES = {
+    'tiny': (200, 2_000, 10_000, 5_000),
+    'small': (1_000, 10_000, 60_000, 40_000),
+    'medium': (10_000, 100_000, 600_000, 400_000),
+    'full': (100_000, 1_000_000, 6_000_000, 4_000_000),
+}
+USER_PREFIX = 'synth_user_'
+PASSWORD = 'password123'
+AUTHOR_SHARE = 0.05
+CATEGORIES = (
+    'Technology', 'Travel', 'Food', 'Lifestyle', 'Business', 'Education',
+    'Health', 'Science', 'Sports', 'Music', 'Art', 'History',
+)
+BLOG_ZIPF = 0.9
+AUTHOR_ZIPF = 1.0
+CATEGORY_ZIPF = 0.8
+ACTIVITY_PARETO = 1.2
+SPAN = timedelta(days=730)
+PARAGRAPHS = 2_000
+REVIEWS = 1_000
+REVIEW_SHARE = 0.3
+# Scores 0..6 lean positive, like most review sites
+SCORE_WEIGHTS = list(itertools.accumulate((2, 2, 4, 8, 16, 20, 12)))
+
+
+def zipf_weights(count, exponent):
+    """Cumulative Zipf weights for ranks 1..count, for random.choices(cum_weights=...)"""
+    return list(itertools.accumulate(rank ** -exponent for rank in range(1, count + 1)))
+
+
+def activity_counts(rng, users, total, cap):
+    """Split `total` interactions over `users` with a Pareto tail, each at most `cap`"""
+    weights = [rng.paretovariate(ACTIVITY_PARETO) for _ in range(users)]
+    scale = total / sum(weights)
+    counts = [min(cap, int(weight * scale)) for weight in weights]
+    # Hand out what rounding and the cap dropped, one each to random users
+    short = total - sum(counts)
+    while short > 0:
+        index = rng.randrange(users)
+        if counts[index] < cap:
+            counts[index] += 1
+            short -= 1
+    return counts
+
+
+class Generator:
+    """Bulk seeder; each step can also be run on its own"""
+
+    def __init__(self, seed=42, batch_size=5000, verbose=True):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self.now = None
+
+    def log(self, message):
+        if self.verbose:
+            print(message, flush=True)
+
+    def insert(self, model, rows, label, total):
+        """bulk_create `rows` in batches, each in its own transaction"""
+        from django.db import transaction
+
+        start = time.perf_counter()
+        done = 0
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+            done += len(batch)
+            if self.verbose and (done % (self.batch_size * 20) == 0 or done == total):
+                rate = done / (time.perf_counter() - start)
+                self.log(f'  {label}: {done:,}/{total:,} ({rate:,.0f} rows/s)')
+        return done
+
+    def run(self, users, blogs, ratings, favorites):
+        from django.db import connection
+        from django.utils import timezone
+
+        self.now = timezone.now()
+        if connection.vendor == 'sqlite':
+            # A benchmark database can be re-seeded, so skip the fsyncs
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+        start = time.perf_counter()
+        user_ids, author_ids = self.seed_users(users)
+        category_ids = self.seed_categories()
+        blog_ids = self.seed_blogs(blogs, author_ids, category_ids)
+        popularity = self.popularity(blog_ids)
+        self.seed_ratings(ratings, user_ids, blog_ids, popularity)
+        self.seed_favorites(favorites, user_ids, blog_ids, popularity)
+        self.finish()
+        self.log(f'Seeded in {time.perf_counter() - start:,.1f}s')
+
+    def seed_users(self, count):
+        """Users with one shared password hash, plus their profiles"""
+        from django.contrib.auth.hashers import make_password
+        from users.models import CustomUser, Profile
+
+        self.log(f'Users: {count:,}')
+        password = make_password(PASSWORD)
+        authors = max(1, int(count * AUTHOR_SHARE))
+        rng = self.rng
+
+        def rows():
+            for n in range(count):
+                yield CustomUser(
+                    username=f'{USER_PREFIX}{n}',
+                    email=f'{USER_PREFIX}{n}@example.com',
+                    password=password,
+                    role='author' if n < authors else 'reader',
+                    is_email_verified=True,
+                    date_joined=self.now - SPAN * rng.random(),
+                )
+
+        self.insert(CustomUser, rows(), 'users', count)
+        user_ids = list(
+            CustomUser.objects.filter(username__startswith=USER_PREFIX).order_by('pk').values_list('pk', flat=True)
+        )
+        self.insert(Profile, (Profile(user_id=pk) for pk in user_ids), 'profiles', len(user_ids))
+        return user_ids, user_ids[:authors]
+
+    def seed_categories(self):
+        from django.utils.text import slugify
+        from blogs.models import Category
+
+        return [
+            Category.objects.get_or_create(name=name, defaults={'slug': slugify(name)})[0].pk
+            for name in CATEGORIES
+        ]
+
+    def paragraphs(self):
+        """A pool of paragraphs with their excerpts, so bodies are cheap to build"""
+        from blogs.models import Blog
+
+        rng = self.rng
+        pool = []
+        for _ in range(PARAGRAPHS):
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+            # Every paragraph is longer than EXCERPT_WORDS, so a body's
+            # excerpt is its first paragraph's excerpt
+            pool.append((text, Blog.make_excerpt(text)))
+        return pool
+
+    def seed_blogs(self, count, author_ids, category_ids):
+        """Blogs in created_at order, returned as ids in that order"""
+        from blogs.models import Blog
+
+        self.log(f'Blogs: {count:,}')
+        rng = self.rng
+        pool = self.paragraphs()
+        author_weights = zipf_weights(len(author_ids), AUTHOR_ZIPF)
+        category_weights = zipf_weights(len(category_ids), CATEGORY_ZIPF)
+        first_id = (Blog.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+        step = SPAN / max(count, 1)
+        oldest = self.now - SPAN
+
+        def rows():
+            for n in range(count):
+                paragraphs = rng.choices(pool, k=rng.randint(2, 8))
+                yield Blog(
+                    title=' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 9))).capitalize(),
+                    slug=f'synth-{first_id + n}',
+                    body='\n\n'.join(text for text, _ in paragraphs),
+                    excerpt=paragraphs[0][1],
+                    author_id=rng.choices(author_ids, cum_weights=author_weights)[0],
+                    category_id=rng.choices(category_ids, cum_weights=category_weights)[0],
+                    created_at=oldest + step * n + timedelta(seconds=rng.random() * 60),
+                )
+
+        self.insert(Blog, rows(), 'blogs', count)
+        return list(Blog.objects.filter(slug__startswith='synth-').order_by('pk').values_list('pk', flat=True))
+
+    def popularity(self, blog_ids):
+        """Blog ids shuffled into popularity rank order, with cumulative Zipf weights"""
+        ranked = list(blog_ids)
+        self.rng.shuffle(ranked)
+        return ranked, zipf_weights(len(ranked), BLOG_ZIPF)
+
+    def interactions(self, total, user_ids, popularity):
+        """(user_id, blog_id) pairs, unique per pair, skewed on both sides"""
+        ranked, weights = popularity
+        rng = self.rng
+        counts = activity_counts(rng, len(user_ids), total, cap=len(ranked) // 2)
+        for user_id, count in zip(user_ids, counts):
+            seen = set()
+            while len(seen) < count:
+                for blog_id in rng.choices(ranked, cum_weights=weights, k=count - len(seen)):
+                    if blog_id not in seen:
+                        seen.add(blog_id)
+                        yield user_id, blog_id
+
+    def seed_ratings(self, count, user_ids, blog_ids, popularity):
+        from blogs.models import Rating
+
+        self.log(f'Ratings: {count:,}')
+        rng = self.rng
+        reviews = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 25))) for _ in range(REVIEWS)]
+        rows = (
+            Rating(
+                user_id=user_id,
+                blog_id=blog_id,
+                rating=rng.choices(range(7), cum_weights=SCORE_WEIGHTS)[0],
+                review=rng.choice(reviews) if rng.random() < REVIEW_SHARE else '',
+            )
+            for user_id, blog_id in self.interactions(count, user_ids, popularity)
+        )
+        self.insert(Rating, rows, 'ratings', count)
+
+    def seed_favorites(self, count, user_ids, blog_ids, popularity):
+        from blogs.models import Favorite
+
+        self.log(f'Favorites: {count:,}')
+        rows = (Favorite(user_id=user_id, blog_id=blog_id) for user_id, blog_id in self.interactions(count, user_ids, popularity))
+        self.insert(Favorite, rows, 'favorites', count)
+
+    def finish(self):
+        """Derived data that bulk_create bypassed: aggregates, view counts, rankings, search index"""
+        from django.db.models import F, FloatField, Value
+        from django.db.models.functions import Log
+        from blogs import rankings
+        from blogs.models import Blog
+        from blogs.search import get_search_backend
+
+        started = time.perf_counter()
+        Blog.rebuild_rating_aggregates()
+        Blog.refresh_rating_scores(force=True)
+        rankings.rebuild_favorite_counts()
+        # Views track popularity: roughly 40 reads per favorite plus a long tail
+        Blog.objects.update(views=F('favorite_count') * 40 + F('rating_count') * 10 + F('id') % 17)
+        # Trending as if all of that activity had just happened
+        activity = (
+            F('views') * rankings.VIEW_WEIGHT + F('rating_count') * rankings.RATING_WEIGHT
+            + F('favorite_count') * rankings.FAVORITE_WEIGHT + 1
+        )
+        Blog.objects.update(trending_score=Log(2, activity, output_field=FloatField()) + Value(rankings.activity(1)))
+        entries = rankings.rebuild_rankings()
+        indexed = get_search_backend().rebuild()
+        self.log(f'Aggregates, views, {entries:,} ranking entries and search index ({indexed:,} indexed) '
+                 f'in {time.perf_counter() - started:,.1f}s')
+
+
+def is_seeded():
+    from users.models import CustomUser
+
+    return CustomUser.objects.filter(username=f'{USER_PREFIX}0').exists()
+
+
+def seed(scale='small', seed=42, batch_size=5000, verbose=True, **counts):
+    """Seed a preset scale; counts= overrides users, blogs, ratings or favorites"""
+    users, blogs, ratings, favorites = SCALES[scale]
+    sizes = {'users': users, 'blogs': blogs, 'ratings': ratings, 'favorites': favorites}
+    sizes.update({key: value for key, value in counts.items() if value is not None})
+    Generator(seed=seed, batch_size=batch_size, verbose=verbose).run(**sizes)
+    return sizes
+
+
+def add_arguments(parser):
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--blogs', type=int)
+    parser.add_argument('--ratings', type=int)
+    parser.add_argument('--favorites', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--db', help='SQLite file to seed (default: a fresh temporary file)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    if is_seeded():
+        print(f'{db_path} is already seeded')
+        return
+    seed(args.scale, args.seed, args.batch_size, users=args.users, blogs=args.blogs,
+         ratings=args.ratings, favorites=args.favorites)
+    print(db_path)
+
+
+if __name__ == '__main__':
+    main()
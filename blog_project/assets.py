@@ -0,0 +1,165 @@
+"""
+Fingerprinted, precompressed static files served by the app itself.
+
+CompressedManifestStaticFilesStorage is Django's manifest storage (file
+names carry a content hash) that also writes .gz, and .br when the optional
+`brotli` package is installed, next to each compressible file during
+collectstatic. StaticFilesMiddleware serves STATIC_ROOT from the WSGI/ASGI
+app, so no nginx is needed in front. It picks the best precompressed file
+for the client's Accept-Encoding and marks hashed names immutable for a
+year.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+from urllib.parse import unquote
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot')
+# Precompressed copies are only kept when they save at least this fraction
+MIN_SAVING = 0.05
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+DEFAULT_MAX_AGE = 60
+
+
+def _compressors():
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes .gz/.br copies of compressible files"""
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        for extension, compress in _compressors():
+            compressed = compress(data)
+            if len(compressed) <= len(data) * (1 - MIN_SAVING):
+                if self.exists(name + extension):
+                    self.delete(name + extension)
+                self._save(name + extension, ContentFile(compressed))
+
+
+def _accepted_encodings(request):
+    """Content codings the client accepts, ignoring those with q=0"""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.partition(';')
+        try:
+            quality = float(params.strip()[2:]) if params.strip().startswith('q=') else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """Serve files under STATIC_URL from STATIC_ROOT with compression and cache headers
+
+    Place it right after SecurityMiddleware. Requests for files that were
+    not collected fall through to the rest of the stack.
+    """
+
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/') if settings.STATIC_URL else None
+        self.root = str(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+        self._immutable = None
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @property
+    def immutable(self):
+        """Hashed file names listed in the staticfiles manifest"""
+        if self._immutable is None:
+            self._immutable = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        return self._immutable
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.serve_static(request)
+        if response is not None:
+            return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # A stat() and an open(), like Django's own ASGIStaticFilesHandler
+        response = self.serve_static(request)
+        if response is not None:
+            return response
+        return await self.get_response(request)
+
+    def serve_static(self, request):
+        if self.prefix and self.root and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            return self.serve(request, request.path[len(self.prefix):])
+        return None
+
+    def serve(self, request, path):
+        name = posixpath.normpath(unquote(path)).lstrip('/')
+        try:
+            full_path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(full_path):
+            return None
+
+        compressed = [(coding, full_path + extension) for coding, extension in self.ENCODINGS
+                      if os.path.isfile(full_path + extension)]
+        accepted = _accepted_encodings(request)
+        served_path, encoding = next(
+            ((path, coding) for coding, path in compressed if coding in accepted), (full_path, None)
+        )
+
+        # Each encoding is a different representation with its own validator
+        stat = os.stat(served_path)
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+        else:
+            content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+            response = FileResponse(open(served_path, 'rb'), content_type=content_type)
+            del response['Content-Disposition']
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Last-Modified'] = http_date(stat.st_mtime)
+
+        response['ETag'] = etag
+        if compressed:
+            response['Vary'] = 'Accept-Encoding'
+        if name in self.immutable:
+            response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = f'public, max-age={DEFAULT_MAX_AGE}'
+        return response
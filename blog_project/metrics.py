@@ -0,0 +1,288 @@
+"""
+Per-view request metrics and sampled profiling.
+
+PerformanceMiddleware records, for every request that resolves to a named
+URL, the wall time, the number and total time of DB queries, the template
+render time and the response size. It handles sync and async requests
+alike, so under ASGI the async views are not pushed through a thread.
+Queries are timed by an execute wrapper added to every connection as it
+opens, and renders by the TimedDjangoTemplates backend; both charge the
+request in the `_current` context variable, which sync_to_async carries
+into the threads where async views run their queries and templates. The
+last PERF_METRICS_WINDOW samples per view are kept in a ring buffer for
+p50/p95/p99, and running totals are kept for Prometheus counters. With
+PERF_PROFILE_SAMPLE_RATE > 0 a random share of requests also runs under
+cProfile; for async requests that profiles the event loop thread only.
+
+Everything is held in process memory, so each worker reports its own
+numbers. Staff users read them at /metrics/ (JSON, or Prometheus text with
+?format=prometheus). A scraper can use `Authorization: Bearer
+<PERF_METRICS_TOKEN>` instead of a staff session.
+"""
+import contextvars
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, JsonResponse
+from django.template.backends.django import DjangoTemplates, Template as DjangoTemplate
+from django.utils import timezone
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Sample fields: (name, Prometheus metric, help text)
+FIELDS = (
+    ('duration', 'blog_request_duration_seconds', 'Wall time per request'),
+    ('db_queries', 'blog_request_db_queries', 'Database queries per request'),
+    ('db_time', 'blog_request_db_seconds', 'Database time per request'),
+    ('template_time', 'blog_request_template_seconds', 'Template render time per request'),
+    ('response_bytes', 'blog_response_bytes', 'Response body size'),
+)
+PROFILE_LIMIT = 20
+PROFILE_LINES = 40
+
+_current = contextvars.ContextVar('perf_current_request', default=None)
+
+
+def _percentile(ordered, quantile):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(quantile * len(ordered))) - 1))
+    return ordered[index]
+
+
+class MetricsRegistry:
+    """Ring buffers of recent samples and running totals per view name"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = defaultdict(lambda: deque(maxlen=self.window))
+            self.totals = defaultdict(lambda: dict.fromkeys(['count'] + [field for field, *_ in FIELDS], 0))
+            self.profiles = deque(maxlen=PROFILE_LIMIT)
+
+    def record(self, view, sample):
+        with self.lock:
+            self.samples[view].append(sample)
+            totals = self.totals[view]
+            totals['count'] += 1
+            for field, *_ in FIELDS:
+                totals[field] += sample[field]
+
+    def add_profile(self, view, stats_text):
+        with self.lock:
+            self.profiles.append({'view': view, 'at': timezone.now().isoformat(), 'stats': stats_text})
+
+    def summary(self):
+        """{view: {'count': n, field: {'p50': .., 'p95': .., 'p99': .., 'sum': ..}}}"""
+        with self.lock:
+            snapshot = {view: list(samples) for view, samples in self.samples.items()}
+            totals = {view: dict(values) for view, values in self.totals.items()}
+        summary = {}
+        for view, samples in sorted(snapshot.items()):
+            entry = {'count': totals[view]['count'], 'window': len(samples)}
+            for field, *_ in FIELDS:
+                ordered = sorted(sample[field] for sample in samples)
+                entry[field] = {f'p{int(q * 100)}': _percentile(ordered, q) for q in QUANTILES}
+                entry[field]['sum'] = totals[view][field]
+            summary[view] = entry
+        return summary
+
+    def prometheus(self):
+        """Summaries in the Prometheus text exposition format"""
+        summary = self.summary()
+        lines = []
+        for field, metric, help_text in FIELDS:
+            lines.append(f'# HELP {metric} {help_text}, by view')
+            lines.append(f'# TYPE {metric} summary')
+            for view, entry in summary.items():
+                label = view.replace('\\', '\\\\').replace('"', '\\"')
+                for quantile in QUANTILES:
+                    value = entry[field][f'p{int(quantile * 100)}']
+                    lines.append(f'{metric}{{view="{label}",quantile="{quantile}"}} {value:.6g}')
+                lines.append(f'{metric}_sum{{view="{label}"}} {entry[field]["sum"]:.6g}')
+                lines.append(f'{metric}_count{{view="{label}"}} {entry["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(getattr(settings, 'PERF_METRICS_WINDOW', 1000))
+
+
+class TimedTemplate(DjangoTemplate):
+    """Template that charges its render time to the current request"""
+
+    def render(self, context=None, request=None):
+        current = _current.get()
+        if current is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            current['template_time'] += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates are timed by PerformanceMiddleware
+
+    Timed at the backend template, which runs once per render()/
+    render_to_string() call; {% include %}/{% extends %} render inside it
+    and are not double counted.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    current = _current.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current['db_queries'] += 1
+        current['db_time'] += time.perf_counter() - start
+
+
+def _add_query_timer(sender=None, connection=None, **kwargs):
+    # First in the list, so connection.execute_wrapper() blocks still pop their own
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _timed_execute)
+
+
+def _install_query_timer():
+    connection_created.connect(_add_query_timer, dispatch_uid='blog_project.metrics.query_timer')
+    for connection in connections.all(initialized_only=True):
+        _add_query_timer(connection=connection)
+
+
+class PerformanceMiddleware:
+    """Record per-view timings; place it first in MIDDLEWARE"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERF_METRICS_ENABLED', True)
+        self.profile_rate = getattr(settings, 'PERF_PROFILE_SAMPLE_RATE', 0.0)
+        self.profile_dir = getattr(settings, 'PERF_PROFILE_DIR', '')
+        if self.enabled:
+            _install_query_timer()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        current, token, profiler, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(token, profiler)
+        return self.finish(request, response, current, profiler, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        current, token, profiler, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(token, profiler)
+        return self.finish(request, response, current, profiler, time.perf_counter() - start)
+
+    def start(self):
+        current = {'db_queries': 0, 'db_time': 0.0, 'template_time': 0.0}
+        token = _current.set(current)
+        profiler = cProfile.Profile() if self.profile_rate and random.random() < self.profile_rate else None
+        if profiler is not None:
+            profiler.enable()
+        return current, token, profiler, time.perf_counter()
+
+    def stop(self, token, profiler):
+        if profiler is not None:
+            profiler.disable()
+        _current.reset(token)
+
+    def finish(self, request, response, current, profiler, duration):
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.url_name:
+            return response
+        view = match.view_name
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        registry.record(view, {'duration': duration, 'response_bytes': size, **current})
+        if profiler is not None:
+            self.save_profile(view, profiler)
+        return response
+
+    def save_profile(self, view, profiler):
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+        registry.add_profile(view, output.getvalue())
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            filename = f'{view.replace(":", "_")}-{time.time_ns()}.prof'
+            stats.dump_stats(os.path.join(self.profile_dir, filename))
+
+
+def _bearer_token_ok(request):
+    expected = getattr(settings, 'PERF_METRICS_TOKEN', '')
+    supplied = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(expected) and hmac.compare_digest(supplied, f'Bearer {expected}')
+
+
+def staff_or_token_required(view_func):
+    """Allow staff users, or requests carrying the PERF_METRICS_TOKEN bearer token"""
+    staff_view = staff_member_required(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if _bearer_token_ok(request):
+            return view_func(request, *args, **kwargs)
+        return staff_view(request, *args, **kwargs)
+    return wrapper
+
+
+@staff_or_token_required
+def metrics(request):
+    """Per-view percentiles as JSON, or Prometheus text with ?format=prometheus"""
+    if request.GET.get('format') == 'prometheus':
+        return HttpResponse(registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    return JsonResponse({'views': registry.summary()})
+
+
+@staff_or_token_required
+def profiles(request):
+    """Recent sampled cProfile captures, newest first"""
+    with registry.lock:
+        captured = list(registry.profiles)
+    text = '\n\n'.join(f'== {entry["view"]} at {entry["at"]}\n{entry["stats"]}' for entry in reversed(captured))
+    return HttpResponse(text or 'No profiles captured; set PERF_PROFILE_SAMPLE_RATE to enable sampling.\n',
+                        content_type='text/plain; charset=utf-8')
@@ -0,0 +1,116 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+ReplicaRouter sends reads made while serving a GET/HEAD/OPTIONS request to
+one of settings.DATABASE_REPLICAS, picked once per request so every query
+sees the same replica. All writes, and the reads in any other request, go
+to the primary (`default`). Reads also stay on the primary inside an atomic
+block and outside requests (management commands, queue workers), because
+those read rows they have just claimed or written.
+
+ReplicaPinningMiddleware pins a request to the primary when the client has
+the DATABASE_REPLICA_PIN_COOKIE. A request that saves or deletes a model
+instance, such as a rating, favorite, blog edit, login session or profile
+update, switches to the primary for its remaining reads. It also sets that
+cookie for DATABASE_REPLICA_PIN_SECONDS, so the user's next pages show their
+own change even while the replicas lag. Writes are seen through
+db_for_write's `instance` hint, so queryset-level UPDATEs such as the view
+counter do not pin; code that bulk-writes something the user should see
+right away calls pin_to_primary().
+"""
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = contextvars.ContextVar('replica_state', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_to_primary():
+    """Send the rest of this request's reads, and the client's next few requests, to the primary"""
+    state = _state.get()
+    if state is not None:
+        state['primary'] = True
+        state['wrote'] = True
+
+
+class ReplicaRouter:
+    """Reads inside unpinned safe requests go to a replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state['primary'] or state['replica'] is None:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state['replica']
+
+    def db_for_write(self, model, **hints):
+        # Model.save()/delete() and related managers pass the instance
+        if 'instance' in hints:
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary through replication
+        return False if db in replicas() else None
+
+
+class ReplicaPinningMiddleware:
+    """Choose the database for each request; place it before SessionMiddleware"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cookie = getattr(settings, 'DATABASE_REPLICA_PIN_COOKIE', 'primary_pin')
+        self.pin_seconds = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        # The async ORM's sync_to_async threads inherit the context variable
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        aliases = replicas()
+        return {
+            'primary': request.method not in SAFE_METHODS or self.cookie in request.COOKIES,
+            'wrote': False,
+            'replica': random.choice(aliases) if aliases else None,
+        }
+
+    def finish(self, state, response):
+        if state['wrote'] and state['replica'] is not None:
+            response.set_cookie(self.cookie, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
@@ -32,10 +32,14 @@ INSTALLED_APPS = [
     # Local apps
     'users.apps.UsersConfig',
     'blogs.apps.BlogsConfig',
+    'mailer.apps.MailerConfig',
 ]
 
 MIDDLEWARE = [
+    'blog_project.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'blog_project.assets.StaticFilesMiddleware',
+    'blog_project.replicas.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -46,9 +50,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'blog_project.urls'
 
+# The stock DjangoTemplates backend, with renders timed for /metrics/
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'blog_project.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,13 +69,73 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'blog_project.wsgi.application'
 
-# Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database: DATABASE_ENGINE is 'sqlite' (default) or 'postgres' (pip install
+# "psycopg[binary]"). Connections are reused for DATABASE_CONN_MAX_AGE
+# seconds by each worker thread; 0 opens a new one for every request.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', '60'))
+if DATABASE_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'blog'),
+            'USER': os.environ.get('POSTGRES_USER', 'blog'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # PgBouncer in transaction pooling mode hands each transaction to
+            # any server connection, so cursors cannot outlive a transaction
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('POSTGRES_PGBOUNCER', 'False') == 'True',
+            'OPTIONS': {'connect_timeout': int(os.environ.get('POSTGRES_CONNECT_TIMEOUT', '5'))},
+        }
+    }
+else:
+    # blog_project.sqlite_backend runs init_command on every new connection:
+    # WAL lets readers work alongside a writer, synchronous=NORMAL is
+    # durable under WAL except for the last commits on power loss, mmap
+    # serves reads from the page cache and busy_timeout makes writers queue
+    # for the lock instead of failing. IMMEDIATE transactions take that lock
+    # at BEGIN, where the wait applies.
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    }
+    DATABASES = {
+        'default': {
+            'ENGINE': 'blog_project.sqlite_backend',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'OPTIONS': {
+                'init_command': ';'.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()),
+                'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+            },
+        }
     }
-}
+
+# Read replicas: SQLITE_REPLICA_PATHS or POSTGRES_REPLICA_HOSTS (comma
+# separated, host or host:port) add 'replica_1', 'replica_2', ... aliases.
+# Reads made while serving a request go to one of them unless the client
+# wrote within the last DATABASE_REPLICA_PIN_SECONDS (see blog_project.replicas)
+if DATABASE_ENGINE == 'postgres':
+    _replica_settings = [
+        {'HOST': host.partition(':')[0], 'PORT': host.partition(':')[2] or DATABASES['default']['PORT']}
+        for host in os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',') if host.strip()
+    ]
+else:
+    _replica_settings = [
+        {'NAME': path.strip()} for path in os.environ.get('SQLITE_REPLICA_PATHS', '').split(',') if path.strip()
+    ]
+DATABASE_REPLICAS = []
+for _number, _overrides in enumerate(_replica_settings, start=1):
+    DATABASES[f'replica_{_number}'] = {**DATABASES['default'], **_overrides, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{_number}')
+DATABASE_ROUTERS = ['blog_project.replicas.ReplicaRouter'] if DATABASE_REPLICAS else []
+DATABASE_REPLICA_PIN_COOKIE = 'primary_pin'
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', '10'))
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -98,6 +163,12 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# collectstatic writes content-hashed copies plus .gz/.br versions, which
+# blog_project.assets.StaticFilesMiddleware serves with far-future caching
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'blog_project.assets.CompressedManifestStaticFilesStorage'},
+}
 
 # Media files
 MEDIA_URL = '/media/'
@@ -106,6 +177,106 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache: 'locmem' (per process), 'file' (shared by every process on the
+# host, but increments are not atomic), or 'redis' / 'memcached' (shared by
+# every server, atomic increments; pip install redis / pymemcache)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        }
+    }
+elif CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+elif CACHE_BACKEND == 'memcached':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:11211'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'blog-site',
+        }
+    }
+
+# Whole-page cache for the home, detail, category and author pages,
+# invalidated by model signals. Anonymous and logged-in readers share the
+# stored page; each visitor's navbar, favorite and rating state is rendered
+# into it as a small uncached fragment (see blogs.page_cache).
+# Signals invalidate pages only in the cache they can see, so it is on by
+# default only with a cache shared by every process; turning it on with
+# locmem is for single-process deployments (manage.py check warns)
+BLOG_PAGE_CACHE_ENABLED = os.environ.get(
+    'BLOG_PAGE_CACHE_ENABLED', str(CACHE_BACKEND in ('redis', 'memcached'))
+) == 'True'
+BLOG_PAGE_CACHE_TIMEOUT = int(os.environ.get('BLOG_PAGE_CACHE_TIMEOUT', '300'))
+
+# Blog view counter: 'immediate' writes an F() update per view, 'buffered'
+# batches increments and flushes them on an interval or threshold.
+# The buffer lives in process memory ('memory'), where each server process
+# flushes its own, or in a shared cache ('cache', which requires
+# CACHE_BACKEND=redis or memcached), which the flush_view_counts command
+# can also drain from cron
+BLOG_VIEW_COUNTER_MODE = os.environ.get('BLOG_VIEW_COUNTER_MODE', 'immediate')
+BLOG_VIEW_COUNTER_BACKEND = os.environ.get('BLOG_VIEW_COUNTER_BACKEND', 'memory')
+BLOG_VIEW_COUNTER_FLUSH_INTERVAL = int(os.environ.get('BLOG_VIEW_COUNTER_FLUSH_INTERVAL', '10'))
+BLOG_VIEW_COUNTER_FLUSH_THRESHOLD = int(os.environ.get('BLOG_VIEW_COUNTER_FLUSH_THRESHOLD', '500'))
+
+# Responsive variants of uploaded images are resized after the upload commits,
+# in a pool of this many processes per server process; 0 resizes them in the
+# request thread instead (see blogs.images)
+BLOG_IMAGE_VARIANT_WORKERS = int(os.environ.get('BLOG_IMAGE_VARIANT_WORKERS', '2'))
+
+# Full-text search: 'auto' uses SQLite FTS5 or PostgreSQL tsvector when
+# available, 'basic' keeps plain icontains matching
+BLOG_SEARCH_BACKEND = os.environ.get('BLOG_SEARCH_BACKEND', 'auto')
+
+# Listing pagination: 'page' for numbered pages, 'cursor' for keyset
+# pagination with next/previous links only. A non-zero count cache timeout
+# caches the "Page X of Y" total in page mode
+BLOG_PAGINATION_MODE = os.environ.get('BLOG_PAGINATION_MODE', 'page')
+BLOG_PAGINATION_COUNT_CACHE_TIMEOUT = int(os.environ.get('BLOG_PAGINATION_COUNT_CACHE_TIMEOUT', '0'))
+
+# Precomputed top-rated, trending and most-favorited lists behind the home
+# page's ranked sorts (blogs.rankings), kept per category and globally.
+# Trending activity halves in weight every BLOG_TRENDING_HALF_LIFE_HOURS;
+# changing it makes existing trending scores incomparable with new events
+BLOG_RANKING_SIZE = int(os.environ.get('BLOG_RANKING_SIZE', '100'))
+BLOG_RANKING_MIN_RATINGS = int(os.environ.get('BLOG_RANKING_MIN_RATINGS', '1'))
+BLOG_TRENDING_HALF_LIFE_HOURS = float(os.environ.get('BLOG_TRENDING_HALF_LIFE_HOURS', '24'))
+
+# The rating sort orders by a Bayesian average: each rated blog counts
+# BLOG_RATING_PRIOR_WEIGHT extra ratings at the global mean. The mean is
+# re-read by `manage.py refresh_rating_scores`, which rewrites the scores
+# only once it has moved by more than BLOG_RATING_MEAN_TOLERANCE
+BLOG_RATING_PRIOR_WEIGHT = float(os.environ.get('BLOG_RATING_PRIOR_WEIGHT', '10'))
+BLOG_RATING_MEAN_TOLERANCE = float(os.environ.get('BLOG_RATING_MEAN_TOLERANCE', '0.01'))
+
+# Serve the home, detail, category and author pages from async views
+# (blogs.async_views); only worthwhile under an ASGI server
+BLOG_ASYNC_VIEWS = os.environ.get('BLOG_ASYNC_VIEWS', 'False') == 'True'
+
+# Per-view request metrics (blog_project.metrics), served to staff at
+# /metrics/; PERF_METRICS_TOKEN lets a Prometheus scraper in with a bearer
+# token. PERF_PROFILE_SAMPLE_RATE (0-1) runs that share of requests under
+# cProfile, optionally dumping .prof files to PERF_PROFILE_DIR
+PERF_METRICS_ENABLED = os.environ.get('PERF_METRICS_ENABLED', 'True') == 'True'
+PERF_METRICS_WINDOW = int(os.environ.get('PERF_METRICS_WINDOW', '1000'))
+PERF_METRICS_TOKEN = os.environ.get('PERF_METRICS_TOKEN', '')
+PERF_PROFILE_SAMPLE_RATE = float(os.environ.get('PERF_PROFILE_SAMPLE_RATE', '0'))
+PERF_PROFILE_DIR = os.environ.get('PERF_PROFILE_DIR', '')
+
 # Custom user model
 AUTH_USER_MODEL = 'users.CustomUser'
 
@@ -122,6 +293,15 @@ EMAIL_HOST_USER = 'rifatsarkercse@gmail.com'  # your Gmail address
 EMAIL_HOST_PASSWORD = 'bqta wsgh harn exjf'   # the 16-character app password
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Outbound mail queue: views enqueue, `manage.py send_queued_mail` delivers.
+# Failed sends are retried after base * 2^(attempt - 1) seconds (capped) and
+# become dead letters after MAIL_QUEUE_MAX_ATTEMPTS
+MAIL_QUEUE_BATCH_SIZE = int(os.environ.get('MAIL_QUEUE_BATCH_SIZE', '50'))
+MAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('MAIL_QUEUE_MAX_ATTEMPTS', '5'))
+MAIL_QUEUE_RETRY_BASE_SECONDS = int(os.environ.get('MAIL_QUEUE_RETRY_BASE_SECONDS', '60'))
+MAIL_QUEUE_RETRY_MAX_SECONDS = int(os.environ.get('MAIL_QUEUE_RETRY_MAX_SECONDS', '3600'))
+MAIL_QUEUE_CLAIM_TIMEOUT = int(os.environ.get('MAIL_QUEUE_CLAIM_TIMEOUT', '600'))
+
 # Login settings
 LOGIN_REDIRECT_URL = 'blog-home'
 LOGIN_URL = 'login'
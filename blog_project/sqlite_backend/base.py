@@ -0,0 +1,56 @@
+"""
+SQLite backend that tunes every new connection.
+
+Understands the `init_command` and `transaction_mode` OPTIONS that Django
+5.1 adds to its own SQLite backend, so the settings keep working when ENGINE
+goes back to django.db.backends.sqlite3 after an upgrade:
+
+- init_command: ';'-separated statements run on each new connection (the
+  journal_mode, synchronous, mmap_size and busy_timeout pragmas)
+- transaction_mode: 'DEFERRED' (SQLite's default), 'IMMEDIATE' or
+  'EXCLUSIVE'. IMMEDIATE takes the write lock at BEGIN, so concurrent
+  writers wait up to busy_timeout for it instead of failing with "database
+  is locked" when a transaction that started by reading tries to write.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'EXCLUSIVE', 'IMMEDIATE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def init_commands(self):
+        command = self.settings_dict['OPTIONS'].get('init_command') or ''
+        return [statement.strip() for statement in command.split(';') if statement.strip()]
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        if mode is None:
+            return None
+        if mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES['{self.alias}']['OPTIONS']['transaction_mode'] must be one of "
+                f"{', '.join(TRANSACTION_MODES)}, not {mode!r}"
+            )
+        return mode.upper()
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Ours to handle, not sqlite3.connect() arguments
+        kwargs.pop('init_command', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in self.init_commands:
+            conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.transaction_mode
+        if mode is None:
+            return super()._start_transaction_under_autocommit()
+        self.cursor().execute(f'BEGIN {mode}')
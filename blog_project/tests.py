@@ -0,0 +1,286 @@
+import re
+import shutil
+import tempfile
+from unittest import mock, skipIf
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.management import call_command
+from django.db import connections, router
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve
+
+from blogs.models import Blog, Rating
+from blogs.tests import PLAIN_STORAGES
+from users.models import CustomUser
+from .assets import StaticFilesMiddleware, brotli
+from .metrics import MetricsRegistry, PerformanceMiddleware, registry
+from .replicas import ReplicaPinningMiddleware, pin_to_primary
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False)
+class StaticFilesTests(TestCase):
+    """collectstatic output served by StaticFilesMiddleware"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        root = tempfile.mkdtemp(prefix='blog-static-tests-')
+        cls.addClassCleanup(shutil.rmtree, root)
+        static_root = override_settings(STATIC_ROOT=root)
+        static_root.enable()
+        cls.addClassCleanup(static_root.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def setUp(self):
+        match = re.search(r'href="(/static/css/blog\.[0-9a-f]{12}\.css)"', self.client.get('/').content.decode())
+        self.assertIsNotNone(match, 'page links the fingerprinted stylesheet')
+        self.url = match.group(1)
+
+    def test_hashed_file_is_immutable(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='identity')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertTrue(response['Content-Type'].startswith('text/css'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_gzip_is_served_when_accepted(self):
+        identity = self.client.get(self.url, HTTP_ACCEPT_ENCODING='identity')
+        gzipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertLess(int(gzipped['Content-Length']), int(identity['Content-Length']))
+        refused = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', refused)
+
+    @skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    def test_revalidation_answers_304(self):
+        etag = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_unhashed_name_gets_a_short_max_age(self):
+        self.assertEqual(self.client.get('/static/css/blog.css')['Cache-Control'], 'public, max-age=60')
+
+    async def test_async_stack_serves_the_file(self):
+        self.assertTrue(iscoroutinefunction(StaticFilesMiddleware(self.async_view)))
+        response = await self.async_client.get(self.url, headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    @staticmethod
+    async def async_view(request):
+        return HttpResponse()
+
+    def test_missing_and_escaping_paths_are_404(self):
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+
+@override_settings(
+    DATABASE_ROUTERS=['blog_project.replicas.ReplicaRouter'],
+    DATABASE_REPLICAS=['replica_1'],
+    DATABASE_REPLICA_PIN_COOKIE='primary_pin',
+    DATABASE_REPLICA_PIN_SECONDS=10,
+)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Database chosen for reads by ReplicaRouter and the pin cookie set by ReplicaPinningMiddleware"""
+
+    def handle(self, method='get', cookies=None, work=None):
+        """(response, alias of a read made after `work`) for a request through the middleware"""
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        reads = []
+
+        def view(request):
+            if work is not None:
+                work()
+            reads.append(router.db_for_read(Blog))
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(request)
+        return response, reads[0]
+
+    def test_safe_request_reads_the_replica(self):
+        response, alias = self.handle()
+        self.assertEqual(alias, 'replica_1')
+        self.assertNotIn('primary_pin', response.cookies)
+
+    def test_unsafe_request_stays_on_the_primary(self):
+        response, alias = self.handle('post', work=lambda: router.db_for_write(Rating, instance=Rating()))
+        self.assertEqual(alias, 'default')
+        self.assertEqual(response.cookies['primary_pin']['max-age'], 10)
+
+    def test_write_during_a_safe_request_pins_it(self):
+        # e.g. the add-favorite GET link saving a Favorite
+        response, alias = self.handle(work=lambda: router.db_for_write(Rating, instance=Rating()))
+        self.assertEqual(alias, 'default')
+        self.assertIn('primary_pin', response.cookies)
+
+    def test_queryset_update_does_not_pin(self):
+        # The view counter's UPDATE has no instance hint
+        response, alias = self.handle(work=lambda: router.db_for_write(Blog))
+        self.assertEqual(alias, 'replica_1')
+        self.assertNotIn('primary_pin', response.cookies)
+
+    def test_pin_to_primary(self):
+        response, alias = self.handle(work=pin_to_primary)
+        self.assertEqual(alias, 'default')
+        self.assertIn('primary_pin', response.cookies)
+
+    def test_pinned_client_reads_the_primary(self):
+        response, alias = self.handle(cookies={'primary_pin': '1'})
+        self.assertEqual(alias, 'default')
+        # The pin is not extended by reads
+        self.assertNotIn('primary_pin', response.cookies)
+
+    def test_atomic_block_reads_the_primary(self):
+        with mock.patch.object(connections['default'], 'in_atomic_block', True):
+            self.assertEqual(self.handle()[1], 'default')
+
+    def test_reads_outside_a_request_use_the_primary(self):
+        self.assertEqual(router.db_for_read(Blog), 'default')
+
+    async def test_async_request_reads_the_replica(self):
+        reads = []
+
+        async def view(request):
+            reads.append(await sync_to_async(router.db_for_read)(Blog))
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(AsyncRequestFactory().get('/'))
+        self.assertEqual(reads, ['replica_1'])
+        self.assertNotIn('primary_pin', response.cookies)
+
+    async def test_async_write_pins_the_request(self):
+        reads = []
+
+        async def view(request):
+            await sync_to_async(router.db_for_write)(Rating, instance=Rating())
+            reads.append(await sync_to_async(router.db_for_read)(Blog))
+            return HttpResponse()
+
+        response = await ReplicaPinningMiddleware(view)(AsyncRequestFactory().get('/'))
+        self.assertEqual(reads, ['default'])
+        self.assertIn('primary_pin', response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_no_pin(self):
+        response, alias = self.handle(work=lambda: router.db_for_write(Rating, instance=Rating()))
+        self.assertEqual(alias, 'default')
+        self.assertNotIn('primary_pin', response.cookies)
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """Percentiles, totals and the Prometheus text of MetricsRegistry"""
+
+    def sample(self, value):
+        return {'duration': value, 'db_queries': value, 'db_time': value, 'template_time': value, 'response_bytes': value}
+
+    def test_percentiles_over_the_window(self):
+        metrics = MetricsRegistry(window=100)
+        for value in range(150, 0, -1):
+            metrics.record('blog-home', self.sample(value))
+        entry = metrics.summary()['blog-home']
+        # Only the last 100 samples, 100 down to 1, are kept; the totals count all 150
+        self.assertEqual((entry['count'], entry['window']), (150, 100))
+        self.assertEqual(entry['duration'], {'p50': 50, 'p95': 95, 'p99': 99, 'sum': sum(range(1, 151))})
+
+    def test_small_samples(self):
+        metrics = MetricsRegistry()
+        self.assertEqual(metrics.summary(), {})
+        metrics.record('blog-detail', self.sample(7))
+        self.assertEqual(metrics.summary()['blog-detail']['db_time'], {'p50': 7, 'p95': 7, 'p99': 7, 'sum': 7})
+        metrics.reset()
+        self.assertEqual(metrics.summary(), {})
+
+    def test_prometheus_text(self):
+        metrics = MetricsRegistry()
+        for value in (0.1, 0.2, 0.3, 0.4):
+            metrics.record('blog-home', self.sample(value))
+        metrics.record('odd"view', self.sample(1))
+        lines = metrics.prometheus().splitlines()
+        self.assertEqual(lines[:2], [
+            '# HELP blog_request_duration_seconds Wall time per request, by view',
+            '# TYPE blog_request_duration_seconds summary',
+        ])
+        self.assertIn('blog_request_duration_seconds{view="blog-home",quantile="0.5"} 0.2', lines)
+        self.assertIn('blog_request_duration_seconds{view="blog-home",quantile="0.99"} 0.4', lines)
+        self.assertIn('blog_request_duration_seconds_sum{view="blog-home"} 1', lines)
+        self.assertIn('blog_request_duration_seconds_count{view="blog-home"} 4', lines)
+        self.assertIn('blog_response_bytes_count{view="odd\\"view"} 1', lines)
+        self.assertEqual(sum(line.startswith('# TYPE') for line in lines), 5)
+
+
+@override_settings(PERF_METRICS_TOKEN='scrape-token', STORAGES=PLAIN_STORAGES, BLOG_PAGE_CACHE_ENABLED=False)
+class MetricsViewTests(TestCase):
+    """/metrics/ access, and the samples PerformanceMiddleware feeds it"""
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_bearer_token_is_accepted(self):
+        response = self.client.get('/metrics/', {'format': 'prometheus'}, HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertEqual(self.client.get('/metrics/profiles/', HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
+
+    def test_wrong_or_missing_token_goes_to_the_login(self):
+        for header in ('Bearer wrong', 'scrape-token', ''):
+            with self.subTest(header=header):
+                response = self.client.get('/metrics/', HTTP_AUTHORIZATION=header)
+                self.assertEqual(response.status_code, 302)
+        with self.settings(PERF_METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer ').status_code, 302)
+
+    def test_staff_session_is_accepted(self):
+        reader = CustomUser.objects.create_user('metrics_reader', 'metrics@example.com', 'password123')
+        self.client.force_login(reader)
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+        reader.is_staff = True
+        reader.save()
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    def test_request_samples_reach_the_endpoint(self):
+        self.client.get('/users/login/')
+        view = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-token').json()['views']['login']
+        self.assertEqual(view['count'], 1)
+        self.assertGreater(view['template_time']['sum'], 0)
+        self.assertGreater(view['response_bytes']['sum'], 0)
+
+    def test_sync_request_counts_queries_and_renders(self):
+        def view(request):
+            request.resolver_match = resolve('/')
+            Blog.objects.count()
+            Blog.objects.exists()
+            return HttpResponse(render_to_string('blogs/rating_list.html', {'ratings': []}))
+
+        PerformanceMiddleware(view)(RequestFactory().get('/'))
+        entry = registry.summary()['blog-home']
+        self.assertEqual(entry['db_queries']['sum'], 2)
+        self.assertGreater(entry['template_time']['sum'], 0)
+
+    async def test_async_request_counts_queries_and_renders(self):
+        async def view(request):
+            request.resolver_match = resolve('/')
+            await Blog.objects.acount()
+            return HttpResponse(await sync_to_async(render_to_string)('blogs/rating_list.html', {'ratings': []}))
+
+        # Built in the sync thread that runs the ORM, as ASGIHandler builds it at startup
+        middleware = await sync_to_async(PerformanceMiddleware)(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        await middleware(AsyncRequestFactory().get('/'))
+        entry = registry.summary()['blog-home']
+        self.assertEqual(entry['db_queries']['sum'], 1)
+        self.assertGreater(entry['template_time']['sum'], 0)
+
+    def test_queries_outside_requests_are_not_counted(self):
+        Blog.objects.count()
+        self.assertEqual(registry.summary(), {})
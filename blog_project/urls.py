@@ -5,9 +5,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from . import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics.metrics, name='perf-metrics'),
+    path('metrics/profiles/', metrics.profiles, name='perf-profiles'),
     path('', include('blogs.urls')),
     path('users/', include('users.urls')),
 ]
@@ -13,11 +13,13 @@ class CategoryAdmin(admin.ModelAdmin):
 class BlogAdmin(admin.ModelAdmin):
     """Admin for Blog model"""
     
-    list_display = ['title', 'author', 'category', 'created_at', 'views']
+    list_display = ['title', 'author', 'category', 'created_at', 'views', 'rating_avg', 'rating_count', 'favorite_count']
     list_filter = ['category', 'created_at', 'author']
     search_fields = ['title', 'body', 'author__username']
     prepopulated_fields = {'slug': ('title',)}
-    readonly_fields = ['views', 'created_at', 'updated_at']
+    readonly_fields = [
+        'views', 'rating_sum', 'rating_count', 'rating_avg', 'rating_score', 'favorite_count', 'trending_score', 'created_at', 'updated_at'
+    ]
     date_hierarchy = 'created_at'
 
 
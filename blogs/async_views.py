@@ -0,0 +1,101 @@
+"""
+Async versions of the read-heavy public views, served when BLOG_ASYNC_VIEWS
+is enabled (see blogs/urls.py).
+
+Queries run on Django's async ORM, and queries that do not depend on each
+other are awaited together. Templates still render in a thread through
+arender(), because the auth and messages context processors read the
+session lazily.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import render
+from .models import Blog, Category
+from .forms import BlogSearchForm
+from .counters import arecord_view
+from .page_cache import cache_shared_page, aadd_cache_tags
+from .conditional import conditional_page, blog_validators, category_validators, author_validators
+from .pagination import apaginate
+from .views import (
+    SORT_ORDERINGS, count_cached_view, detail_queryset, detail_context, detail_fragment_context, home_listing,
+)
+from users.models import CustomUser
+
+arender = sync_to_async(render)
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+@cache_shared_page()
+async def blog_home(request):
+    """Home page with list of all blogs with search, filtering, sorting, and pagination"""
+    
+    await aadd_cache_tags(request, 'listing')
+    blogs, ordering, prefix = await sync_to_async(home_listing)(request.GET)
+    
+    # Pagination and the category list
+    page_obj, categories = await asyncio.gather(
+        apaginate(request, blogs, ordering, prefix=prefix),
+        alist(Category.objects.all()),
+    )
+    
+    context = {
+        'blogs': page_obj,
+        'form': BlogSearchForm(request.GET),
+        'categories': categories,
+    }
+    
+    return await arender(request, 'blogs/home.html', context)
+
+
+@conditional_page(blog_validators)
+@cache_shared_page(on_hit=count_cached_view, fragment_context=detail_fragment_context)
+async def blog_detail(request, slug):
+    """Display individual blog post with ratings"""
+    
+    user = await request.auser()
+    blog = await aget_object_or_404(detail_queryset(user), slug=slug)
+    await aadd_cache_tags(request, f'blog:{blog.pk}', f'author:{blog.author_id}', f'category:{blog.category_id}')
+    request.page_cache_meta = {'blog_id': blog.pk}
+    
+    # Increment view count
+    await arecord_view(blog)
+    
+    return await arender(request, 'blogs/blog_detail.html', detail_context(blog, user))
+
+
+@conditional_page(category_validators)
+@cache_shared_page()
+async def blogs_by_category(request, slug):
+    """Display blogs filtered by category"""
+    
+    category = await aget_object_or_404(Category.objects.all(), slug=slug)
+    await aadd_cache_tags(request, f'category:{category.pk}')
+    blogs = Blog.objects.filter(category=category).select_related('author', 'category').defer('body')
+    page_obj = await apaginate(request, blogs, SORT_ORDERINGS['date'])
+    
+    return await arender(request, 'blogs/category_blogs.html', {'category': category, 'blogs': page_obj})
+
+
+@conditional_page(author_validators)
+@cache_shared_page()
+async def author_blogs(request, username):
+    """Display all blogs by a specific author"""
+    
+    author = await aget_object_or_404(CustomUser.objects.select_related('profile'), username=username)
+    await aadd_cache_tags(request, f'author:{author.pk}')
+    blogs = Blog.objects.filter(author=author).select_related('author', 'category').defer('body')
+    page_obj = await apaginate(request, blogs, SORT_ORDERINGS['date'])
+    
+    return await arender(request, 'blogs/author_blogs.html', {'author': author, 'blogs': page_obj})
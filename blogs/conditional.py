@@ -0,0 +1,127 @@
+"""
+Conditional GET support (ETag / Last-Modified) for public pages.
+
+Each validator function runs one query that reads what the page shows:
+timestamps, the rating aggregates and row counts. It returns
+(etag source, last modified) without rendering anything. If the client's
+If-None-Match / If-Modified-Since still match, the view is skipped and a
+304 Not Modified is returned.
+
+View counts are deliberately left out of the validators: a 304 may show a
+slightly old view count, and revalidations are not counted as views.
+Only anonymous reads are handled, because logged-in pages carry per-user
+state.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from users.models import CustomUser
+from .models import Blog, Category
+from .page_cache import is_anonymous_read
+
+
+def _latest(*timestamps):
+    present = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(present) if present else None
+
+
+def blog_validators(slug):
+    row = (
+        Blog.objects.filter(slug=slug)
+        .values(
+            'id', 'updated_at', 'ratings_changed_at', 'rating_count', 'rating_sum',
+            'author__username', 'author__profile__updated_at', 'category__name', 'category__slug',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    return tuple(row.values()), _latest(row['updated_at'], row['ratings_changed_at'], row['author__profile__updated_at'])
+
+
+def _listing_aggregates(prefix):
+    return {
+        'latest_update': Max(f'{prefix}updated_at'),
+        'latest_rating': Max(f'{prefix}ratings_changed_at'),
+        'posts': Count(f'{prefix}id'),
+        'rating_sum': Sum(f'{prefix}rating_sum'),
+        'rating_count': Sum(f'{prefix}rating_count'),
+    }
+
+
+def category_validators(slug):
+    rows = (
+        Category.objects.filter(slug=slug)
+        .values('id', 'name', 'description')
+        .annotate(**_listing_aggregates('blogs__'))
+        .order_by()[:1]
+    )
+    # Not .first(), whose ORDER BY would sort the grouped row in a temp b-tree
+    row = next(iter(rows), None)
+    if row is None:
+        return None
+    return tuple(row.values()), _latest(row['latest_update'], row['latest_rating'])
+
+
+def author_validators(username):
+    rows = (
+        CustomUser.objects.filter(username=username)
+        .values('id', 'profile__updated_at')
+        .annotate(**_listing_aggregates('blogs__'))
+        .order_by()[:1]
+    )
+    row = next(iter(rows), None)
+    if row is None:
+        return None
+    return tuple(row.values()), _latest(row['latest_update'], row['latest_rating'], row['profile__updated_at'])
+
+
+def _check(request, validators, kwargs):
+    """(304 response or None, etag, last modified) for an anonymous read, else Nones"""
+    if not is_anonymous_read(request):
+        return None, None, None
+    found = validators(**kwargs)
+    if found is None:
+        return None, None, None
+    source, last_modified = found
+    etag = quote_etag(hashlib.md5(repr(source).encode()).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp), etag, timestamp
+
+
+def _set_validators(response, etag, timestamp):
+    if etag is not None and response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if timestamp is not None:
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+    return response
+
+
+def conditional_page(validators):
+    """Answer matching If-None-Match / If-Modified-Since with 304 before running the view
+
+    `validators(**view_kwargs)` returns (etag source, last modified datetime)
+    or None when the object does not exist. Put it above
+    @cache_shared_page so a 304 needs neither the cache nor the view.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            async def wrapper(request, *args, **kwargs):
+                not_modified, etag, timestamp = await sync_to_async(_check)(request, validators, kwargs)
+                if not_modified is not None:
+                    return _set_validators(not_modified, etag, timestamp)
+                return _set_validators(await view_func(request, *args, **kwargs), etag, timestamp)
+        else:
+            def wrapper(request, *args, **kwargs):
+                not_modified, etag, timestamp = _check(request, validators, kwargs)
+                if not_modified is not None:
+                    return _set_validators(not_modified, etag, timestamp)
+                return _set_validators(view_func(request, *args, **kwargs), etag, timestamp)
+
+        return wraps(view_func)(wrapper)
+    return decorator
@@ -0,0 +1,269 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import F
+
+from .models import Blog, RankingEntry
+from .rankings import VIEW_WEIGHT, add_scores, activity, record_activity, sync_blog, sync_rankings, trending_increment
+
+TRENDING = [RankingEntry.Kind.TRENDING]
+
+# Caches CacheViewBuffer cannot share between processes: locmem lives in one
+# process, the file and database caches increment by read-modify-write
+UNSHARED_CACHES = {
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.db.DatabaseCache',
+}
+
+logger = logging.getLogger(__name__)
+
+
+def write_view_counts(counts):
+    """Apply {blog_id: n} increments with one UPDATE per distinct n, then re-rank the blogs"""
+    by_count = defaultdict(list)
+    for blog_id, count in counts.items():
+        if count:
+            by_count[count].append(blog_id)
+    with transaction.atomic():
+        for count, blog_ids in by_count.items():
+            Blog.objects.filter(pk__in=blog_ids).update(
+                views=F('views') + count,
+                trending_score=trending_increment(count * VIEW_WEIGHT),
+            )
+    sync_rankings([blog_id for blog_ids in by_count.values() for blog_id in blog_ids], TRENDING)
+    return sum(counts.values())
+
+
+class MemoryViewBuffer:
+    """Process-local buffer of pending blog view increments
+
+    Each server process holds its own buffer, so only that process can flush
+    it: on the threshold, on the interval (a timer thread started with the
+    first add covers processes that stop receiving views) and at exit.
+    """
+
+    def __init__(self, flush_interval=10, flush_threshold=500):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = Counter()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._timer_pid = None
+
+    def _start_timer(self):
+        """Start the interval flusher in this process (again after a fork)"""
+        with self._lock:
+            if self._timer_pid == os.getpid():
+                return
+            self._timer_pid = os.getpid()
+        threading.Thread(target=self._flush_periodically, name='view-buffer-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if time.monotonic() - self._last_flush < self.flush_interval:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                # flush() kept the increments, the next tick retries them
+                logger.exception('Flushing buffered blog views failed')
+            finally:
+                connections.close_all()
+
+    def add(self, blog_id, count=1):
+        """Buffer an increment and flush if the interval or threshold is reached"""
+        if self._timer_pid != os.getpid():
+            self._start_timer()
+        with self._lock:
+            self._pending[blog_id] += count
+            self._total += count
+            due = (
+                self._total >= self.flush_threshold
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered increments back to the database"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._total = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            return write_view_counts(pending)
+        except Exception:
+            # Put the increments back so they are retried on the next flush
+            with self._lock:
+                self._pending.update(pending)
+                self._total += sum(pending.values())
+            raise
+
+
+class CacheViewBuffer:
+    """Buffer shared between processes through a Django cache backend
+
+    Needs a cache shared by every process with atomic incr/decr/add
+    (memcached or redis), so that concurrent increments are never lost and a
+    separate process, e.g. the flush_view_counts command, can drain it.
+    """
+
+    key_prefix = 'blog-views'
+
+    def __init__(self, alias='default', flush_threshold=500):
+        self.alias = alias
+        self.flush_threshold = flush_threshold
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, blog_id):
+        return f'{self.key_prefix}:{blog_id}'
+
+    def _update_registry(self, update):
+        """Read-modify-write the set of dirty blog ids under a cache lock"""
+        lock_key = f'{self.key_prefix}:lock'
+        registry_key = f'{self.key_prefix}:dirty'
+        for _ in range(100):
+            if self.cache.add(lock_key, 1, timeout=5):
+                break
+            time.sleep(0.01)
+        try:
+            ids = self.cache.get(registry_key, set())
+            result = update(ids)
+            self.cache.set(registry_key, ids, None)
+            return result
+        finally:
+            self.cache.delete(lock_key)
+
+    def add(self, blog_id, count=1):
+        key = self._key(blog_id)
+        self.cache.add(key, 0, None)
+        value = self.cache.incr(key, count)
+        if value == count:
+            # First increment since the last flush, mark the blog as dirty
+            size = self._update_registry(lambda ids: ids.add(blog_id) or len(ids))
+            if size >= self.flush_threshold:
+                self.flush()
+
+    def flush(self):
+        """Drain every dirty counter and write it back to the database"""
+        blog_ids = self._update_registry(self._take)
+        if not blog_ids:
+            return 0
+
+        counts = self.cache.get_many([self._key(blog_id) for blog_id in blog_ids])
+        pending = {}
+        requeue = set()
+        for blog_id in blog_ids:
+            count = counts.get(self._key(blog_id), 0)
+            if not count:
+                continue
+            pending[blog_id] = count
+            # Increments that landed after the read stay in the cache for next time
+            if self.cache.decr(self._key(blog_id), count) > 0:
+                requeue.add(blog_id)
+        if requeue:
+            self._update_registry(lambda ids: ids.update(requeue))
+        try:
+            return write_view_counts(pending)
+        except Exception:
+            for blog_id, count in pending.items():
+                self.add(blog_id, count)
+            raise
+
+    @staticmethod
+    def _take(ids):
+        taken = set(ids)
+        ids.clear()
+        return taken
+
+
+def _build_buffer():
+    if getattr(settings, 'BLOG_VIEW_COUNTER_BACKEND', 'memory') == 'cache':
+        alias = getattr(settings, 'BLOG_VIEW_COUNTER_CACHE', 'default')
+        backend = settings.CACHES[alias]['BACKEND']
+        if backend in UNSHARED_CACHES:
+            raise ImproperlyConfigured(
+                f"BLOG_VIEW_COUNTER_BACKEND='cache' needs a memcached or redis cache, "
+                f"the {alias!r} cache is {backend}"
+            )
+        return CacheViewBuffer(
+            alias=alias,
+            flush_threshold=getattr(settings, 'BLOG_VIEW_COUNTER_FLUSH_THRESHOLD', 500),
+        )
+    return MemoryViewBuffer(
+        flush_interval=getattr(settings, 'BLOG_VIEW_COUNTER_FLUSH_INTERVAL', 10),
+        flush_threshold=getattr(settings, 'BLOG_VIEW_COUNTER_FLUSH_THRESHOLD', 500),
+    )
+
+
+view_buffer = _build_buffer()
+
+
+def _buffered():
+    return getattr(settings, 'BLOG_VIEW_COUNTER_MODE', 'immediate') == 'buffered'
+
+
+def count_view(blog_id):
+    """Count a page view for the blog according to BLOG_VIEW_COUNTER_MODE
+
+    In immediate mode the trending score is updated with the view count, and
+    the blog's trending entries catch up on its next uncached view.
+    """
+    if _buffered():
+        view_buffer.add(blog_id)
+    else:
+        record_activity(blog_id, VIEW_WEIGHT, views=F('views') + 1)
+
+
+def _count_on_instance(blog):
+    """Mirror an immediate-mode view on the instance and re-rank it from there"""
+    blog.trending_score = add_scores(blog.trending_score, activity(VIEW_WEIGHT))
+    sync_blog(blog, TRENDING)
+
+
+def record_view(blog):
+    """Count a page view and reflect it on the instance being rendered"""
+    count_view(blog.pk)
+    if not _buffered():
+        _count_on_instance(blog)
+    blog.views += 1
+
+
+async def arecord_view(blog):
+    """Async version of record_view"""
+    if _buffered():
+        # A buffer add may trigger a flush, which writes to the database
+        await sync_to_async(view_buffer.add)(blog.pk)
+    else:
+        await Blog.objects.filter(pk=blog.pk).aupdate(
+            views=F('views') + 1,
+            trending_score=trending_increment(VIEW_WEIGHT),
+        )
+        await sync_to_async(_count_on_instance)(blog)
+    blog.views += 1
+
+
+def flush_views():
+    """Flush buffered view counts to the database, returning how many were written"""
+    return view_buffer.flush()
+
+
+atexit.register(flush_views)
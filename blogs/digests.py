@@ -0,0 +1,93 @@
+"""
+Favorite notifications: one email per favorite, or a periodic digest.
+
+In digest mode nothing is sent when a blog is favorited. The favorites
+created since a user's last digest are the pending events; once the oldest
+of them is digest_interval_hours old, send_favorite_digests mails them all
+in one message. A user's window only opens with their first pending
+favorite, so there is at most one digest per user per window whatever the
+volume.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from mailer.queue import enqueue_mail
+from users.models import Profile
+from .models import Favorite
+
+
+def notify_favorite(favorite):
+    """Handle a newly created favorite according to the user's preference"""
+    profile = getattr(favorite.user, 'profile', None)
+    preference = profile.favorite_notifications if profile else Profile.NOTIFY_INSTANT
+    if preference == Profile.NOTIFY_INSTANT:
+        enqueue_mail(
+            'Blog added to favorites',
+            f'You added "{favorite.blog.title}" to your favorites!',
+            settings.DEFAULT_FROM_EMAIL,
+            [favorite.user.email],
+        )
+
+
+def due_profiles(now=None):
+    """Digest profiles whose oldest pending favorite has waited a full window"""
+    now = now or timezone.now()
+    pending = Q(user__favorites__created_at__gt=F('last_digest_sent_at')) | Q(last_digest_sent_at__isnull=True)
+    profiles = (
+        Profile.objects.filter(favorite_notifications=Profile.NOTIFY_DIGEST)
+        .annotate(first_pending=Min('user__favorites__created_at', filter=pending))
+        .filter(first_pending__isnull=False)
+        .select_related('user')
+    )
+    return [
+        profile for profile in profiles
+        if profile.first_pending <= now - timedelta(hours=profile.digest_interval_hours)
+    ]
+
+
+def digest_message(user, favorites):
+    lines = [f'Hi {user.username},', '', f'You added {len(favorites)} blog(s) to your favorites:', '']
+    lines += [f'- "{favorite.blog.title}" by {favorite.blog.author.username}' for favorite in favorites]
+    lines += ['', 'Best regards,', 'Blog Site Team']
+    return '\n'.join(lines)
+
+
+def send_digests(now=None):
+    """Queue one digest per due user; returns the number of digests queued"""
+    now = now or timezone.now()
+    profiles = due_profiles(now)
+    if not profiles:
+        return 0
+
+    favorites_by_user = {}
+    favorites = (
+        Favorite.objects.filter(user_id__in=[profile.user_id for profile in profiles], created_at__lte=now)
+        .select_related('blog__author')
+        .only('user_id', 'created_at', 'blog__title', 'blog__author__username')
+        .order_by('created_at')
+    )
+    for favorite in favorites:
+        favorites_by_user.setdefault(favorite.user_id, []).append(favorite)
+
+    sent = 0
+    for profile in profiles:
+        since = profile.last_digest_sent_at
+        pending = [f for f in favorites_by_user.get(profile.user_id, []) if since is None or f.created_at > since]
+        if not pending:
+            continue
+        # Claim the window first so concurrent runs never send the same digest twice
+        claimed = Profile.objects.filter(pk=profile.pk, last_digest_sent_at=since) if since else \
+            Profile.objects.filter(pk=profile.pk, last_digest_sent_at__isnull=True)
+        if not claimed.update(last_digest_sent_at=now):
+            continue
+        enqueue_mail(
+            f'Your favorites digest: {len(pending)} new blog(s)',
+            digest_message(profile.user, pending),
+            settings.DEFAULT_FROM_EMAIL,
+            [profile.user.email],
+        )
+        sent += 1
+    return sent
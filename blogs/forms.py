@@ -96,6 +96,8 @@ class BlogSearchForm(forms.Form):
             ('rating', 'Rating (Highest First)'),
             ('-rating', 'Rating (Lowest First)'),
             ('views', 'Most Viewed'),
+            ('trending', 'Trending'),
+            ('favorited', 'Most Favorited'),
         ],
         required=False,
         initial='date',
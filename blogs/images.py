@@ -0,0 +1,219 @@
+"""
+Resized variants of uploaded blog images and profile pictures.
+
+Every image under one of the VARIANT_WIDTHS upload directories gets a WebP
+copy and a JPEG copy (PNG when it has transparency) at each configured
+width, stored as <dir>/variants/<filename>-<width>w.<ext> next to the
+original. The original's full file name, extension included, keeps
+photo.jpg and photo.png from sharing variants.
+Variants are made when a blog or profile is saved with a new image (see
+blogs.signals): once the transaction commits, in a per-process pool of
+BLOG_IMAGE_VARIANT_WORKERS processes, so the upload request does not wait
+for the resizing. The replaced image's variants are deleted at the same
+point. `manage.py generate_image_variants` makes them for existing media.
+The responsive_image template tag turns them into srcset attributes.
+"""
+import logging
+import posixpath
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Target widths per upload directory; widths wider than the original are
+# replaced by a single variant at the original width
+VARIANT_WIDTHS = {
+    'blog_images/': (480, 800, 1200, 1600),
+    'profile_pics/': (64, 160, 320),
+}
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+    'png': {'format': 'PNG', 'optimize': True},
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+CACHE_PREFIX = 'image-variants'
+# How long "no variants yet" is remembered before storage is checked again
+MISSING_TIMEOUT = 300
+
+
+def widths_for(name):
+    for directory, widths in VARIANT_WIDTHS.items():
+        if name.startswith(directory):
+            return widths
+    return ()
+
+
+def variant_name(name, width, fmt):
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, 'variants', f'{filename}-{width}w.{EXTENSIONS[fmt]}')
+
+
+def _cache_key(name):
+    return f'{CACHE_PREFIX}:{name}'
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def generate_variants(name, storage=None):
+    """Write every variant of a stored image
+
+    Returns {format: [(width, variant name), ...]} with widths ascending, or
+    {} when the image is missing or not under a configured directory.
+    """
+    storage = storage or default_storage
+    widths = widths_for(name)
+    if not widths or not storage.exists(name):
+        return {}
+
+    with storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    has_alpha = _has_alpha(image)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {'webp': [], 'png' if has_alpha else 'jpeg': []}
+    for width in sorted({min(width, image.width) for width in widths}):
+        if width == image.width:
+            resized = image
+        else:
+            resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        for fmt, entries in variants.items():
+            buffer = BytesIO()
+            resized.save(buffer, **SAVE_OPTIONS[fmt])
+            target = variant_name(name, width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            entries.append((width, storage.save(target, ContentFile(buffer.getvalue()))))
+
+    cache.set(_cache_key(name), variants, None)
+    return variants
+
+
+def available_variants(name, storage=None):
+    """Variants already stored for an image, in generate_variants' format
+
+    Looked up in the variants directory once and then kept in the cache.
+    """
+    if not name or not widths_for(name):
+        return {}
+    variants = cache.get(_cache_key(name))
+    if variants is not None:
+        return variants
+
+    variants = _stored_variants(name, storage or default_storage)
+    cache.set(_cache_key(name), variants, None if variants else MISSING_TIMEOUT)
+    return variants
+
+
+def _stored_variants(name, storage):
+    directory, original = posixpath.split(name)
+    pattern = re.compile(rf'^{re.escape(original)}-(\d+)w\.(webp|jpg|png)$')
+    variants = {}
+    try:
+        _, files = storage.listdir(posixpath.join(directory, 'variants'))
+    except (FileNotFoundError, NotImplementedError):
+        files = []
+    formats = {extension: fmt for fmt, extension in EXTENSIONS.items()}
+    for filename in files:
+        match = pattern.match(filename)
+        if match:
+            width, extension = int(match.group(1)), match.group(2)
+            variants.setdefault(formats[extension], []).append((width, posixpath.join(directory, 'variants', filename)))
+    for entries in variants.values():
+        entries.sort()
+    return variants
+
+
+def delete_variants(name, storage=None):
+    """Delete every stored variant of an image, returning how many files went"""
+    if not name or not widths_for(name):
+        return 0
+    storage = storage or default_storage
+    deleted = 0
+    for entries in _stored_variants(name, storage).values():
+        for _, variant in entries:
+            storage.delete(variant)
+            deleted += 1
+    cache.delete(_cache_key(name))
+    return deleted
+
+
+def _generate(name):
+    return name, generate_variants(name)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _variant_pool(broken=None):
+    """This process's variant pool, replacing `broken` if it is still the current one"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool is broken:
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'BLOG_IMAGE_VARIANT_WORKERS', 2), initializer=django.setup,
+            )
+        return _pool
+
+
+def _store_variants(future):
+    # The worker's cache.set only reaches a shared cache, so record them here too
+    try:
+        name, variants = future.result()
+    except Exception:
+        logger.exception('Generating image variants failed')
+        return
+    if variants:
+        cache.set(_cache_key(name), variants, None)
+
+
+def _submit_variants(name):
+    if available_variants(name) or not default_storage.exists(name):
+        return
+    if not getattr(settings, 'BLOG_IMAGE_VARIANT_WORKERS', 2):
+        generate_variants(name)
+        return
+    pool = _variant_pool()
+    try:
+        future = pool.submit(_generate, name)
+    except BrokenProcessPool:
+        # A worker died and took the pool with it
+        future = _variant_pool(broken=pool).submit(_generate, name)
+    future.add_done_callback(_store_variants)
+
+
+def schedule_variants(name):
+    """Generate variants for a newly saved image once the transaction commits
+
+    In the variant pool, or in the committing thread when
+    BLOG_IMAGE_VARIANT_WORKERS is 0.
+    """
+    if name and widths_for(name):
+        transaction.on_commit(lambda: _submit_variants(name))
+
+
+def generate_many(names, workers=None):
+    """Generate variants for many images in a process pool
+
+    Yields (name, variants) as each image finishes.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        for name, variants in pool.map(_generate, names, chunksize=4):
+            if variants:
+                cache.set(_cache_key(name), variants, None)
+            yield name, variants
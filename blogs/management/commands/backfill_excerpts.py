@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from blogs.models import Blog
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the stored excerpt of every blog from its body'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch = []
+        updated = 0
+        for blog in Blog.objects.only('id', 'body').iterator(chunk_size=batch_size):
+            blog.excerpt = Blog.make_excerpt(blog.body)
+            batch.append(blog)
+            if len(batch) >= batch_size:
+                updated += Blog.objects.bulk_update(batch, ['excerpt'])
+                batch = []
+        updated += Blog.objects.bulk_update(batch, ['excerpt'])
+        self.stdout.write(self.style.SUCCESS(f'Backfilled excerpts for {updated} blogs'))
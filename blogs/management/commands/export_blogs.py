@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from blogs.models import Blog
+from blogs.transfer import FORMATS, detect_format, export_blogs, open_text
+
+
+class Command(BaseCommand):
+    help = 'Stream every blog to a JSONL or CSV file (optionally .gz), or to stdout with "-"'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='output file, .gz to compress, "-" for stdout')
+        parser.add_argument('--format', choices=FORMATS, help='default: from the file extension, jsonl for stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='rows fetched per database round trip')
+        parser.add_argument('--category', help='only blogs in this category (slug)')
+        parser.add_argument('--author', help='only blogs by this author (username)')
+    
+    def handle(self, *args, **options):
+        try:
+            fmt = detect_format(options['path'], options['format'])
+        except ValueError as e:
+            raise CommandError(e)
+        queryset = Blog.objects.all()
+        if options['category']:
+            queryset = queryset.filter(category__slug=options['category'])
+        if options['author']:
+            queryset = queryset.filter(author__username=options['author'])
+        
+        # Progress goes to stderr so it never mixes with an export on stdout
+        started = time.perf_counter()
+        
+        def progress(count):
+            self.stderr.write(f'{count:,} blogs exported ({count / (time.perf_counter() - started):,.0f}/s)')
+        
+        with open_text(options['path'], 'w') as handle:
+            count = export_blogs(handle, fmt, queryset, options['chunk_size'], progress if options['verbosity'] > 1 else None)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {count:,} blogs in {elapsed:,.1f}s ({count / elapsed if elapsed else 0:,.0f}/s)'
+        ))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from blogs.counters import flush_views
+
+
+class Command(BaseCommand):
+    help = 'Write buffered blog view counts to the database (needs BLOG_VIEW_COUNTER_BACKEND=cache)'
+    
+    def handle(self, *args, **options):
+        if getattr(settings, 'BLOG_VIEW_COUNTER_BACKEND', 'memory') != 'cache':
+            # The memory buffer lives inside each server process; this one's is always empty
+            raise CommandError(
+                'BLOG_VIEW_COUNTER_BACKEND is "memory": server processes flush their own buffers on the '
+                'interval, threshold and at exit. Use the "cache" backend to flush from a separate process.'
+            )
+        flushed = flush_views()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} buffered views'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from blogs.images import available_variants, generate_many
+from blogs.models import Blog
+from users.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG variants for existing blog images and profile pictures'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--force', action='store_true', help='Regenerate images that already have variants')
+    
+    def handle(self, *args, **options):
+        names = set(Blog.objects.exclude(image='').exclude(image=None).values_list('image', flat=True))
+        names |= set(Profile.objects.exclude(profile_picture='').values_list('profile_picture', flat=True))
+        if not options['force']:
+            names = {name for name in names if not available_variants(name)}
+        
+        done = missing = 0
+        for name, variants in generate_many(sorted(names), options['workers']):
+            if variants:
+                done += 1
+            else:
+                missing += 1
+                self.stderr.write(f'Skipped {name} (missing or not a variant directory)')
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} images, skipped {missing}'))
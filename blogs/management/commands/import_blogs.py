@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from blogs.transfer import FORMATS, BlogImporter, Checkpoint, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Bulk import blogs from a JSONL or CSV file (optionally .gz) in resumable batches'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='input file, .gz if compressed, "-" for stdin')
+        parser.add_argument('--format', choices=FORMATS, help='default: from the file extension, jsonl for stdin')
+        parser.add_argument('--batch-size', type=int, default=2000, help='records per transaction')
+        parser.add_argument('--on-conflict', choices=('skip', 'rename'), default='skip',
+                            help='for records whose slug is taken: skip them, or give them a fresh slug')
+        parser.add_argument('--create-authors', action='store_true', help='create unknown authors (no usable password)')
+        parser.add_argument('--create-categories', action='store_true', help='create unknown categories')
+        parser.add_argument('--checkpoint', help='checkpoint file (default: <path>.checkpoint; none for stdin)')
+        parser.add_argument('--restart', action='store_true', help='ignore a saved checkpoint and start from the top')
+        parser.add_argument('--progress-interval', type=float, default=5, help='seconds between progress lines')
+    
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            fmt = detect_format(path, options['format'])
+        except ValueError as e:
+            raise CommandError(e)
+        
+        checkpoint_path = options['checkpoint'] or (None if path == '-' else f'{path}.checkpoint')
+        checkpoint = Checkpoint(checkpoint_path, path) if checkpoint_path else None
+        if checkpoint and options['restart']:
+            checkpoint.clear()
+        
+        def progress(stats, rate):
+            self.stdout.write(
+                f'{stats["consumed"]:,} records: {stats["imported"]:,} imported, {stats["skipped"]:,} skipped, '
+                f'{stats["failed"]:,} failed ({rate:,.0f} records/s)'
+            )
+        
+        importer = BlogImporter(
+            batch_size=options['batch_size'],
+            on_conflict=options['on_conflict'],
+            create_authors=options['create_authors'],
+            create_categories=options['create_categories'],
+            progress=progress,
+            progress_interval=options['progress_interval'],
+        )
+        try:
+            resumed = checkpoint.load() if checkpoint else None
+        except ValueError as e:
+            raise CommandError(f'{e}; pass --restart to start over')
+        if resumed:
+            self.stdout.write(f'Resuming after {resumed["consumed"]:,} records from {checkpoint.path}')
+        
+        elapsed, rate = importer.run(path, fmt, checkpoint)
+        
+        for number, error in importer.errors:
+            self.stderr.write(f'record {number}: {error}')
+        stats = importer.stats
+        if stats['failed'] > len(importer.errors):
+            self.stderr.write(f'... and {stats["failed"] - len(importer.errors):,} more failed records')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats["imported"]:,} blogs ({stats["skipped"]:,} skipped, {stats["failed"]:,} failed) '
+            f'in {elapsed:,.1f}s ({rate:,.0f} records/s)'
+        ))
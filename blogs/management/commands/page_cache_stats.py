@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from blogs import page_cache
+
+
+class Command(BaseCommand):
+    help = 'Show page cache hit/miss counters'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+    
+    def handle(self, *args, **options):
+        stats = page_cache.stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']:.1%}"
+        )
+        if options['reset']:
+            page_cache.reset_stats()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from blogs.rankings import KINDS, rebuild_favorite_counts, rebuild_rankings
+
+
+class Command(BaseCommand):
+    help = 'Recompute favorite counts and the precomputed top-N rankings, globally and per category'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=KINDS, action='append', help='only rebuild this ranking (repeatable)')
+    
+    def handle(self, *args, **options):
+        updated = rebuild_favorite_counts()
+        entries = rebuild_rankings(options['kind'] or KINDS)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt favorite counts for {updated} blogs and {entries} ranking entries'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blogs.models import Blog
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating sum, count and average for every blog'
+    
+    def handle(self, *args, **options):
+        updated = Blog.rebuild_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} blogs'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from blogs.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the blogs table'
+    
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        indexed = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {type(backend).__name__} index ({indexed} blogs)'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from blogs.models import Blog, RankingEntry
+from blogs.rankings import rebuild_rankings
+
+
+class Command(BaseCommand):
+    help = 'Re-weight the Bayesian rating scores if the global mean rating has drifted'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='rewrite the scores even if the mean has not moved')
+        parser.add_argument('--batch-size', type=int, default=10000)
+    
+    def handle(self, *args, **options):
+        prior = Blog.refresh_rating_scores(force=options['force'], batch_size=options['batch_size'])
+        if prior is None:
+            self.stdout.write('Global mean within tolerance, scores left unchanged')
+            return
+        rebuild_rankings([RankingEntry.Kind.TOP_RATED])
+        mean, weight = prior
+        self.stdout.write(self.style.SUCCESS(f'Rating scores re-weighted against a mean of {mean:.3f} ({weight:g} ratings)'))
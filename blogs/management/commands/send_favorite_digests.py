@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blogs.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = 'Queue one favorites digest email for every user whose digest window has elapsed'
+    
+    def handle(self, *args, **options):
+        sent = send_digests()
+        self.stdout.write(self.style.SUCCESS(f'Queued {sent} favorite digests'))
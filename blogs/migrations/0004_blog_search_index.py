@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'blogs_blog_fts'
+PG_INDEX = 'blogs_blog_search_idx'
+
+
+def pg_search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    vector = SearchVector('title', weight='A', config='english') + SearchVector('body', weight='B', config='english')
+    return GinIndex(vector, name=PG_INDEX)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, body, tokenize='unicode61')")
+        except OperationalError:
+            # SQLite built without FTS5, search falls back to icontains
+            return
+        schema_editor.execute(f'INSERT INTO {FTS_TABLE} (rowid, title, body) SELECT id, title, body FROM blogs_blog')
+    elif vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('blogs', 'Blog'), pg_search_index())
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('blogs', 'Blog'), pg_search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0003_blog_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
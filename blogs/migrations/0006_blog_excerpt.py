@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:37
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def backfill_excerpts(apps, schema_editor):
+    Blog = apps.get_model('blogs', 'Blog')
+    batch = []
+    for blog in Blog.objects.only('id', 'body').iterator(chunk_size=1000):
+        blog.excerpt = Truncator(blog.body).words(20, truncate=' …')
+        batch.append(blog)
+        if len(batch) >= 1000:
+            Blog.objects.bulk_update(batch, ['excerpt'])
+            batch = []
+    Blog.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0005_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0006_blog_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='ratings_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
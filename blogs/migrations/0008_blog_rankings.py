@@ -0,0 +1,80 @@
+# Generated by Django 5.0.1 on 2026-10-17 01:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_favorite_counts(apps, schema_editor):
+    Blog = apps.get_model('blogs', 'Blog')
+    Favorite = apps.get_model('blogs', 'Favorite')
+    favorites = Favorite.objects.filter(blog=OuterRef('pk')).order_by().values('blog')
+    Blog.objects.update(
+        favorite_count=Coalesce(Subquery(favorites.annotate(total=Count('id')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0007_blog_ratings_changed_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('top_rated', 'Top rated'), ('trending', 'Trending'), ('most_favorited', 'Most favorited')], max_length=20)),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Ranking entry',
+                'verbose_name_plural': 'Ranking entries',
+            },
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['-trending_score', '-id'], name='blog_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['-favorite_count', '-id'], name='blog_favorite_count_idx'),
+        ),
+        migrations.AddField(
+            model_name='rankingentry',
+            name='blog',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranking_entries', to='blogs.blog'),
+        ),
+        migrations.AddField(
+            model_name='rankingentry',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ranking_entries', to='blogs.category'),
+        ),
+        migrations.AddIndex(
+            model_name='rankingentry',
+            index=models.Index(fields=['kind', 'category', '-score'], name='ranking_entry_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='rankingentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'category', 'blog'), name='ranking_entry_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='rankingentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('category', None)), fields=('kind', 'blog'), name='ranking_entry_global_unique'),
+        ),
+        migrations.RunPython(backfill_favorite_counts, migrations.RunPython.noop),
+    ]
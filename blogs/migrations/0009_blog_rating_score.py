@@ -0,0 +1,57 @@
+# Generated by Django 5.0.1 on 2026-10-17 01:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, F, FloatField, Sum, Value, When
+
+
+def backfill_rating_scores(apps, schema_editor):
+    Blog = apps.get_model('blogs', 'Blog')
+    RatingPrior = apps.get_model('blogs', 'RatingPrior')
+    totals = Blog.objects.aggregate(rating_sum=Sum('rating_sum'), rating_count=Sum('rating_count'))
+    mean = totals['rating_sum'] / totals['rating_count'] if totals['rating_count'] else 3.0
+    weight = float(getattr(settings, 'BLOG_RATING_PRIOR_WEIGHT', 10.0))
+    RatingPrior.objects.create(pk=1, mean=mean, weight=weight)
+    Blog.objects.update(rating_score=Case(
+        When(rating_count__gt=0, then=(Value(mean * weight) + F('rating_sum')) / (Value(weight) + F('rating_count'))),
+        default=Value(0.0),
+        output_field=FloatField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0008_blog_rankings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField(default=3.0)),
+                ('weight', models.FloatField(default=10.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Rating prior',
+                'verbose_name_plural': 'Rating prior',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='blog',
+            name='blog_rating_avg_idx',
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='rating_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['-rating_score', '-id'], name='blog_rating_score_idx'),
+        ),
+        migrations.RunPython(backfill_rating_scores, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Case, When, Value, FloatField, OuterRef, Subquery, Sum, Count, Avg, Max
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.urls import reverse
+from django.utils.text import Truncator
+from .slugs import next_free_slug
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -28,9 +34,20 @@ class Category(models.Model):
 class Blog(models.Model):
     """Blog post model"""
     
+    EXCERPT_WORDS = 20
+    SLUG_ATTEMPTS = 5
+    # Columns kept current by F() updates (signals, view counter); a plain
+    # save() of a loaded instance leaves them alone so it cannot undo newer writes
+    MAINTAINED_FIELDS = frozenset({
+        'views', 'rating_sum', 'rating_count', 'rating_avg', 'rating_score', 'ratings_changed_at',
+        'favorite_count', 'trending_score',
+    })
+    
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
     body = models.TextField()
+    # First EXCERPT_WORDS words of body, so listings can defer the body
+    excerpt = models.TextField(blank=True, editable=False)
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='blogs')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='blogs')
     
@@ -41,42 +58,195 @@ class Blog(models.Model):
     
     views = models.PositiveIntegerField(default=0)
     
+    # Denormalized rating aggregates, maintained by blogs.signals
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
+    # Bayesian average against RatingPrior, which the rating sort orders by
+    rating_score = models.FloatField(default=0, editable=False)
+    # Set whenever the aggregates change, so conditional GETs see rating edits
+    ratings_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Ranking inputs, maintained by blogs.signals and blogs.counters; see blogs.rankings
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
+    trending_score = models.FloatField(default=0, editable=False)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember where the post was listed so signals can invalidate old pages
+        self._saved_listing = (self.__dict__.get('category_id'), self.__dict__.get('author_id')) if self.pk else None
+        # And the stored image, whose variants go when it is replaced
+        self._saved_image = self.__dict__.get('image') if self.pk else None
+    
     def __str__(self):
         return self.title
     
     def get_absolute_url(self):
         return reverse('blog-detail', kwargs={'slug': self.slug})
     
+    @classmethod
+    def make_excerpt(cls, body):
+        """Same text as {{ body|truncatewords:EXCERPT_WORDS }}"""
+        return Truncator(body).words(cls.EXCERPT_WORDS, truncate=' …')
+    
     def save(self, *args, **kwargs):
-        """Auto-generate slug from title if not provided"""
-        if not self.slug:
-            from django.utils.text import slugify
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-            while Blog.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        """Auto-generate slug from title if not provided and refresh the excerpt"""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS and field.attname not in deferred
+            ]
+        if 'body' not in self.get_deferred_fields() and (update_fields is None or 'body' in update_fields):
+            self.excerpt = self.make_excerpt(self.body)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'excerpt'}
+        if self.slug:
+            return super().save(*args, **kwargs)
+        
+        # A concurrent save can take the same slug between allocation and
+        # INSERT; the unique constraint catches it and we allocate again
+        for attempt in range(self.SLUG_ATTEMPTS):
+            self.slug = next_free_slug(Blog.objects.all(), self.title)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Re-raise anything that is not a slug clash, and give up eventually
+                if attempt == self.SLUG_ATTEMPTS - 1 or not Blog.objects.filter(slug=self.slug).exists():
+                    raise
     
     @property
     def average_rating(self):
-        """Calculate average rating for the blog"""
-        ratings = self.ratings.all()
-        if ratings:
-            return sum(r.rating for r in ratings) / len(ratings)
-        return 0
+        """Average rating for the blog, read from the stored aggregate"""
+        return self.rating_avg
     
-    @property
-    def rating_count(self):
-        """Get total number of ratings"""
-        return self.ratings.count()
+    @staticmethod
+    def weighted_rating(rating_sum, rating_count, prior=None):
+        """Expression for the Bayesian average of a blog's ratings
+
+        Each rated blog starts from `weight` pseudo-ratings at the global
+        `mean`, so a handful of ratings barely moves it and hundreds outweigh
+        the prior. Unrated blogs score 0, like rating_avg.
+        """
+        mean, weight = prior or RatingPrior.current()
+        return Case(
+            When(GreaterThan(rating_count, 0), then=(Value(mean * weight) + rating_sum) / (Value(float(weight)) + rating_count)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    
+    @classmethod
+    def adjust_rating_aggregates(cls, blog_id, sum_delta, count_delta):
+        """Apply a rating change to the stored aggregates in a single UPDATE"""
+        new_sum = F('rating_sum') + sum_delta
+        new_count = F('rating_count') + count_delta
+        cls.objects.filter(pk=blog_id).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating_avg=Case(
+                When(rating_count__gt=-count_delta, then=Cast(new_sum, FloatField()) / new_count),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+            rating_score=cls.weighted_rating(new_sum, new_count),
+            ratings_changed_at=timezone.now(),
+        )
+    
+    @classmethod
+    def rebuild_rating_aggregates(cls, queryset=None):
+        """Recompute the stored aggregates from the Rating table"""
+        ratings = Rating.objects.filter(blog=OuterRef('pk')).order_by().values('blog')
+        queryset = cls.objects.all() if queryset is None else queryset
+        updated = queryset.update(
+            rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating')).values('total')), 0),
+            rating_count=Coalesce(Subquery(ratings.annotate(total=Count('id')).values('total')), 0),
+            rating_avg=Coalesce(
+                Subquery(ratings.annotate(avg=Avg('rating')).values('avg')), Value(0.0), output_field=FloatField()
+            ),
+            ratings_changed_at=timezone.now(),
+        )
+        # SET expressions see the old row, so the score needs the new sums first
+        queryset.update(rating_score=cls.weighted_rating(F('rating_sum'), F('rating_count')))
+        return updated
+    
+    @classmethod
+    def refresh_rating_scores(cls, force=False, batch_size=10000):
+        """Re-weight every stored score once the global mean has drifted
+
+        The global mean is read from the stored aggregates, one pass over the
+        blog table rather than the ratings. Scores are only rewritten when it
+        moved by more than BLOG_RATING_MEAN_TOLERANCE, or the prior weight
+        setting changed, and then in primary key ranges of `batch_size` so
+        rating writes are never blocked for long. Returns the new
+        (mean, weight), or None when the scores were left alone.
+        """
+        totals = cls.objects.aggregate(rating_sum=Sum('rating_sum'), rating_count=Sum('rating_count'))
+        mean = totals['rating_sum'] / totals['rating_count'] if totals['rating_count'] else RatingPrior.DEFAULT_MEAN
+        weight = float(getattr(settings, 'BLOG_RATING_PRIOR_WEIGHT', RatingPrior.DEFAULT_WEIGHT))
+        stored = RatingPrior.objects.filter(pk=RatingPrior.SINGLETON_ID).values_list('mean', 'weight').first()
+        tolerance = getattr(settings, 'BLOG_RATING_MEAN_TOLERANCE', 0.01)
+        if not force and stored and abs(stored[0] - mean) <= tolerance and stored[1] == weight:
+            return None
+        
+        RatingPrior.objects.update_or_create(pk=RatingPrior.SINGLETON_ID, defaults={'mean': mean, 'weight': weight})
+        cache.delete(RatingPrior.CACHE_KEY)
+        score = cls.weighted_rating(F('rating_sum'), F('rating_count'), (mean, weight))
+        last_id = cls.objects.aggregate(last=Max('pk'))['last'] or 0
+        for start in range(0, last_id + 1, batch_size):
+            cls.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(rating_score=score)
+        return mean, weight
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Blog'
         verbose_name_plural = 'Blogs'
+        # Match the listing orderings in blogs.views, including the id tie-break
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='blog_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='blog_category_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='blog_author_created_idx'),
+            models.Index(fields=['-views', '-id'], name='blog_views_idx'),
+            models.Index(fields=['-rating_score', '-id'], name='blog_rating_score_idx'),
+            models.Index(fields=['-trending_score', '-id'], name='blog_trending_idx'),
+            models.Index(fields=['-favorite_count', '-id'], name='blog_favorite_count_idx'),
+        ]
+
+
+class RatingPrior(models.Model):
+    """Global mean rating and prior weight behind Blog.rating_score (one row)
+    
+    Maintained by Blog.refresh_rating_scores; rating writes read it through
+    the cache, so a refresh reaches every process within CACHE_TIMEOUT.
+    """
+    
+    SINGLETON_ID = 1
+    # Midpoint of the 0-6 scale until there are ratings to average
+    DEFAULT_MEAN = 3.0
+    DEFAULT_WEIGHT = 10.0
+    CACHE_KEY = 'blog-rating-prior'
+    CACHE_TIMEOUT = 60
+    
+    mean = models.FloatField(default=DEFAULT_MEAN)
+    weight = models.FloatField(default=DEFAULT_WEIGHT)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f'{self.weight:g} ratings of {self.mean:.3f}'
+    
+    @classmethod
+    def current(cls):
+        """(mean, weight) the stored scores were computed with"""
+        prior = cache.get(cls.CACHE_KEY)
+        if prior is None:
+            prior = cls.objects.filter(pk=cls.SINGLETON_ID).values_list('mean', 'weight').first()
+            prior = prior or (cls.DEFAULT_MEAN, float(getattr(settings, 'BLOG_RATING_PRIOR_WEIGHT', cls.DEFAULT_WEIGHT)))
+            cache.set(cls.CACHE_KEY, prior, cls.CACHE_TIMEOUT)
+        return prior
+    
+    class Meta:
+        verbose_name = 'Rating prior'
+        verbose_name_plural = 'Rating prior'
 
 
 class Rating(models.Model):
@@ -92,6 +262,11 @@ class Rating(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember the persisted score so signals can apply the delta
+        self._saved_rating = self.__dict__.get('rating') if self.pk else None
+    
     def __str__(self):
         return f'{self.user.username} rated {self.blog.title}: {self.rating}/6'
     
@@ -100,6 +275,9 @@ class Rating(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Rating'
         verbose_name_plural = 'Ratings'
+        indexes = [
+            models.Index(fields=['blog', '-created_at'], name='rating_blog_created_idx'),
+        ]
 
 
 class Favorite(models.Model):
@@ -117,3 +295,37 @@ class Favorite(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Favorite'
         verbose_name_plural = 'Favorites'
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='favorite_user_created_idx'),
+        ]
+
+
+class RankingEntry(models.Model):
+    """A blog's place in one of the precomputed top-N lists (see blogs.rankings)"""
+    
+    class Kind(models.TextChoices):
+        TOP_RATED = 'top_rated', 'Top rated'
+        TRENDING = 'trending', 'Trending'
+        MOST_FAVORITED = 'most_favorited', 'Most favorited'
+    
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    # Null for the global list, otherwise the category's own list
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='ranking_entries')
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name='ranking_entries')
+    score = models.FloatField()
+    
+    def __str__(self):
+        return f'{self.get_kind_display()} ({self.category or "all"}): {self.blog_id} {self.score}'
+    
+    class Meta:
+        verbose_name = 'Ranking entry'
+        verbose_name_plural = 'Ranking entries'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'category', 'blog'], name='ranking_entry_unique'),
+            models.UniqueConstraint(
+                fields=['kind', 'blog'], condition=models.Q(category=None), name='ranking_entry_global_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'category', '-score'], name='ranking_entry_score_idx'),
+        ]
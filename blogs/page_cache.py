@@ -0,0 +1,258 @@
+"""
+Whole-page response cache shared by anonymous and logged-in readers.
+
+Views decorated with @cache_shared_page declare what their page depends
+on by calling add_cache_tags(request, ...) while rendering. Each tag has a
+version number in the cache; bumping a tag (see blogs.signals) makes every
+page stored under an older version a miss, so invalidation is precise
+without having to know which URLs a change touched.
+
+The parts of a page that differ per visitor (the navbar's account links, the
+favorite and rating state on blog_detail) are wrapped in the user_fragment
+template tag. In a page being stored they become placeholders, so the cached
+page is the same for everyone, and each response fills them with the
+fragment rendered for its own visitor.
+
+Invalidation only reaches processes that share the cache, so the page cache
+needs redis or memcached once the site runs more than one worker; the
+blogs.W001 check warns when it is enabled on a per-process cache.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core import checks
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
+
+KEY_PREFIX = 'page-cache'
+FRAGMENT_PLACEHOLDER = '<!--page-cache:fragment:{}-->'
+
+# Caches private to one process: a tag bumped by a signal in one worker
+# leaves every other worker serving its stored pages until they time out
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+def get_cache():
+    return caches[getattr(settings, 'BLOG_PAGE_CACHE_ALIAS', 'default')]
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when the page cache is enabled on a cache other processes cannot see"""
+    if not getattr(settings, 'BLOG_PAGE_CACHE_ENABLED', False):
+        return []
+    alias = getattr(settings, 'BLOG_PAGE_CACHE_ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [checks.Warning(
+        f'BLOG_PAGE_CACHE_ENABLED is on but the {alias!r} cache is {backend}.',
+        hint=(
+            'Invalidation only reaches the process that made the change, so other workers serve '
+            'stale pages for up to BLOG_PAGE_CACHE_TIMEOUT seconds. Set CACHE_BACKEND=redis or '
+            'memcached, or run a single process.'
+        ),
+        id='blogs.W001',
+    )]
+
+
+def _tag_key(tag):
+    return f'{KEY_PREFIX}:tag:{tag}'
+
+
+def tag_versions(tags):
+    """Current version of each tag, tags never bumped are at version 0"""
+    stored = get_cache().get_many([_tag_key(tag) for tag in tags])
+    return {tag: stored.get(_tag_key(tag), 0) for tag in tags}
+
+
+def invalidate_tags(*tags):
+    """Bump the version of each tag, expiring every page that depends on it"""
+    cache = get_cache()
+    for tag in tags:
+        key = _tag_key(tag)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def add_cache_tags(request, *tags):
+    """Record what the page being rendered depends on
+
+    Versions are read now, before the page's queries run, so a change that
+    lands mid-render leaves the stored page already stale rather than fresh.
+    """
+    if hasattr(request, 'page_cache_tags'):
+        new_tags = [tag for tag in tags if tag not in request.page_cache_tags]
+        request.page_cache_tags.update(tag_versions(new_tags))
+
+
+async def aadd_cache_tags(request, *tags):
+    """Async version of add_cache_tags for async views"""
+    if hasattr(request, 'page_cache_tags'):
+        new_tags = [tag for tag in tags if tag not in request.page_cache_tags]
+        stored = await get_cache().aget_many([_tag_key(tag) for tag in new_tags])
+        request.page_cache_tags.update({tag: stored.get(_tag_key(tag), 0) for tag in new_tags})
+
+
+def page_key(request):
+    """Cache key from the path and the non-empty query parameters in sorted order"""
+    params = sorted((key, value) for key, values in request.GET.lists() for value in values if value)
+    raw = f'{request.path}?{urlencode(params)}'
+    return f'{KEY_PREFIX}:page:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def _count(outcome):
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:stats:{outcome}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def stats():
+    """Hit/miss counters shared by every process using the same cache"""
+    cache = get_cache()
+    hits = cache.get(f'{KEY_PREFIX}:stats:hit', 0)
+    misses = cache.get(f'{KEY_PREFIX}:stats:miss', 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
+
+
+def reset_stats():
+    get_cache().delete_many([f'{KEY_PREFIX}:stats:hit', f'{KEY_PREFIX}:stats:miss'])
+
+
+def is_shared_read(request):
+    """True for GET/HEAD requests whose page, outside its user fragments, is the same for every visitor"""
+    return (
+        request.method in ('GET', 'HEAD')
+        # Pages carrying flash messages are specific to this visitor
+        and not len(get_messages(request))
+    )
+
+
+def is_anonymous_read(request):
+    """True for GET/HEAD requests whose page is the same for every anonymous visitor"""
+    return not request.user.is_authenticated and is_shared_read(request)
+
+
+def _cacheable(request):
+    return getattr(settings, 'BLOG_PAGE_CACHE_ENABLED', False) and is_shared_read(request)
+
+
+def hold_fragment(request, template_name, kwargs, html):
+    """Placeholder for a user fragment of a page being stored, or None when the page is not stored
+
+    `html` is the fragment rendered for the current visitor, filled in once
+    the page has been stored; `kwargs` are the page-level values the
+    fragment template is rendered with again on every hit.
+    """
+    fragments = getattr(request, 'page_cache_fragments', None)
+    if fragments is None:
+        return None
+    fragments.append((template_name, kwargs, html))
+    return FRAGMENT_PLACEHOLDER.format(len(fragments) - 1)
+
+
+def _fill_fragments(response, fragments):
+    content = response.content.decode(response.charset)
+    for index, html in enumerate(fragments):
+        content = content.replace(FRAGMENT_PLACEHOLDER.format(index), html)
+    response.content = content
+
+
+def _render_fragments(request, entry, fragment_context):
+    """User fragments of a stored page rendered for this visitor"""
+    if entry['anonymous'] is not None and not request.user.is_authenticated:
+        return entry['anonymous']
+    context = fragment_context(request, entry['meta']) if fragment_context is not None else {}
+    return [render_to_string(name, {**context, **kwargs}, request) for name, kwargs in entry['fragments']]
+
+
+def _cached_response(request, on_hit, fragment_context):
+    """Stored response for the request if it is still fresh, else None"""
+    entry = get_cache().get(page_key(request))
+    if entry is not None and tag_versions(entry['tags']) == entry['tags']:
+        _count('hit')
+        if on_hit is not None:
+            on_hit(request, entry['meta'])
+        response = entry['response']
+        if entry['fragments']:
+            _fill_fragments(response, _render_fragments(request, entry, fragment_context))
+        response['X-Page-Cache'] = 'HIT'
+        return response
+    _count('miss')
+    request.page_cache_tags = {}
+    request.page_cache_meta = {}
+    request.page_cache_fragments = []
+    return None
+
+
+def _store_response(request, response):
+    fragments = request.page_cache_fragments
+    if response.status_code == 200 and not response.streaming and not response.cookies and request.page_cache_tags:
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        get_cache().set(
+            page_key(request),
+            {
+                'tags': request.page_cache_tags,
+                'meta': request.page_cache_meta,
+                'fragments': [(name, kwargs) for name, kwargs, _ in fragments],
+                # Anonymous fragments are the same for everyone, so keep them too
+                'anonymous': None if request.user.is_authenticated else [html for _, _, html in fragments],
+                'response': response,
+            },
+            getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 300),
+        )
+    if fragments and not response.streaming:
+        _fill_fragments(response, [html for _, _, html in fragments])
+    response['X-Page-Cache'] = 'MISS'
+    return response
+
+
+def cache_shared_page(on_hit=None, fragment_context=None):
+    """Serve GETs from the page cache, filling in each visitor's user fragments
+
+    Anonymous and logged-in readers share one stored page per URL. On a hit
+    the page's user fragments are rendered for the visitor with the context
+    returned by `fragment_context(request, meta)` plus the values given to
+    the user_fragment tag; a logged-in hit costs those fragment queries
+    rather than the whole view. Pages carrying flash messages are always
+    rendered fresh. `on_hit(request, meta)` runs for every cache hit with the
+    meta dict the view stored in request.page_cache_meta. Works on sync and
+    async views alike; for async views the session, cache, fragment and
+    on_hit work runs in a thread.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            async def wrapper(request, *args, **kwargs):
+                if not await sync_to_async(_cacheable)(request):
+                    return await view_func(request, *args, **kwargs)
+                response = await sync_to_async(_cached_response)(request, on_hit, fragment_context)
+                if response is not None:
+                    return response
+                response = await view_func(request, *args, **kwargs)
+                return await sync_to_async(_store_response)(request, response)
+        else:
+            def wrapper(request, *args, **kwargs):
+                if not _cacheable(request):
+                    return view_func(request, *args, **kwargs)
+                response = _cached_response(request, on_hit, fragment_context)
+                if response is not None:
+                    return response
+                return _store_response(request, view_func(request, *args, **kwargs))
+
+        return wraps(view_func)(wrapper)
+    return decorator
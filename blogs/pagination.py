@@ -0,0 +1,282 @@
+"""
+Pagination helpers for blog listings.
+
+BLOG_PAGINATION_MODE selects 'page' (numbered pages, Django's Paginator) or
+'cursor' (keyset pagination with opaque next/previous tokens, no COUNT and
+no OFFSET). In page mode BLOG_PAGINATION_COUNT_CACHE_TIMEOUT > 0 caches the
+total count so "Page X of Y" does not run COUNT(*) on every request.
+
+A listing whose top rows are also kept precomputed (the blogs.rankings lists
+behind the ranked sorts) is paged by PrefixedPaginator, in numbered pages
+whatever the mode: the pages the ranking covers read it, later ones the
+listing itself.
+"""
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+PER_PAGE = 9
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = data['v'], data['d']
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(token) from e
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise InvalidCursor(token)
+    return values, direction
+
+
+class CursorPage:
+    """A page of results with next/previous cursors instead of page numbers"""
+
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset paginator over a queryset ordered by unique `ordering` fields
+
+    The last ordering field must be unique (normally 'id' or '-id') so that
+    every row has a distinct position.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+
+    @cached_property
+    def fields(self):
+        """[(field name, descending)] for each ordering term"""
+        return [(term.lstrip('-'), term.startswith('-')) for term in self.ordering]
+
+    def _position(self, obj):
+        return [getattr(obj, name) for name, _ in self.fields]
+
+    def _after(self, values, reverse=False):
+        """Q matching rows strictly after `values` in the (possibly reversed) ordering"""
+        model = self.queryset.model
+        values = [model._meta.get_field(name).to_python(value) for (name, _), value in zip(self.fields, values)]
+        # (a < x) OR (a = x AND b < y) OR ... for each ordering prefix
+        condition = Q()
+        for i, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending != reverse else 'gt'
+            equal_prefix = {prev_name: values[j] for j, (prev_name, _) in enumerate(self.fields[:i])}
+            condition |= Q(**{f'{name}__{lookup}': values[i]}, **equal_prefix)
+        return condition
+
+    def _query(self, token):
+        """(queryset of per_page + 1 rows, decoded values, direction) for `token`"""
+        try:
+            values, direction = decode_cursor(token) if token else (None, 'next')
+            if values is not None and len(values) != len(self.fields):
+                raise InvalidCursor(token)
+        except InvalidCursor:
+            values, direction = None, 'next'
+
+        if direction == 'next':
+            queryset = self.queryset.order_by(*self.ordering)
+            if values is not None:
+                queryset = queryset.filter(self._after(values))
+        else:
+            reversed_ordering = [term[1:] if term.startswith('-') else f'-{term}' for term in self.ordering]
+            queryset = self.queryset.order_by(*reversed_ordering).filter(self._after(values, reverse=True))
+        return queryset[:self.per_page + 1], values, direction
+
+    def _build_page(self, rows, values, direction):
+        has_more = len(rows) > self.per_page
+        if direction == 'next':
+            rows = rows[:self.per_page]
+            has_next, has_previous = has_more, values is not None
+        else:
+            rows = rows[:self.per_page][::-1]
+            has_next, has_previous = True, has_more
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(self._position(rows[-1]), 'next')
+        if rows and has_previous:
+            previous_cursor = encode_cursor(self._position(rows[0]), 'prev')
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def first_page(self, rows):
+        """Build the first page from rows fetched elsewhere, e.g. a prefetch
+
+        `rows` must follow the paginator's ordering and hold up to per_page + 1
+        items; the extra row only signals that there is a next page.
+        """
+        return self._build_page(list(rows), None, 'next')
+
+    def get_page(self, token=None):
+        """Return the page addressed by `token`, or the first page if it is missing or invalid"""
+        queryset, values, direction = self._query(token)
+        return self._build_page(list(queryset), values, direction)
+
+    async def aget_page(self, token=None):
+        """Async version of get_page"""
+        queryset, values, direction = self._query(token)
+        return self._build_page([obj async for obj in queryset], values, direction)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator that caches COUNT(*) per query for `count_timeout` seconds"""
+
+    def __init__(self, *args, count_timeout=60, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_timeout = count_timeout
+
+    def count_key(self):
+        sql, params = self.object_list.query.sql_with_params()
+        return 'paginator-count:' + hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+
+    @cached_property
+    def count(self):
+        if not self.count_timeout or getattr(self.object_list, 'query', None) is None:
+            return super().count
+        key = self.count_key()
+        total = cache.get(key)
+        if total is None:
+            total = super().count
+            cache.set(key, total, self.count_timeout)
+        return total
+
+    async def acount(self):
+        if not self.count_timeout:
+            return await self.object_list.acount()
+        key = self.count_key()
+        total = await cache.aget(key)
+        if total is None:
+            total = await self.object_list.acount()
+            await cache.aset(key, total, self.count_timeout)
+        return total
+
+
+class PrefixedPaginator(CachedCountPaginator):
+    """Numbered pages over a listing whose first rows are also precomputed
+
+    `prefix` yields the first len(prefix_ids) rows of the ordered listing
+    from a cheaper source, e.g. a blogs.rankings list. Pages inside it read
+    only the prefix. Later pages read the listing minus the prefix's rows,
+    offset by its size, so a prefix lagging the column it mirrors never
+    repeats or drops a row at the boundary.
+    """
+
+    def __init__(self, object_list, per_page, prefix, prefix_ids, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.prefix = prefix
+        self.prefix_ids = list(prefix_ids)
+
+    def _slices(self, number):
+        """Querysets holding page `number`'s rows, in order"""
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        size = len(self.prefix_ids)
+        slices = []
+        if bottom < size:
+            slices.append(self.prefix[bottom:min(top, size)])
+        if top > size:
+            rest = self.object_list.exclude(pk__in=self.prefix_ids)
+            slices.append(rest[max(bottom - size, 0):top - size])
+        return slices
+
+    def page(self, number):
+        number = self.validate_number(number)
+        return self._get_page([row for rows in self._slices(number) for row in rows], number, self)
+
+    async def aget_page(self, number):
+        """Async version of get_page, for a paginator whose count is already set"""
+        try:
+            number = self.validate_number(number)
+        except PageNotAnInteger:
+            number = 1
+        except EmptyPage:
+            number = self.num_pages
+        return self._get_page([row for rows in self._slices(number) async for row in rows], number, self)
+
+
+def _page_paginator(queryset, ordering, per_page, prefix=None):
+    if ordering:
+        queryset = queryset.order_by(*ordering)
+    count_timeout = getattr(settings, 'BLOG_PAGINATION_COUNT_CACHE_TIMEOUT', 0)
+    if prefix:
+        return PrefixedPaginator(queryset, per_page, *prefix, count_timeout=count_timeout)
+    if count_timeout:
+        return CachedCountPaginator(queryset, per_page, count_timeout=count_timeout)
+    return Paginator(queryset, per_page)
+
+
+def _cursor_mode(ordering):
+    return ordering and getattr(settings, 'BLOG_PAGINATION_MODE', 'page') == 'cursor'
+
+
+def paginate(request, queryset, ordering=None, per_page=PER_PAGE, prefix=None):
+    """Paginate a listing according to BLOG_PAGINATION_MODE
+
+    `ordering` must end in a unique field for cursor mode; without it the
+    listing always uses numbered pages. `prefix` is an optional
+    (queryset, ids) pair for PrefixedPaginator.
+    """
+    if not prefix and _cursor_mode(ordering):
+        return CursorPaginator(queryset, per_page, ordering).get_page(request.GET.get('cursor'))
+    return _page_paginator(queryset, ordering, per_page, prefix).get_page(request.GET.get('page'))
+
+
+async def apaginate(request, queryset, ordering=None, per_page=PER_PAGE, prefix=None):
+    """Async version of paginate, running the count and page queries with the async ORM"""
+    if not prefix and _cursor_mode(ordering):
+        return await CursorPaginator(queryset, per_page, ordering).aget_page(request.GET.get('cursor'))
+
+    paginator = _page_paginator(queryset, ordering, per_page, prefix)
+    # With the count filled in, get_page() only slices the queryset lazily
+    if isinstance(paginator, CachedCountPaginator):
+        paginator.count = await paginator.acount()
+    else:
+        paginator.count = await queryset.acount()
+    if prefix:
+        return await paginator.aget_page(request.GET.get('page'))
+    page = paginator.get_page(request.GET.get('page'))
+    page.object_list = [obj async for obj in page.object_list]
+    return page
@@ -0,0 +1,260 @@
+"""
+Precomputed top-N blog rankings behind the home page's ranked sorts.
+
+Each kind is kept as RankingEntry rows, once globally and once per category:
+
+- top_rated: rating_score (the Bayesian average), for blogs with at least
+  BLOG_RANKING_MIN_RATINGS ratings
+- trending: views, ratings and favorites with exponential time decay
+- most_favorited: favorite_count
+
+The trending score is stored in log space: an event of weight w at time t
+adds w * 2^(t / h) to a sum whose log2 is Blog.trending_score, h being
+BLOG_TRENDING_HALF_LIFE_HOURS. Comparing two scores compares the blogs'
+decayed activity as of any moment, so idle blogs fall behind without their
+scores ever being rewritten and no periodic decay job is needed.
+
+Signals (ratings, favorites) and the view counter update the Blog columns,
+then sync_rankings() refreshes the changed blogs' entries; the signals go
+through schedule_sync(), which waits for the transaction to commit and syncs
+each blog once however many of its rows changed. A listed blog
+gets its new score; an unlisted one is admitted when it beats the list's
+cutoff, and the list is trimmed back to BLOG_RANKING_SIZE. Membership and
+cutoffs are cached per list for LIST_CACHE_TIMEOUT seconds, so most events on
+unranked blogs cost no ranking query at all. Blogs whose score drops while
+they are listed, or that changed category, are only re-ranked by
+`manage.py rebuild_rankings`, which recomputes every list from scratch.
+
+A list only holds the top BLOG_RANKING_SIZE blogs, so the home page reads it
+for the pages it covers and continues with the index-backed column sort
+after that (blogs.pagination.PrefixedPaginator).
+"""
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Value, When, Window
+from django.db.models.functions import Abs, Coalesce, Greatest, Log, Power, RowNumber
+from django.utils import timezone
+
+from .models import Blog, Category, Favorite, RankingEntry
+
+KINDS = tuple(RankingEntry.Kind.values)
+
+# Blog column each kind ranks by
+SCORE_FIELDS = {
+    RankingEntry.Kind.TOP_RATED: 'rating_score',
+    RankingEntry.Kind.TRENDING: 'trending_score',
+    RankingEntry.Kind.MOST_FAVORITED: 'favorite_count',
+}
+# Blog fields sync_blog reads
+RANKED_FIELDS = ('rating_score', 'rating_count', 'trending_score', 'favorite_count')
+
+# Trending weight of each kind of event
+VIEW_WEIGHT = 1
+RATING_WEIGHT = 5
+FAVORITE_WEIGHT = 10
+
+LIST_CACHE_TIMEOUT = 60
+
+
+def ranking_size():
+    return getattr(settings, 'BLOG_RANKING_SIZE', 100)
+
+
+def eligible(kind):
+    """Q selecting the blogs that may appear in a ranking of `kind`"""
+    if kind == RankingEntry.Kind.TOP_RATED:
+        return Q(rating_count__gte=getattr(settings, 'BLOG_RANKING_MIN_RATINGS', 1))
+    return Q(**{f'{SCORE_FIELDS[kind]}__gt': 0})
+
+
+def blog_score(kind, blog):
+    """The blog's score for `kind`, or None if it is not eligible"""
+    if kind == RankingEntry.Kind.TOP_RATED:
+        if blog['rating_count'] < getattr(settings, 'BLOG_RANKING_MIN_RATINGS', 1):
+            return None
+        return blog['rating_score']
+    score = blog[SCORE_FIELDS[kind]]
+    return score if score > 0 else None
+
+
+def activity(weight, when=None):
+    """Trending score of a single event: log2(weight * 2^(t / half life))"""
+    when = when or timezone.now()
+    half_life = getattr(settings, 'BLOG_TRENDING_HALF_LIFE_HOURS', 24)
+    return math.log2(weight) + when.timestamp() / 3600 / half_life
+
+
+def add_scores(a, b):
+    """log2(2^a + 2^b) without overflowing"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def trending_increment(weight, when=None):
+    """Expression for Blog.trending_score after an event, for use in UPDATE"""
+    event = Value(activity(weight, when), output_field=FloatField())
+    score = F('trending_score')
+    return Greatest(score, event) + Log(2, Value(1.0) + Power(2, -Abs(score - event)), output_field=FloatField())
+
+
+def record_activity(blog_id, weight, **updates):
+    """Add an event to the blog's trending score in the same UPDATE as `updates`"""
+    return Blog.objects.filter(pk=blog_id).update(trending_score=trending_increment(weight), **updates)
+
+
+def _list_key(kind, category_id):
+    return f'blog-rankings:{kind}:{category_id or "all"}'
+
+
+def list_state(kind, category_id=None):
+    """(ids of the listed blogs, score a blog must beat to get in, or None while there is room)"""
+    key = _list_key(kind, category_id)
+    state = cache.get(key)
+    if state is None:
+        rows = RankingEntry.objects.filter(kind=kind, category_id=category_id).values_list('blog_id', 'score')
+        members = dict(rows)
+        cutoff = min(members.values()) if len(members) >= ranking_size() else None
+        state = (frozenset(members), cutoff)
+        cache.set(key, state, LIST_CACHE_TIMEOUT)
+    return state
+
+
+def _admit(kind, category_id, blog_id, score, trim):
+    """Insert an entry, and trim the list back to the ranking size if it was full"""
+    try:
+        with transaction.atomic():
+            RankingEntry.objects.create(kind=kind, category_id=category_id, blog_id=blog_id, score=score)
+    except IntegrityError:
+        # Admitted meanwhile by another process whose list cache was fresher
+        RankingEntry.objects.filter(kind=kind, category_id=category_id, blog_id=blog_id).update(score=score)
+    if trim:
+        entries = RankingEntry.objects.filter(kind=kind, category_id=category_id)
+        keep = entries.order_by('-score', '-blog_id').values('pk')[:ranking_size()]
+        entries.exclude(pk__in=Subquery(keep)).delete()
+    cache.delete(_list_key(kind, category_id))
+
+
+def sync_blog(blog, kinds=KINDS):
+    """Bring a blog's ranking entries in line with its scores
+
+    `blog` is a dict (or Blog instance) with id, category_id and the score
+    fields of `kinds`.
+    """
+    if isinstance(blog, Blog):
+        blog = {name: getattr(blog, name) for name in ('id', 'category_id', *RANKED_FIELDS)}
+    scopes = (None, blog['category_id']) if blog['category_id'] else (None,)
+    entries = RankingEntry.objects.filter(blog_id=blog['id'])
+    rescored = {}
+    for kind in kinds:
+        score = blog_score(kind, blog)
+        states = {scope: list_state(kind, scope) for scope in scopes}
+        listed = [scope for scope, (members, _) in states.items() if blog['id'] in members]
+        if listed and score is None:
+            entries.filter(kind=kind).delete()
+            cache.delete_many([_list_key(kind, scope) for scope in listed])
+        elif listed:
+            rescored[kind] = score
+        if score is None:
+            continue
+        for scope, (members, cutoff) in states.items():
+            if scope not in listed and (cutoff is None or score > cutoff):
+                _admit(kind, scope, blog['id'], score, trim=cutoff is not None)
+    # One UPDATE for every listed kind
+    if rescored:
+        entries.filter(kind__in=rescored).update(score=Case(
+            *(When(kind=kind, then=Value(score)) for kind, score in rescored.items()), output_field=FloatField(),
+        ))
+
+
+def sync_rankings(blog_ids, kinds=KINDS):
+    """Refresh the ranking entries of the given blogs from their stored scores"""
+    # The scores were usually just written, so read them back from the primary
+    for blog in Blog.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=blog_ids).values('id', 'category_id', *RANKED_FIELDS):
+        sync_blog(blog, kinds)
+
+
+class _SyncBatch:
+    """Blogs to sync, with their kinds, when one transaction commits"""
+
+    def __init__(self):
+        self.kinds = {}
+        self.ran = False
+
+    def add(self, blog_id, kinds):
+        self.kinds.setdefault(blog_id, set()).update(kinds)
+
+    def __call__(self):
+        self.ran = True
+        by_kinds = {}
+        for blog_id, kinds in self.kinds.items():
+            by_kinds.setdefault(frozenset(kinds), []).append(blog_id)
+        for kinds, blog_ids in by_kinds.items():
+            sync_rankings(blog_ids, [kind for kind in KINDS if kind in kinds])
+
+
+_batches = threading.local()
+
+
+def schedule_sync(blog_id, kinds=KINDS):
+    """sync_rankings() for a blog once the current transaction commits
+
+    Requests from the same transaction share one batch, so deleting a user
+    with many ratings on a blog syncs that blog once. Blogs deleted by then
+    are skipped, as sync_rankings() no longer finds them.
+    """
+    connection = transaction.get_connection(DEFAULT_DB_ALIAS)
+    batch = getattr(_batches, 'current', None)
+    # A batch that already ran, or whose hook a rollback dropped, is not reused.
+    # Its hook is one of the first of its transaction, so the scan stops early
+    if batch is None or batch.ran or not any(hook[1] is batch for hook in connection.run_on_commit):
+        batch = _batches.current = _SyncBatch()
+        batch.add(blog_id, kinds)
+        transaction.on_commit(batch, using=DEFAULT_DB_ALIAS)
+    else:
+        batch.add(blog_id, kinds)
+
+
+def ranked_blogs(queryset, kind, category_id=None):
+    """`queryset` limited to a ranking and ordered best first, or None if the ranking is empty"""
+    members, _ = list_state(kind, category_id)
+    if not members:
+        return None
+    return queryset.filter(
+        ranking_entries__kind=kind, ranking_entries__category_id=category_id,
+    ).annotate(rank_score=F('ranking_entries__score')).order_by('-rank_score', '-id')
+
+
+def rebuild_favorite_counts(queryset=None):
+    """Recompute Blog.favorite_count from the Favorite table"""
+    favorites = Favorite.objects.filter(blog=OuterRef('pk')).order_by().values('blog')
+    queryset = Blog.objects.all() if queryset is None else queryset
+    return queryset.update(
+        favorite_count=Coalesce(Subquery(favorites.annotate(total=Count('id')).values('total')), 0),
+    )
+
+
+def rebuild_rankings(kinds=KINDS):
+    """Recompute every list of `kinds` from the Blog table, returning the number of entries"""
+    size = ranking_size()
+    entries = []
+    for kind in kinds:
+        field = SCORE_FIELDS[kind]
+        blogs = Blog.objects.filter(eligible(kind)).order_by()
+        for blog_id, score in blogs.order_by(f'-{field}', '-id').values_list('id', field)[:size]:
+            entries.append(RankingEntry(kind=kind, category_id=None, blog_id=blog_id, score=score))
+        per_category = blogs.exclude(category=None).annotate(
+            position=Window(RowNumber(), partition_by=F('category_id'), order_by=(F(field).desc(), F('id').desc())),
+        ).filter(position__lte=size)
+        for blog_id, category_id, score in per_category.values_list('id', 'category_id', field):
+            entries.append(RankingEntry(kind=kind, category_id=category_id, blog_id=blog_id, score=score))
+
+    with transaction.atomic():
+        RankingEntry.objects.filter(kind__in=kinds).delete()
+        RankingEntry.objects.bulk_create(entries, batch_size=500)
+    scopes = [None, *Category.objects.values_list('pk', flat=True)]
+    cache.delete_many([_list_key(kind, scope) for kind in kinds for scope in scopes])
+    return len(entries)
@@ -0,0 +1,160 @@
+"""
+Full-text search backends for blog posts.
+
+The backend is chosen by BLOG_SEARCH_BACKEND ('auto', 'sqlite', 'postgres'
+or 'basic'). 'auto' picks the native engine of the default database and
+falls back to icontains filtering when no index is available.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+
+FTS_TABLE = 'blogs_blog_fts'
+
+_word_re = re.compile(r'\w+', re.UNICODE)
+
+
+def _terms(query):
+    return _word_re.findall(query.lower())
+
+
+def _no_match(queryset):
+    """Empty result for a query without word terms, still sortable by search_rank"""
+    return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class BasicSearchBackend:
+    """LIKE '%term%' matching over title and body, no ranking"""
+
+    ranked = False
+
+    def search(self, queryset, query):
+        return queryset.filter(Q(title__icontains=query) | Q(body__icontains=query))
+
+    def index(self, blog):
+        pass
+
+    def index_many(self, blog_ids):
+        """(Re)index many saved blogs at once, e.g. after bulk_create"""
+        pass
+
+    def remove(self, blog_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SQLiteSearchBackend(BasicSearchBackend):
+    """FTS5 virtual table keyed by blog id, ranked with bm25"""
+
+    ranked = True
+    # bm25 column weights for (title, body)
+    weights = (10.0, 1.0)
+
+    def match_expression(self, query):
+        """Quote each term and allow prefix matches: "foo"* "bar"*"""
+        return ' '.join(f'"{term}"*' for term in _terms(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return _no_match(queryset)
+        # Join the FTS table on rowid so MATCH and bm25 run once per query;
+        # bm25 scores are negative, lower is a better match
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = blogs_blog.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'-bm25({FTS_TABLE}, %s, %s)'},
+            select_params=self.weights,
+        )
+
+    def index(self, blog):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [blog.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)',
+                [blog.pk, blog.title, blog.body],
+            )
+
+    def index_many(self, blog_ids):
+        if not blog_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(blog_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', blog_ids)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, body) SELECT id, title, body FROM blogs_blog WHERE id IN ({placeholders})',
+                blog_ids,
+            )
+
+    def remove(self, blog_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [blog_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, title, body) SELECT id, title, body FROM blogs_blog')
+            return cursor.rowcount
+
+
+class PostgresSearchBackend(BasicSearchBackend):
+    """tsvector matching backed by the GIN expression index from migrations"""
+
+    ranked = True
+    config = 'english'
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        terms = _terms(query)
+        if not terms:
+            return _no_match(queryset)
+        search_query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=self.config)
+        vector = search_vector(self.config)
+        return queryset.annotate(search_vector=vector, search_rank=SearchRank(vector, search_query)).filter(
+            search_vector=search_query
+        )
+
+
+def search_vector(config='english'):
+    """Weighted title/body tsvector, identical to the GIN index expression"""
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector('title', weight='A', config=config) + SearchVector('body', weight='B', config=config)
+
+
+def fts_table_exists():
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured search backend, resolving 'auto' once per process"""
+    global _backend
+    if _backend is None:
+        name = getattr(settings, 'BLOG_SEARCH_BACKEND', 'auto')
+        if name == 'auto':
+            if connection.vendor == 'sqlite' and fts_table_exists():
+                name = 'sqlite'
+            elif connection.vendor == 'postgresql':
+                name = 'postgres'
+            else:
+                name = 'basic'
+        _backend = {
+            'sqlite': SQLiteSearchBackend,
+            'postgres': PostgresSearchBackend,
+            'basic': BasicSearchBackend,
+        }[name]()
+    return _backend
+
+
+def search_blogs(queryset, query):
+    """Filter a Blog queryset by a free-text query using the active backend"""
+    return get_search_backend().search(queryset, query)
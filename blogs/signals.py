@@ -0,0 +1,161 @@
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from users.models import Profile
+from .models import Blog, Category, Rating, Favorite, RankingEntry
+from . import rankings
+from .page_cache import invalidate_tags
+from .search import get_search_backend
+from .images import delete_variants, schedule_variants
+
+
+@receiver(post_save, sender=Rating)
+def update_rating_aggregates_on_save(sender, instance, created, **kwargs):
+    """Fold a new or changed rating into the blog's stored aggregates"""
+    rating = int(instance.rating)
+    if created:
+        Blog.adjust_rating_aggregates(instance.blog_id, rating, 1)
+    elif instance._saved_rating is None:
+        # Previous score unknown (deferred field), fall back to a recount
+        Blog.rebuild_rating_aggregates(Blog.objects.filter(pk=instance.blog_id))
+    elif rating != instance._saved_rating:
+        Blog.adjust_rating_aggregates(instance.blog_id, rating - instance._saved_rating, 0)
+    instance._saved_rating = rating
+
+
+def deleted_with_blog(origin):
+    """Whether a delete cascaded from Blog rows, which take their aggregates and rankings along"""
+    return isinstance(origin, Blog) or (isinstance(origin, QuerySet) and origin.model is Blog)
+
+
+@receiver(post_delete, sender=Rating)
+def update_rating_aggregates_on_delete(sender, instance, origin=None, **kwargs):
+    """Remove a deleted rating from the blog's stored aggregates"""
+    if not deleted_with_blog(origin):
+        Blog.adjust_rating_aggregates(instance.blog_id, -int(instance.rating), -1)
+
+
+@receiver(post_save, sender=Rating)
+def update_rankings_on_rating_save(sender, instance, created, **kwargs):
+    """Count a new rating as trending activity and re-rank the blog"""
+    if created:
+        rankings.record_activity(instance.blog_id, rankings.RATING_WEIGHT)
+        rankings.schedule_sync(instance.blog_id)
+    else:
+        rankings.schedule_sync(instance.blog_id, [RankingEntry.Kind.TOP_RATED])
+
+
+@receiver(post_delete, sender=Rating)
+def update_rankings_on_rating_delete(sender, instance, origin=None, **kwargs):
+    """Re-rank the blog by its remaining ratings"""
+    if not deleted_with_blog(origin):
+        rankings.schedule_sync(instance.blog_id, [RankingEntry.Kind.TOP_RATED])
+
+
+@receiver(post_save, sender=Favorite)
+def update_favorite_count_on_save(sender, instance, created, **kwargs):
+    """Count a new favorite and its trending activity, then re-rank the blog"""
+    if created:
+        rankings.record_activity(instance.blog_id, rankings.FAVORITE_WEIGHT, favorite_count=F('favorite_count') + 1)
+        rankings.schedule_sync(instance.blog_id, [RankingEntry.Kind.TRENDING, RankingEntry.Kind.MOST_FAVORITED])
+
+
+@receiver(post_delete, sender=Favorite)
+def update_favorite_count_on_delete(sender, instance, origin=None, **kwargs):
+    """Uncount a removed favorite and re-rank the blog"""
+    if deleted_with_blog(origin):
+        return
+    Blog.objects.filter(pk=instance.blog_id, favorite_count__gt=0).update(favorite_count=F('favorite_count') - 1)
+    rankings.schedule_sync(instance.blog_id, [RankingEntry.Kind.MOST_FAVORITED])
+
+
+@receiver(post_save, sender=Blog)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """Reindex a blog when its title or body may have changed"""
+    if update_fields is not None and not {'title', 'body'} & set(update_fields):
+        return
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Blog)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Drop a deleted blog from the search index"""
+    get_search_backend().remove(instance.pk)
+
+
+def blog_cache_tags(blog_id, category_id, author_id):
+    """Page cache tags for every page that shows this blog"""
+    tags = {'listing', f'blog:{blog_id}', f'author:{author_id}'}
+    if category_id:
+        tags.add(f'category:{category_id}')
+    return tags
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def invalidate_blog_pages(sender, instance, **kwargs):
+    """Expire cached pages that list or show this blog, including its old category"""
+    tags = blog_cache_tags(instance.pk, instance.category_id, instance.author_id)
+    if instance._saved_listing:
+        tags |= blog_cache_tags(instance.pk, *instance._saved_listing)
+    invalidate_tags(*tags)
+    instance._saved_listing = (instance.category_id, instance.author_id)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_rated_blog_pages(sender, instance, origin=None, **kwargs):
+    """Expire cached pages showing the rated blog's reviews or average"""
+    if deleted_with_blog(origin):
+        # invalidate_blog_pages covers the blog's pages
+        return
+    listing = Blog.objects.filter(pk=instance.blog_id).values_list('category_id', 'author_id').first()
+    if listing:
+        invalidate_tags(*blog_cache_tags(instance.blog_id, *listing))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    """Expire the category page and listings showing the category name"""
+    invalidate_tags('listing', f'category:{instance.pk}')
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_author_pages(sender, instance, **kwargs):
+    """Expire the author page and blog pages showing the author sidebar"""
+    invalidate_tags(f'author:{instance.user_id}')
+
+
+def refresh_image_variants(model, instance, field, update_fields):
+    """Schedule variants for a newly saved image and drop those of the image it replaced
+
+    Both happen once the transaction commits. Variants of an image another
+    row still uses, such as the default profile picture, are kept.
+    """
+    if update_fields is not None and field not in update_fields:
+        return
+    name = getattr(instance, field).name or ''
+    saved = getattr(instance, f'_saved_{field}') or ''
+    saved = getattr(saved, 'name', saved)
+    setattr(instance, f'_saved_{field}', name)
+    if name and name != saved:
+        schedule_variants(name)
+    if saved and saved != name:
+        def drop_replaced():
+            if not model._default_manager.filter(**{field: saved}).exists():
+                delete_variants(saved)
+        transaction.on_commit(drop_replaced)
+
+
+@receiver(post_save, sender=Blog)
+def create_blog_image_variants(sender, instance, update_fields=None, **kwargs):
+    """Resize a newly uploaded blog image into its responsive variants"""
+    refresh_image_variants(Blog, instance, 'image', update_fields)
+
+
+@receiver(post_save, sender=Profile)
+def create_profile_picture_variants(sender, instance, update_fields=None, **kwargs):
+    """Resize a newly uploaded profile picture into its responsive variants"""
+    refresh_image_variants(Profile, instance, 'profile_picture', update_fields)
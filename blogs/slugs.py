@@ -0,0 +1,94 @@
+"""
+Unique slug allocation for blog posts.
+
+A slug is taken as `base` or `base-N`. Instead of probing candidates one
+query at a time, the existing `base`/`base-%` slugs are read in one query
+and the next free suffix is picked in Python.
+
+SQLite cannot use the slug index for Django's `startswith` (LIKE ... ESCAPE),
+so there the prefix is matched as the range ['base-', 'base.'), which under
+its binary collation selects exactly the slugs starting with 'base-'.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.text import slugify
+
+SLUG_MAX_LENGTH = 200
+# Room kept at the end of the base slug for a '-N' suffix
+SUFFIX_ROOM = 10
+# Number of base slugs looked up per query in bulk mode
+BULK_CHUNK_SIZE = 200
+# Slugs that blogs/urls.py routes before blog/<slug>/
+RESERVED_SLUGS = frozenset({'create'})
+
+
+def base_slug(title):
+    return slugify(title)[:SLUG_MAX_LENGTH - SUFFIX_ROOM].rstrip('-') or 'blog'
+
+
+def _taken_suffixes(base, slugs):
+    """Suffix numbers in use for `base`, 0 standing for the bare base slug"""
+    pattern = re.compile(rf'^{re.escape(base)}-(\d+)$')
+    taken = {0} if base in RESERVED_SLUGS else set()
+    for slug in slugs:
+        if slug == base:
+            taken.add(0)
+        else:
+            match = pattern.match(slug)
+            if match:
+                taken.add(int(match.group(1)))
+    return taken
+
+
+def _next_slug(base, taken):
+    if 0 not in taken:
+        return base
+    return f'{base}-{max(taken) + 1}'
+
+
+def _existing_slugs(queryset, bases):
+    binary_ranges = connections[queryset.db].vendor == 'sqlite'
+    condition = Q(slug__in=bases)
+    for base in bases:
+        if binary_ranges:
+            # '.' is the character after '-'
+            condition |= Q(slug__gte=f'{base}-', slug__lt=f'{base}.')
+        else:
+            condition |= Q(slug__startswith=f'{base}-')
+    return queryset.filter(condition).order_by().values_list('slug', flat=True)
+
+
+def next_free_slug(queryset, title):
+    """Next unused slug for `title` among `queryset`, in a single query"""
+    base = base_slug(title)
+    return _next_slug(base, _taken_suffixes(base, _existing_slugs(queryset, [base])))
+
+
+def allocate_slugs(queryset, titles):
+    """Unique slugs for many titles at once, e.g. for bulk_create imports
+
+    Existing slugs are fetched BULK_CHUNK_SIZE bases per query, and slugs
+    handed out earlier in the same call are never reused, even when one
+    title's suffixed slug is another title's base ('Foo' x3 and 'Foo 2').
+    """
+    bases = [base_slug(title) for title in titles]
+    distinct = list(dict.fromkeys(bases))
+    taken = {base: set() for base in distinct}
+    for i in range(0, len(distinct), BULK_CHUNK_SIZE):
+        chunk = distinct[i:i + BULK_CHUNK_SIZE]
+        existing = list(_existing_slugs(queryset, chunk))
+        for base in chunk:
+            taken[base] = _taken_suffixes(base, existing)
+
+    slugs, used = [], set()
+    for base in bases:
+        while True:
+            slug = _next_slug(base, taken[base])
+            taken[base].add(int(slug.rsplit('-', 1)[1]) if slug != base else 0)
+            if slug not in used:
+                break
+        used.add(slug)
+        slugs.append(slug)
+    return slugs
@@ -0,0 +1,66 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from blogs.images import available_variants
+from blogs.page_cache import hold_fragment
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_query(context, **kwargs):
+    """Current query string with the given parameters replaced
+
+    Passing None drops a parameter, e.g. {% page_query cursor=token page=None %}.
+    """
+    query = context['request'].GET.copy()
+    for key, value in kwargs.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return '?' + query.urlencode()
+
+
+@register.simple_tag(takes_context=True)
+def user_fragment(context, template_name, **kwargs):
+    """Render the part of a page that differs per visitor
+
+    The template sees the current context plus the keyword arguments, e.g.
+    {% user_fragment 'blogs/blog_actions.html' slug=blog.slug %}. In a page
+    stored by the page cache only the keyword arguments and the view's
+    fragment_context are available on later hits, so the template must not
+    read anything else from the page.
+    """
+    with context.push(**kwargs):
+        html = context.template.engine.get_template(template_name).render(context)
+    placeholder = hold_fragment(context.get('request'), template_name, kwargs, html)
+    return html if placeholder is None else mark_safe(placeholder)
+
+
+def _srcset(variants):
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in variants)
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', **attrs):
+    """<picture> with WebP and JPEG/PNG srcsets for an ImageField file
+
+    Extra keyword arguments become <img> attributes, e.g.
+    {% responsive_image blog.image sizes="33vw" alt=blog.title class="card-img-top" %}.
+    Until the image has variants a plain <img> of the original is rendered.
+    """
+    variants = available_variants(image.name)
+    fallback = variants.get('jpeg') or variants.get('png')
+    if not fallback:
+        return format_html('<img{}>', flatatt({'src': image.url, **attrs}))
+    img = format_html('<img{}>', flatatt({'src': image.url, 'srcset': _srcset(fallback), 'sizes': sizes, **attrs}))
+    if 'webp' not in variants:
+        return img
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">{}</picture>',
+        _srcset(variants['webp']), sizes, img,
+    )
@@ -0,0 +1,357 @@
+"""
+Streaming blog import and export (manage.py import_blogs / export_blogs).
+
+A record is a flat dict with the keys in FIELDS: author is a username and
+category a category slug, the *_email and *_name keys only being used to
+create missing authors and categories. JSONL holds one object per line, CSV
+has a header row, and either may be gzip-compressed ('.gz'). Both directions
+hold one batch in memory: export reads with iterator(chunk_size=...), and
+import bulk_creates each batch in its own transaction after resolving its
+authors, categories and slugs with a few set-based queries.
+
+After each committed batch the importer saves a checkpoint with the number of
+records consumed, so a resumed import skips straight past them. Records whose
+slug is already taken are skipped (or given a fresh slug with
+on_conflict='rename'), so replaying a batch of exported records, which all
+carry their slugs, is harmless too.
+
+bulk_create bypasses the Blog signals, so each batch also adds its blogs to
+the search index and expires the cached listing, author and category pages.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from users.models import CustomUser, Profile
+from .models import Blog, Category
+from .page_cache import invalidate_tags
+from .search import get_search_backend
+from .slugs import RESERVED_SLUGS, SLUG_MAX_LENGTH, allocate_slugs
+
+FIELDS = (
+    'slug', 'title', 'body', 'author', 'author_email', 'category', 'category_name', 'image', 'created_at', 'views',
+)
+FORMATS = ('jsonl', 'csv')
+# Failed records listed in the import report; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+class RecordError(ValueError):
+    pass
+
+
+def detect_format(path, fmt=None):
+    """`fmt`, or the format named by the file extension (ignoring .gz)"""
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith('.gz') else path
+    extension = os.path.splitext(name)[1].lstrip('.').lower()
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    if path == '-':
+        return 'jsonl'
+    raise ValueError(f'Cannot tell the format of {path}, pass jsonl or csv explicitly')
+
+
+@contextmanager
+def open_text(path, mode):
+    """Text handle for a path, '-' (stdin/stdout) or a .gz file"""
+    if path == '-':
+        handle = io.TextIOWrapper((sys.stdin if mode == 'r' else sys.stdout).buffer, encoding='utf-8', newline='')
+        try:
+            yield handle
+        finally:
+            handle.flush()
+            # Leave the process's stream open
+            handle.detach()
+        return
+    if path.endswith('.gz'):
+        handle = gzip.open(path, f'{mode}t', encoding='utf-8', newline='')
+    else:
+        handle = open(path, mode, encoding='utf-8', newline='')
+    with handle:
+        yield handle
+
+
+def read_records(handle, fmt):
+    """Yield (record number, raw record) pairs; raw records are checked by BlogImporter.clean"""
+    if fmt == 'csv':
+        csv.field_size_limit(sys.maxsize)
+        yield from enumerate(csv.DictReader(handle), 1)
+        return
+    number = 0
+    for line in handle:
+        if line.strip():
+            number += 1
+            yield number, line
+
+
+def export_blogs(handle, fmt, queryset=None, chunk_size=2000, progress=None):
+    """Write every blog of `queryset` to `handle` in primary key order, returning the count"""
+    queryset = Blog.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('pk').values_list(
+        'slug', 'title', 'body', 'author__username', 'author__email', 'category__slug', 'category__name',
+        'image', 'created_at', 'views',
+    ).iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        writer = csv.DictWriter(handle, FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(record):
+            handle.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    count = 0
+    for row in rows:
+        record = dict(zip(FIELDS, row))
+        record['created_at'] = record['created_at'].isoformat()
+        record['image'] = record['image'] or ''
+        write(record)
+        count += 1
+        if progress and count % chunk_size == 0:
+            progress(count)
+    return count
+
+
+class Checkpoint:
+    """Progress of an import, saved after every committed batch
+
+    The source file's path and size are stored with it so a checkpoint is
+    never applied to a different file.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.fingerprint = None if source == '-' else {'source': os.path.abspath(source), 'size': os.path.getsize(source)}
+
+    def load(self):
+        """Saved counters, or None when there is nothing to resume"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as fh:
+            state = json.load(fh)
+        if state.get('fingerprint') != self.fingerprint:
+            raise ValueError(f'{self.path} was written for another input file')
+        return state['stats']
+
+    def save(self, stats):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as fh:
+            json.dump({'fingerprint': self.fingerprint, 'stats': stats, 'saved_at': timezone.now().isoformat()}, fh)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class BlogImporter:
+    """Batched, resumable blog import
+
+    `on_conflict` is 'skip' or 'rename' for records whose slug is taken.
+    Unknown authors and categories fail their records unless
+    `create_authors` / `create_categories` is set.
+    """
+
+    def __init__(self, batch_size=2000, on_conflict='skip', create_authors=False, create_categories=False,
+                 progress=None, progress_interval=5):
+        self.batch_size = batch_size
+        self.on_conflict = on_conflict
+        self.create_authors = create_authors
+        self.create_categories = create_categories
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.stats = {'consumed': 0, 'imported': 0, 'skipped': 0, 'failed': 0}
+        self.errors = []
+        self.categories = dict(Category.objects.values_list('slug', 'pk'))
+        self.search = get_search_backend()
+        self.now = timezone.now()
+
+    def fail(self, number, error):
+        self.stats['failed'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, str(error)))
+
+    def clean(self, raw, fmt):
+        """Validated record dict for a raw record, raising RecordError if it is unusable"""
+        if fmt == 'jsonl':
+            try:
+                raw = json.loads(raw)
+            except ValueError as e:
+                raise RecordError(f'invalid JSON: {e}')
+            if not isinstance(raw, dict):
+                raise RecordError('not a JSON object')
+        record = {field: raw.get(field) for field in FIELDS}
+        for field in FIELDS:
+            value = record[field]
+            # Bodies are kept byte for byte
+            if isinstance(value, str) and field != 'body':
+                record[field] = value.strip()
+        if not record['title'] or len(record['title']) > 200:
+            raise RecordError('title must be 1-200 characters')
+        if not record['body']:
+            raise RecordError('body is required')
+        if not record['author']:
+            raise RecordError('author is required')
+        if record['slug']:
+            try:
+                validate_slug(record['slug'])
+            except ValidationError:
+                raise RecordError(f'invalid slug {record["slug"]!r}')
+            if len(record['slug']) > SLUG_MAX_LENGTH:
+                raise RecordError('slug too long')
+        if record['image'] and len(record['image']) > 100:
+            raise RecordError('image path too long')
+        if record['created_at']:
+            created_at = parse_datetime(str(record['created_at']))
+            if created_at is None:
+                raise RecordError(f'invalid created_at {record["created_at"]!r}')
+            record['created_at'] = timezone.make_aware(created_at) if timezone.is_naive(created_at) else created_at
+        else:
+            record['created_at'] = self.now
+        try:
+            record['views'] = int(record['views'] or 0)
+        except (TypeError, ValueError):
+            raise RecordError(f'invalid views {record["views"]!r}')
+        if record['views'] < 0:
+            raise RecordError('views must not be negative')
+        return record
+
+    def resolve_authors(self, records):
+        """{username: id} for the batch, creating missing authors if allowed"""
+        usernames = {record['author'] for record in records}
+        authors = dict(CustomUser.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        missing = usernames - authors.keys()
+        if missing and self.create_authors:
+            emails = {record['author']: record['author_email'] for record in records if record['author'] in missing}
+            taken = set(CustomUser.objects.filter(email__in=[email for email in emails.values() if email])
+                        .values_list('email', flat=True))
+            users = CustomUser.objects.bulk_create(
+                CustomUser(
+                    username=username,
+                    email=emails[username] if emails[username] and emails[username] not in taken
+                    else f'{username}@imported.invalid',
+                    password=make_password(None),
+                    role='author',
+                )
+                for username in sorted(missing)
+            )
+            Profile.objects.bulk_create(Profile(user_id=user.pk) for user in users)
+            authors.update((user.username, user.pk) for user in users)
+        return authors
+
+    def resolve_category(self, record):
+        slug = record['category']
+        if slug not in self.categories and self.create_categories:
+            name = record['category_name'] or slug.replace('-', ' ').title()
+            # Names are unique too, so reuse a category that already has this one
+            category = Category.objects.filter(Q(slug=slugify(slug)) | Q(name=name)).first()
+            if category is None:
+                category = Category.objects.create(name=name, slug=slugify(slug))
+            self.categories[slug] = category.pk
+        return self.categories.get(slug)
+
+    def import_batch(self, batch, fmt):
+        """Import one batch of (number, raw record) in a single transaction"""
+        records = []
+        for number, raw in batch:
+            try:
+                records.append((number, self.clean(raw, fmt)))
+            except RecordError as e:
+                self.fail(number, e)
+
+        with transaction.atomic():
+            authors = self.resolve_authors([record for _, record in records])
+            given = {record['slug'] for _, record in records if record['slug']}
+            taken = set(Blog.objects.filter(slug__in=given).values_list('slug', flat=True)) | RESERVED_SLUGS
+            keep, allocate = [], []
+            for number, record in records:
+                author_id = authors.get(record['author'])
+                category_id = self.resolve_category(record) if record['category'] else None
+                if author_id is None:
+                    self.fail(number, f'unknown author {record["author"]!r}')
+                    continue
+                if record['category'] and category_id is None:
+                    self.fail(number, f'unknown category {record["category"]!r}')
+                    continue
+                blog = Blog(
+                    title=record['title'],
+                    slug=record['slug'] or '',
+                    body=record['body'],
+                    excerpt=Blog.make_excerpt(record['body']),
+                    author_id=author_id,
+                    category_id=category_id,
+                    image=record['image'] or None,
+                    created_at=record['created_at'],
+                    views=record['views'],
+                )
+                if not blog.slug:
+                    allocate.append(blog)
+                elif blog.slug not in taken:
+                    taken.add(blog.slug)
+                    keep.append(blog)
+                elif self.on_conflict == 'rename':
+                    allocate.append(blog)
+                else:
+                    self.stats['skipped'] += 1
+
+            created = Blog.objects.bulk_create(keep, batch_size=self.batch_size)
+            # Allocated after the given slugs are inserted, so they never clash
+            for blog, slug in zip(allocate, allocate_slugs(Blog.objects.all(), [blog.title for blog in allocate])):
+                blog.slug = slug
+            created += Blog.objects.bulk_create(allocate, batch_size=self.batch_size)
+            self.search.index_many([blog.pk for blog in created])
+
+        self.stats['imported'] += len(created)
+        self.stats['consumed'] += len(batch)
+        tags = {'listing'} | {f'author:{blog.author_id}' for blog in created}
+        tags |= {f'category:{blog.category_id}' for blog in created if blog.category_id}
+        invalidate_tags(*tags)
+
+    def run(self, path, fmt, checkpoint=None):
+        """Import the file at `path`, resuming from `checkpoint` if it has saved progress"""
+        resumed = checkpoint.load() if checkpoint else None
+        if resumed:
+            self.stats.update(resumed)
+        started = last_report = time.perf_counter()
+        start_count = self.stats['consumed']
+        with open_text(path, 'r') as handle:
+            records = read_records(handle, fmt)
+            # Skip what a previous run committed
+            for _ in range(start_count):
+                if next(records, None) is None:
+                    break
+            batch = []
+            for item in records:
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+                self.import_batch(batch, fmt)
+                batch = []
+                if checkpoint:
+                    checkpoint.save(self.stats)
+                if self.progress and time.perf_counter() - last_report >= self.progress_interval:
+                    last_report = time.perf_counter()
+                    self.progress(self.stats, (self.stats['consumed'] - start_count) / (last_report - started))
+            if batch:
+                self.import_batch(batch, fmt)
+        if checkpoint:
+            checkpoint.clear()
+        elapsed = time.perf_counter() - started
+        return elapsed, (self.stats['consumed'] - start_count) / elapsed if elapsed else 0.0
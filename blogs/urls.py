@@ -1,16 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Public read views, async under ASGI when BLOG_ASYNC_VIEWS is on
+read_views = async_views if getattr(settings, 'BLOG_ASYNC_VIEWS', False) else views
 
 urlpatterns = [
-    path('', views.blog_home, name='blog-home'),
-    path('blog/<slug:slug>/', views.blog_detail, name='blog-detail'),
+    path('', read_views.blog_home, name='blog-home'),
+    # Before blog/<slug:slug>/, which would otherwise take 'create' as a slug
     path('blog/create/', views.blog_create, name='blog-create'),
+    path('blog/<slug:slug>/', read_views.blog_detail, name='blog-detail'),
+    path('blog/<slug:slug>/ratings/', views.blog_ratings, name='blog-ratings'),
     path('blog/<slug:slug>/edit/', views.blog_update, name='blog-update'),
     path('blog/<slug:slug>/delete/', views.blog_delete, name='blog-delete'),
     path('blog/<slug:slug>/rate/', views.rate_blog, name='rate-blog'),
     path('blog/<slug:slug>/favorite/', views.add_to_favorites, name='add-favorite'),
     path('blog/<slug:slug>/unfavorite/', views.remove_from_favorites, name='remove-favorite'),
     path('favorites/', views.my_favorites, name='my-favorites'),
-    path('category/<slug:slug>/', views.blogs_by_category, name='blog-category'),
-    path('author/<str:username>/', views.author_blogs, name='author-blogs'),
+    path('category/<slug:slug>/', read_views.blogs_by_category, name='blog-category'),
+    path('author/<str:username>/', read_views.author_blogs, name='author-blogs'),
 ]
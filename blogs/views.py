@@ -1,97 +1,198 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, JsonResponse
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.mail import send_mail
-from django.conf import settings
-from django.db.models import Q, Avg
-from django.core.paginator import Paginator
-from .models import Blog, Category, Rating, Favorite
+from django.db import transaction
+from django.db.models import BooleanField, Exists, IntegerField, OuterRef, Prefetch, Subquery, TextField, Value
+from .models import Blog, Category, Rating, Favorite, RankingEntry
 from .forms import BlogForm, RatingForm, BlogSearchForm
+from .counters import record_view, count_view
+from .page_cache import cache_shared_page, add_cache_tags
+from .conditional import conditional_page, blog_validators, category_validators, author_validators
+from .search import search_blogs, get_search_backend
+from .rankings import list_state, ranked_blogs
+from .pagination import CursorPaginator, paginate
+from .digests import notify_favorite
 from users.models import CustomUser
 
 
-def blog_home(request):
-    """Home page with list of all blogs with search, filtering, sorting, and pagination"""
-    
-    blogs = Blog.objects.all()
-    form = BlogSearchForm(request.GET)
+# Listing orderings per BlogSearchForm.sort_by, each ending in a unique key
+SORT_ORDERINGS = {
+    'date': ('-created_at', '-id'),
+    '-date': ('created_at', 'id'),
+    'rating': ('-rating_score', '-id'),
+    '-rating': ('rating_score', 'id'),
+    'views': ('-views', '-id'),
+    'trending': ('-trending_score', '-id'),
+    'favorited': ('-favorite_count', '-id'),
+}
+
+# Sorts whose first pages come from the precomputed rankings (blogs.rankings)
+# unless a search or author filter narrows the listing, or the ranking is
+# still empty; later pages continue with the SORT_ORDERINGS column sort
+RANKED_SORTS = {
+    'rating': RankingEntry.Kind.TOP_RATED,
+    'trending': RankingEntry.Kind.TRENDING,
+    'favorited': RankingEntry.Kind.MOST_FAVORITED,
+}
+
+# Ratings per page on the blog detail page and the blog-ratings endpoint
+RATINGS_PER_PAGE = 20
+RATINGS_ORDERING = ('-created_at', '-id')
+
+
+def home_listing(params):
+    """(blogs, ordering, prefix) for the home page's search, filter and sort parameters
+
+    Shared by the sync and async blog_home. It may query the search backend
+    and the rankings, so async callers run it in a thread. An ordering of
+    None means the queryset is already ordered and is paged by number.
+    `prefix` is the (ranked blogs, their ids) pair serving the first pages
+    of a ranked sort, or None.
+    """
+    blogs = Blog.objects.select_related('author', 'category').defer('body')
     
     # Search
-    search_query = request.GET.get('search')
+    search_query = params.get('search')
     if search_query:
-        blogs = blogs.filter(Q(title__icontains=search_query) | Q(body__icontains=search_query))
+        blogs = search_blogs(blogs, search_query)
     
     # Filter by category
-    category = request.GET.get('category')
+    category = params.get('category')
     if category:
         blogs = blogs.filter(category_id=category)
     
     # Filter by author
-    author = request.GET.get('author')
+    author = params.get('author')
     if author:
         blogs = blogs.filter(author__username__icontains=author)
     
-    # Sorting
-    sort_by = request.GET.get('sort_by', 'date')
-    if sort_by == 'date':
-        blogs = blogs.order_by('-created_at')
-    elif sort_by == '-date':
-        blogs = blogs.order_by('created_at')
-    elif sort_by in ['rating', '-rating']:
-        blogs = blogs.annotate(avg_rating=Avg('ratings__rating'))
-        if sort_by == 'rating':
-            blogs = blogs.order_by('-avg_rating')
-        else:
-            blogs = blogs.order_by('avg_rating')
-    elif sort_by == 'views':
-        blogs = blogs.order_by('-views')
+    # Sorting (ranked search results keep their relevance order under the default sort)
+    sort_by = params.get('sort_by', 'date')
+    if sort_by in RANKED_SORTS and not search_query and not author:
+        kind = RANKED_SORTS[sort_by]
+        ranked = ranked_blogs(blogs, kind, category or None)
+        if ranked is not None:
+            ranked_ids, _ = list_state(kind, category or None)
+            return blogs, SORT_ORDERINGS[sort_by], (ranked, ranked_ids)
+    if search_query and sort_by == 'date' and get_search_backend().ranked:
+        return blogs.order_by('-search_rank', '-created_at'), None, None
+    return blogs, SORT_ORDERINGS.get(sort_by, SORT_ORDERINGS['date']), None
+
+
+@cache_shared_page()
+def blog_home(request):
+    """Home page with list of all blogs with search, filtering, sorting, and pagination"""
+    
+    add_cache_tags(request, 'listing')
+    blogs, ordering, prefix = home_listing(request.GET)
     
     # Pagination
-    paginator = Paginator(blogs, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, blogs, ordering, prefix=prefix)
     
     context = {
         'blogs': page_obj,
-        'form': form,
+        'form': BlogSearchForm(request.GET),
         'categories': Category.objects.all(),
     }
     
     return render(request, 'blogs/home.html', context)
 
 
+def count_cached_view(request, meta):
+    count_view(meta['blog_id'])
+
+
+def ratings_paginator(blog):
+    return CursorPaginator(blog.ratings.select_related('user'), RATINGS_PER_PAGE, RATINGS_ORDERING)
+
+
+def visitor_annotations(user):
+    """Blog annotations with the visitor's rating and favorite flag"""
+    if not user.is_authenticated:
+        return {
+            'user_rating_value': Value(None, output_field=IntegerField()),
+            'user_review': Value('', output_field=TextField()),
+            'is_favorited': Value(False, output_field=BooleanField()),
+        }
+    own_rating = Rating.objects.filter(blog=OuterRef('pk'), user=user)
+    return {
+        'user_rating_value': Subquery(own_rating.values('rating')[:1]),
+        'user_review': Subquery(own_rating.values('review')[:1]),
+        'is_favorited': Exists(Favorite.objects.filter(blog=OuterRef('pk'), user=user)),
+    }
+
+
+def visitor_context(blog, user):
+    """Template context for a blog carrying visitor_annotations"""
+    user_rating = None
+    if blog.user_rating_value is not None:
+        user_rating = Rating(blog=blog, user=user, rating=blog.user_rating_value, review=blog.user_review)
+    return {'user_rating': user_rating, 'is_favorited': blog.is_favorited}
+
+
+def detail_queryset(user):
+    """Blogs with everything blog_detail renders, fetched in one query
+
+    Author, profile and category are joined, the visitor's rating and
+    favorite flag are annotated, and the first page of ratings (plus one row
+    to tell whether there are more) is prefetched with their users.
+    """
+    blogs = Blog.objects.select_related('author__profile', 'category').prefetch_related(
+        Prefetch(
+            'ratings',
+            queryset=Rating.objects.select_related('user').order_by(*RATINGS_ORDERING)[:RATINGS_PER_PAGE + 1],
+            to_attr='recent_ratings',
+        )
+    )
+    return blogs.annotate(**visitor_annotations(user))
+
+
+def detail_context(blog, user):
+    """Template context for a blog fetched through detail_queryset"""
+    return {
+        'blog': blog,
+        'ratings': ratings_paginator(blog).first_page(blog.recent_ratings),
+        'average_rating': round(blog.rating_avg, 2),
+        'rating_count': blog.rating_count,
+        **visitor_context(blog, user),
+    }
+
+
+def detail_fragment_context(request, meta):
+    """Favorite and rating state for the user fragments of a cached blog_detail page, in one query"""
+    blog = Blog.objects.only('pk').annotate(**visitor_annotations(request.user)).get(pk=meta['blog_id'])
+    return visitor_context(blog, request.user)
+
+
+@conditional_page(blog_validators)
+@cache_shared_page(on_hit=count_cached_view, fragment_context=detail_fragment_context)
 def blog_detail(request, slug):
     """Display individual blog post with ratings"""
     
-    blog = get_object_or_404(Blog, slug=slug)
+    blog = get_object_or_404(detail_queryset(request.user), slug=slug)
+    add_cache_tags(request, f'blog:{blog.pk}', f'author:{blog.author_id}', f'category:{blog.category_id}')
+    request.page_cache_meta = {'blog_id': blog.pk}
     
     # Increment view count
-    blog.views += 1
-    blog.save(update_fields=['views'])
+    record_view(blog)
     
-    # Ratings
-    ratings = blog.ratings.all().order_by('-created_at')
-    user_rating = None
-    is_favorited = False
-    
-    if request.user.is_authenticated:
-        user_rating = Rating.objects.filter(blog=blog, user=request.user).first()
-        is_favorited = Favorite.objects.filter(blog=blog, user=request.user).exists()
-    
-    # Average rating
-    average_rating = blog.ratings.aggregate(avg=Avg('rating'))['avg'] or 0
-    rating_count = blog.ratings.count()
+    return render(request, 'blogs/blog_detail.html', detail_context(blog, request.user))
+
+
+@cache_shared_page()
+def blog_ratings(request, slug):
+    """Return one page of a blog's ratings as an HTML fragment, or as JSON with ?format=json"""
     
-    context = {
-        'blog': blog,
-        'ratings': ratings,
-        'user_rating': user_rating,
-        'is_favorited': is_favorited,
-        'average_rating': round(average_rating, 2),
-        'rating_count': rating_count,
-    }
+    blog = get_object_or_404(Blog, slug=slug)
+    add_cache_tags(request, f'blog:{blog.pk}')
+    page = ratings_paginator(blog).get_page(request.GET.get('cursor'))
+    html = render_to_string('blogs/rating_list.html', {'ratings': page, 'next_cursor': page.next_cursor}, request)
     
-    return render(request, 'blogs/blog_detail.html', context)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'html': html, 'next_cursor': page.next_cursor})
+    return HttpResponse(html)
 
 
 @login_required
@@ -122,7 +223,7 @@ def blog_update(request, slug):
     
     blog = get_object_or_404(Blog, slug=slug)
     
-    if blog.author != request.user and request.user.role != 'admin':
+    if blog.author_id != request.user.id and request.user.role != 'admin':
         messages.error(request, 'You can only edit your own blog posts.')
         return redirect('blog-detail', slug=blog.slug)
     
@@ -144,7 +245,7 @@ def blog_delete(request, slug):
     
     blog = get_object_or_404(Blog, slug=slug)
     
-    if blog.author != request.user and request.user.role != 'admin':
+    if blog.author_id != request.user.id and request.user.role != 'admin':
         messages.error(request, 'You can only delete your own blog posts.')
         return redirect('blog-detail', slug=blog.slug)
     
@@ -160,23 +261,25 @@ def blog_delete(request, slug):
 def rate_blog(request, slug):
     """Rate a blog post"""
     
-    blog = get_object_or_404(Blog, slug=slug)
+    blog = get_object_or_404(Blog.objects.select_related('author'), slug=slug)
     
     if request.method == 'POST':
         form = RatingForm(request.POST)
         if form.is_valid():
-            existing_rating = Rating.objects.filter(blog=blog, user=request.user).first()
-            if existing_rating:
-                existing_rating.rating = form.cleaned_data['rating']
-                existing_rating.review = form.cleaned_data['review']
-                existing_rating.save()
-                messages.success(request, 'Your rating has been updated!')
-            else:
-                rating = form.save(commit=False)
-                rating.blog = blog
-                rating.user = request.user
-                rating.save()
-                messages.success(request, 'Thank you for rating this blog!')
+            # Rating row and blog aggregates are written together
+            with transaction.atomic():
+                existing_rating = Rating.objects.select_for_update().filter(blog=blog, user=request.user).first()
+                if existing_rating:
+                    existing_rating.rating = form.cleaned_data['rating']
+                    existing_rating.review = form.cleaned_data['review']
+                    existing_rating.save()
+                    messages.success(request, 'Your rating has been updated!')
+                else:
+                    rating = form.save(commit=False)
+                    rating.blog = blog
+                    rating.user = request.user
+                    rating.save()
+                    messages.success(request, 'Thank you for rating this blog!')
             return redirect('blog-detail', slug=blog.slug)
     else:
         existing_rating = Rating.objects.filter(blog=blog, user=request.user).first()
@@ -193,13 +296,8 @@ def add_to_favorites(request, slug):
     favorite, created = Favorite.objects.get_or_create(user=request.user, blog=blog)
     
     if created:
-        # Send email to the user who favorited (correct assignment requirement)
-        subject = 'Blog added to favorites'
-        message = f'You added "{blog.title}" to your favorites!'
-        try:
-            send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [request.user.email], fail_silently=True)
-        except:
-            pass
+        # Email the user who favorited, immediately or in their next digest
+        notify_favorite(favorite)
         
         messages.success(request, 'Blog added to your favorites!')
     else:
@@ -228,33 +326,33 @@ def remove_from_favorites(request, slug):
 def my_favorites(request):
     """Display user's favorite blogs"""
     
-    favorites = Favorite.objects.filter(user=request.user).select_related('blog')
-    paginator = Paginator(favorites, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    favorites = Favorite.objects.filter(user=request.user).select_related('blog__author', 'blog__category').defer('blog__body')
+    page_obj = paginate(request, favorites, ('-created_at', '-id'))
     
     return render(request, 'blogs/favorites.html', {'favorites': page_obj})
 
 
+@conditional_page(category_validators)
+@cache_shared_page()
 def blogs_by_category(request, slug):
     """Display blogs filtered by category"""
     
     category = get_object_or_404(Category, slug=slug)
-    blogs = Blog.objects.filter(category=category).order_by('-created_at')
-    paginator = Paginator(blogs, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    add_cache_tags(request, f'category:{category.pk}')
+    blogs = Blog.objects.filter(category=category).select_related('author', 'category').defer('body')
+    page_obj = paginate(request, blogs, SORT_ORDERINGS['date'])
     
     return render(request, 'blogs/category_blogs.html', {'category': category, 'blogs': page_obj})
 
 
+@conditional_page(author_validators)
+@cache_shared_page()
 def author_blogs(request, username):
     """Display all blogs by a specific author"""
     
-    author = get_object_or_404(CustomUser, username=username)
-    blogs = Blog.objects.filter(author=author).order_by('-created_at')
-    paginator = Paginator(blogs, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(CustomUser.objects.select_related('profile'), username=username)
+    add_cache_tags(request, f'author:{author.pk}')
+    blogs = Blog.objects.filter(author=author).select_related('author', 'category').defer('body')
+    page_obj = paginate(request, blogs, SORT_ORDERINGS['date'])
     
     return render(request, 'blogs/author_blogs.html', {'author': author, 'blogs': page_obj})
@@ -0,0 +1,19 @@
+from django.contrib import admin
+from .models import OutboundEmail
+
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    """Admin for OutboundEmail model"""
+    
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'to', 'last_error']
+    readonly_fields = ['created_at', 'sent_at', 'claimed_by', 'claimed_at', 'last_error']
+    actions = ['requeue']
+    
+    @admin.action(description='Requeue selected emails')
+    def requeue(self, request, queryset):
+        queryset.update(status=OutboundEmail.PENDING, attempts=0, claimed_by='')
+
+
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from mailer.queue import send_batch
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbound email in batches over one SMTP connection per batch'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls in --loop mode')
+    
+    def handle(self, *args, **options):
+        while True:
+            sent, retried, dead = send_batch(options['batch_size'])
+            if sent or retried or dead:
+                self.stdout.write(f'sent={sent} retried={retried} dead={dead}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,47 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboundEmail(models.Model):
+    """Email waiting to be sent by the send_queued_mail worker"""
+    
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead letter'),
+    )
+    
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.TextField(help_text='Comma-separated recipient addresses')
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f'{self.subject} -> {self.to} ({self.status})'
+    
+    @property
+    def recipients(self):
+        return [address for address in self.to.split(',') if address]
+    
+    class Meta:
+        ordering = ['next_attempt_at']
+        verbose_name = 'Outbound email'
+        verbose_name_plural = 'Outbound emails'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_status_due_idx'),
+        ]
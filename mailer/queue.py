@@ -0,0 +1,112 @@
+"""
+Database-backed outbound mail queue.
+
+Views call enqueue_mail() instead of send_mail() and return immediately;
+the send_queued_mail command drains the queue in batches over a single
+reused connection, retrying failures with exponential backoff and moving
+messages that keep failing to the dead-letter status.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+def enqueue_mail(subject, message, from_email, recipient_list):
+    """Queue an email with the same arguments as django.core.mail.send_mail"""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=','.join(recipient_list),
+    )
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts`: base * 2^(attempts - 1), capped"""
+    base = getattr(settings, 'MAIL_QUEUE_RETRY_BASE_SECONDS', 60)
+    cap = getattr(settings, 'MAIL_QUEUE_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def claim_batch(batch_size):
+    """Atomically claim up to batch_size due messages for this worker
+
+    The conditional UPDATE makes concurrent workers skip each other's rows;
+    claims older than MAIL_QUEUE_CLAIM_TIMEOUT seconds (a crashed worker)
+    are picked up again.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'MAIL_QUEUE_CLAIM_TIMEOUT', 600))
+    OutboundEmail.objects.filter(status=OutboundEmail.SENDING, claimed_at__lt=stale).update(
+        status=OutboundEmail.PENDING, claimed_by=''
+    )
+
+    token = uuid.uuid4().hex
+    due_ids = list(
+        OutboundEmail.objects.filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+        .order_by('next_attempt_at')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    OutboundEmail.objects.filter(id__in=due_ids, status=OutboundEmail.PENDING).update(
+        status=OutboundEmail.SENDING, claimed_by=token, claimed_at=now
+    )
+    return list(OutboundEmail.objects.filter(claimed_by=token, status=OutboundEmail.SENDING))
+
+
+def send_batch(batch_size=None, connection=None):
+    """Send one batch of due messages; returns (sent, retried, dead)"""
+    batch_size = batch_size or getattr(settings, 'MAIL_QUEUE_BATCH_SIZE', 50)
+    max_attempts = getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 5)
+    messages = claim_batch(batch_size)
+    if not messages:
+        return 0, 0, 0
+
+    sent = retried = dead = 0
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Nothing could be sent, release the whole batch for a later retry
+        for message in messages:
+            retried, dead = _record_failure(message, e, max_attempts, retried, dead)
+        return sent, retried, dead
+
+    try:
+        for message in messages:
+            email = EmailMessage(
+                message.subject, message.body, message.from_email, message.recipients, connection=connection
+            )
+            try:
+                email.send(fail_silently=False)
+            except Exception as e:
+                retried, dead = _record_failure(message, e, max_attempts, retried, dead)
+                continue
+            message.status = OutboundEmail.SENT
+            message.sent_at = timezone.now()
+            message.attempts += 1
+            message.claimed_by = ''
+            message.save(update_fields=['status', 'sent_at', 'attempts', 'claimed_by'])
+            sent += 1
+    finally:
+        connection.close()
+    return sent, retried, dead
+
+
+def _record_failure(message, error, max_attempts, retried, dead):
+    message.attempts += 1
+    message.last_error = f'{type(error).__name__}: {error}'
+    message.claimed_by = ''
+    if message.attempts >= max_attempts:
+        message.status = OutboundEmail.DEAD
+        dead += 1
+    else:
+        message.status = OutboundEmail.PENDING
+        message.next_attempt_at = timezone.now() + backoff(message.attempts)
+        retried += 1
+    message.save(update_fields=['attempts', 'last_error', 'claimed_by', 'status', 'next_attempt_at'])
+    return retried, dead
@@ -0,0 +1,86 @@
+import smtplib
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import OutboundEmail
+from .queue import backoff, claim_batch, enqueue_mail, send_batch
+
+
+class FailingConnection(BaseEmailBackend):
+    """Email backend whose open() or send_messages() raises"""
+
+    def __init__(self, fail_open=False, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_open = fail_open
+
+    def open(self):
+        if self.fail_open:
+            raise ConnectionRefusedError('smtp server down')
+
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPRecipientsRefused({'reader@example.com': (550, b'mailbox unavailable')})
+
+
+def queue(count=1):
+    return [enqueue_mail(f'Subject {i}', 'Body', 'site@example.com', [f'reader{i}@example.com']) for i in range(count)]
+
+
+@override_settings(MAIL_QUEUE_RETRY_BASE_SECONDS=60, MAIL_QUEUE_RETRY_MAX_SECONDS=3600, MAIL_QUEUE_MAX_ATTEMPTS=3)
+class MailQueueTests(TestCase):
+
+    def test_send_batch_delivers_due_messages(self):
+        queue(3)
+        self.assertEqual(send_batch(batch_size=10), (3, 0, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['reader0@example.com'])
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.SENT).exists())
+        self.assertEqual(send_batch(batch_size=10), (0, 0, 0))
+
+    def test_claim_batch_skips_claimed_and_future_messages(self):
+        queue(3)
+        OutboundEmail.objects.filter(subject='Subject 2').update(next_attempt_at=timezone.now() + timedelta(hours=1))
+        first = claim_batch(1)
+        second = claim_batch(5)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first[0].pk, second[0].pk)
+        self.assertEqual(claim_batch(5), [])
+        self.assertNotEqual(first[0].claimed_by, second[0].claimed_by)
+
+    @override_settings(MAIL_QUEUE_CLAIM_TIMEOUT=600)
+    def test_stale_claims_are_released(self):
+        message, = queue()
+        claim_batch(1)
+        OutboundEmail.objects.filter(pk=message.pk).update(claimed_at=timezone.now() - timedelta(seconds=601))
+        self.assertEqual([claimed.pk for claimed in claim_batch(1)], [message.pk])
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertEqual([backoff(n).total_seconds() for n in (1, 2, 3, 7, 8)], [60, 120, 240, 3600, 3600])
+
+    def test_failed_connection_releases_the_batch_for_retry(self):
+        queue(2)
+        before = timezone.now()
+        self.assertEqual(send_batch(connection=FailingConnection(fail_open=True)), (0, 2, 0))
+        for message in OutboundEmail.objects.all():
+            self.assertEqual((message.status, message.attempts, message.claimed_by), (OutboundEmail.PENDING, 1, ''))
+            self.assertIn('ConnectionRefusedError', message.last_error)
+            self.assertGreaterEqual(message.next_attempt_at, before + timedelta(seconds=60))
+        # Not due again until the backoff has passed
+        self.assertEqual(send_batch(), (0, 0, 0))
+
+    def test_failing_message_backs_off_then_goes_dead(self):
+        message, = queue()
+        for attempt, expected in ((1, (0, 1, 0)), (2, (0, 1, 0)), (3, (0, 0, 1))):
+            OutboundEmail.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(send_batch(connection=FailingConnection()), expected)
+            message.refresh_from_db()
+            self.assertEqual(message.attempts, attempt)
+        self.assertEqual(message.status, OutboundEmail.DEAD)
+        self.assertIn('SMTPRecipientsRefused', message.last_error)
+        OutboundEmail.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(send_batch(), (0, 0, 0))
+        self.assertEqual(mail.outbox, [])
@@ -0,0 +1,18 @@
+// "Load more reviews" on the blog detail page: appends pages from the blog-ratings endpoint
+document.getElementById('load-more-ratings')?.addEventListener('click', function () {
+    const button = this;
+    button.disabled = true;
+    const url = button.dataset.url + '?format=json&cursor=' + encodeURIComponent(button.dataset.cursor);
+    fetch(url, {headers: {'Accept': 'application/json'}})
+        .then(response => response.json())
+        .then(data => {
+            document.getElementById('rating-list').insertAdjacentHTML('beforeend', data.html);
+            if (data.next_cursor) {
+                button.dataset.cursor = data.next_cursor;
+                button.disabled = false;
+            } else {
+                button.remove();
+            }
+        })
+        .catch(() => { button.disabled = false; });
+});
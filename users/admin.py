@@ -20,10 +20,10 @@ class CustomUserAdmin(UserAdmin):
 class ProfileAdmin(admin.ModelAdmin):
     """Admin for Profile model"""
     
-    list_display = ['user', 'created_at', 'updated_at']
-    list_filter = ['created_at', 'updated_at']
+    list_display = ['user', 'favorite_notifications', 'last_digest_sent_at', 'created_at', 'updated_at']
+    list_filter = ['favorite_notifications', 'created_at', 'updated_at']
     search_fields = ['user__username', 'bio']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'last_digest_sent_at']
 
 
 admin.site.register(CustomUser, CustomUserAdmin)
@@ -54,7 +54,7 @@ class ProfileUpdateForm(forms.ModelForm):
     class Meta:
         model = Profile
         fields = ['bio', 'profile_picture', 'twitter_url', 'facebook_url', 
-                  'linkedin_url', 'website_url']
+                  'linkedin_url', 'website_url', 'favorite_notifications', 'digest_interval_hours']
         widgets = {
             'bio': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'profile_picture': forms.FileInput(attrs={'class': 'form-control'}),
@@ -62,4 +62,6 @@ class ProfileUpdateForm(forms.ModelForm):
             'facebook_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'https://facebook.com/username'}),
             'linkedin_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'https://linkedin.com/in/username'}),
             'website_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'https://yourwebsite.com'}),
+            'favorite_notifications': forms.Select(attrs={'class': 'form-select'}),
+            'digest_interval_hours': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
         }
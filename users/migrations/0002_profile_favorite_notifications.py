@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:41
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='digest_interval_hours',
+            field=models.PositiveSmallIntegerField(default=24, help_text='Minimum hours between two favorite digests', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='favorite_notifications',
+            field=models.CharField(choices=[('instant', 'One email per favorite'), ('digest', 'Periodic digest'), ('off', 'No emails')], default='digest', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='last_digest_sent_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
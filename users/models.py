@@ -1,3 +1,4 @@
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
@@ -37,9 +38,31 @@ class Profile(models.Model):
     linkedin_url = models.URLField(max_length=200, blank=True)
     website_url = models.URLField(max_length=200, blank=True)
     
+    # Favorite notifications
+    NOTIFY_INSTANT = 'instant'
+    NOTIFY_DIGEST = 'digest'
+    NOTIFY_OFF = 'off'
+    FAVORITE_NOTIFICATION_CHOICES = (
+        (NOTIFY_INSTANT, 'One email per favorite'),
+        (NOTIFY_DIGEST, 'Periodic digest'),
+        (NOTIFY_OFF, 'No emails'),
+    )
+    favorite_notifications = models.CharField(
+        max_length=10, choices=FAVORITE_NOTIFICATION_CHOICES, default=NOTIFY_DIGEST
+    )
+    digest_interval_hours = models.PositiveSmallIntegerField(
+        default=24, validators=[MinValueValidator(1)], help_text='Minimum hours between two favorite digests'
+    )
+    last_digest_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember the stored picture, whose variants go when it is replaced
+        self._saved_profile_picture = self.__dict__.get('profile_picture') if self.pk else None
+    
     def __str__(self):
         return f'{self.user.username} Profile'
     
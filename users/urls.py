@@ -7,6 +7,7 @@ urlpatterns = [
     path('logout/', views.user_logout, name='logout'),
     path('verify-email/<str:token>/', views.verify_email, name='verify-email'),
     path('profile/', views.profile, name='profile'),
-    path('profile/<str:username>/', views.profile, name='user-profile'),
+    # Before profile/<str:username>/, which would otherwise take 'edit' as a username
     path('profile/edit/', views.edit_profile, name='edit-profile'),
+    path('profile/<str:username>/', views.profile, name='user-profile'),
 ]
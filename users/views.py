@@ -2,13 +2,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
 from django.conf import settings
 from django.urls import reverse
 from django.utils.crypto import get_random_string
 from .forms import UserRegisterForm, UserLoginForm, UserUpdateForm, ProfileUpdateForm
 from .models import CustomUser, Profile
 from blogs.models import Blog
+from mailer.queue import enqueue_mail
 
 
 def register(request):
@@ -47,19 +47,10 @@ If you didn't create this account, please ignore this email.
 Best regards,
 Blog Site Team
 """
-            try:
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=False,
-                )
-                messages.success(request, 'Registration successful! Please check your email to verify your account.')
-                return redirect('login')
-            except Exception:
-                messages.error(request, 'Registration successful but email could not be sent. Please contact support.')
-                return redirect('login')
+            # Delivered by the send_queued_mail worker so SMTP latency stays out of the request
+            enqueue_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
+            messages.success(request, 'Registration successful! Please check your email to verify your account.')
+            return redirect('login')
     else:
         form = UserRegisterForm()
     
@@ -126,10 +117,10 @@ def profile(request, username=None):
     profile_obj, _ = Profile.objects.get_or_create(user=user)  # safe access
     
     # User's blogs if author
-    blogs = Blog.objects.filter(author=user).order_by('-created_at') if user.role == 'author' else None
+    blogs = Blog.objects.filter(author=user).select_related('category').defer('body').order_by('-created_at') if user.role == 'author' else None
     
     # User's favorites
-    favorites = user.favorites.all()
+    favorites = user.favorites.select_related('blog__author').defer('blog__body')
     
     context = {
         'profile_user': user,